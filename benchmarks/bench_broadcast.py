@@ -0,0 +1,61 @@
+"""
+Fan-out of one message to many rooms, looped versus ``broadcast``.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_broadcast --rooms 3000 --latency 0.002
+"""
+import argparse
+import asyncio
+import time
+from fake_server import FakeServer, start_bot
+from rocketchatbot import RocketChatBot
+
+QUIET_LOGGING = {"version": 1, "root": {"level": "WARNING"}}
+
+
+async def bench(rooms: int, latency: float, concurrency: int, rate_limit):
+    app = RocketChatBot(log_config=QUIET_LOGGING)
+    room_ids = [f"room{i}" for i in range(rooms)]
+    async with FakeServer(latency=latency, rate_limit=rate_limit) as server:
+        task = await start_bot(app, server)
+        try:
+            start = time.perf_counter()
+            for room_id in room_ids:
+                await app.send_message(room_id, "looped announcement")
+            looped = time.perf_counter() - start
+
+            start = time.perf_counter()
+            results = await app.broadcast(
+                room_ids, "broadcast announcement", concurrency=concurrency
+            )
+            broadcast = time.perf_counter() - start
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    failed = sum(isinstance(r, Exception) for r in results.values())
+    print(f"{rooms} rooms, {latency * 1000:.1f}ms simulated RTT")
+    print(f"looped:    {looped:8.3f}s")
+    print(f"broadcast: {broadcast:8.3f}s ({failed} failed)")
+    print(f"rate limited replies: {server.rate_limited}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rooms", type=int, default=3000)
+    parser.add_argument("--latency", type=float, default=0.002)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument(
+        "--rate-limit",
+        type=int,
+        default=None,
+        help="sendMessage calls per second allowed by the server",
+    )
+    args = parser.parse_args()
+    rate_limit = None if args.rate_limit is None else (args.rate_limit, 1.0)
+    asyncio.run(bench(args.rooms, args.latency, args.concurrency, rate_limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Throughput of the word by word, compiled and chunked owo translators.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_owo --size 4000000 --chunk 4096
+"""
+import argparse
+import random
+import re
+import time
+from owo import owo, OwoTranslator
+
+WORDS = ["you", "and", "lol", "hello", "world", "LOL", "really", "rust", "a"]
+SEPARATORS = [" ", " ", " ", "\n", "  ", "\t"]
+
+
+def legacy_owo(text: str) -> str:
+    """ Word by word translator owo used to be. """
+    replace = {"you": "yuw", "and": "awnd", "lol": "lawl"}
+    ret = ""
+    for word in re.split(r"(\s+)", text):
+        upper = word.isupper()
+        if word.lower() in replace:
+            word = replace[word.lower()]
+            if upper:
+                word = word.upper()
+        else:
+            word = word.replace("l", "w").replace("L", "W")
+            word = word.replace("r", "w").replace("R", "W")
+        ret += word
+    return ret
+
+
+def chunked_owo(text: str, chunk: int) -> str:
+    translator = OwoTranslator()
+    parts = [
+        translator.feed(text[i : i + chunk]) for i in range(0, len(text), chunk)
+    ]
+    parts.append(translator.flush())
+    return "".join(parts)
+
+
+def random_text(size: int) -> str:
+    rng = random.Random(0)
+    parts = []
+    length = 0
+    while length < size:
+        part = rng.choice(WORDS) + rng.choice(SEPARATORS)
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)
+
+
+def timed(func, *args) -> tuple:
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=4_000_000)
+    parser.add_argument("--chunk", type=int, default=4096)
+    args = parser.parse_args()
+
+    text = random_text(args.size)
+    expected, legacy = timed(legacy_owo, text)
+    compiled_result, compiled = timed(owo, text)
+    chunked_result, chunked = timed(chunked_owo, text, args.chunk)
+    assert compiled_result == expected and chunked_result == expected
+
+    megabytes = len(text) / 1e6
+    print(f"{megabytes:.1f}M characters, {args.chunk} character chunks")
+    print(f"legacy:   {megabytes / legacy:8.1f} M/s")
+    print(f"compiled: {megabytes / compiled:8.1f} M/s")
+    print(f"chunked:  {megabytes / chunked:8.1f} M/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Throughput of awaited versus pipelined ``send_message`` calls.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_send --messages 2000 --latency 0.005
+"""
+import argparse
+import asyncio
+import time
+from fake_server import FakeServer, start_bot
+from rocketchatbot import RocketChatBot
+
+QUIET_LOGGING = {"version": 1, "root": {"level": "WARNING"}}
+
+
+async def bench(messages: int, latency: float):
+    app = RocketChatBot(log_config=QUIET_LOGGING)
+    async with FakeServer(latency=latency) as server:
+        task = await start_bot(app, server)
+        try:
+            start = time.perf_counter()
+            for i in range(messages):
+                await app.send_message("GENERAL", f"awaited {i}")
+            awaited = time.perf_counter() - start
+
+            start = time.perf_counter()
+            futures = [
+                app.send_message_nowait("GENERAL", f"pipelined {i}")
+                for i in range(messages)
+            ]
+            await asyncio.gather(*futures)
+            pipelined = time.perf_counter() - start
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    print(f"{messages} messages, {latency * 1000:.1f}ms simulated RTT")
+    print(f"awaited:   {messages / awaited:10.0f} msg/s")
+    print(f"pipelined: {messages / pipelined:10.0f} msg/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.005)
+    args = parser.parse_args()
+    asyncio.run(bench(args.messages, args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Throughput of CPU heavy commands with messages sharded over worker processes.
+
+The fake server runs in this process and the bot in a child process, which
+forks the workers.  Scaling is bounded by the number of CPU cores.  Run from
+the repository root::
+
+    python -m benchmarks.bench_shards --workers 0 1 2 4 --messages 400
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+from fake_server import FakeServer
+
+QUIET_LOGGING = {"version": 1, "root": {"level": "WARNING"}}
+
+
+def run_bot(port: int, workers: int, work: float):
+    from rocketchatbot import RocketChatBot
+
+    app = RocketChatBot(log_config=QUIET_LOGGING)
+
+    @app.cmd("ping", help="pong")
+    async def ping(message):
+        return "pong"
+
+    @app.cmd("work", help="burns CPU")
+    async def burn(message):
+        end = time.perf_counter() + work
+        while time.perf_counter() < end:
+            pass
+        return "done"
+
+    try:
+        app.run("bot", "password", "127.0.0.1", port=port, ssl=False, workers=workers)
+    except KeyboardInterrupt:
+        pass
+
+
+async def bench(workers: int, messages: int, rooms: int, work: float) -> float:
+    async with FakeServer() as server:
+        bot = multiprocessing.get_context("spawn").Process(
+            target=run_bot, args=(server.port, workers, work)
+        )
+        bot.start()
+        try:
+            while not server.sent:
+                if not bot.is_alive():
+                    raise RuntimeError("bot exited")
+                await server.inject("GENERAL", "!ping")
+                await asyncio.sleep(0.2)
+            await asyncio.sleep(0.2)
+            server.sent.clear()
+
+            start = time.perf_counter()
+            for i in range(messages):
+                await server.inject(f"room{i % rooms}", "!work")
+            while len(server.sent) < messages:
+                await asyncio.sleep(0.005)
+            return time.perf_counter() - start
+        finally:
+            # interrupt rather than terminate, so the bot stops its workers
+            os.kill(bot.pid, signal.SIGINT)
+            bot.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--rooms", type=int, default=64)
+    parser.add_argument("--work", type=float, default=0.005, help="CPU seconds")
+    args = parser.parse_args()
+
+    print(
+        f"{args.messages} commands over {args.rooms} rooms, "
+        f"{args.work * 1000:.1f}ms CPU each"
+    )
+    for workers in args.workers:
+        elapsed = asyncio.run(bench(workers, args.messages, args.rooms, args.work))
+        print(f"{workers} workers: {args.messages / elapsed:10.1f} commands/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Cold start of the bot: interpreter, importing ``bot`` and the first reply.
+
+Every run starts a fresh interpreter.  The import is timed inside it, the
+first reply from the moment the process is spawned until it answers a
+``!ping`` injected into the local fake server.  Run from the repository
+root::
+
+    python -m benchmarks.bench_startup --runs 10
+"""
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+from fake_server import FakeServer
+
+IMPORT_BOT = (
+    "import time; start = time.perf_counter(); import bot; "
+    "print(time.perf_counter() - start)"
+)
+RUN_BOT = (
+    "import sys, bot; bot.app.run("
+    "'bot', 'password', '127.0.0.1', port=int(sys.argv[1]), ssl=False)"
+)
+
+
+def interpreter() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return time.perf_counter() - start
+
+
+def import_bot() -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_BOT], check=True, capture_output=True, text=True
+    )
+    return float(out.stdout.split()[-1])
+
+
+async def first_reply(poll: float) -> float:
+    async with FakeServer() as server:
+        start = time.perf_counter()
+        bot = subprocess.Popen(
+            [sys.executable, "-c", RUN_BOT, str(server.port)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            while not server.sent:
+                if bot.poll() is not None:
+                    raise RuntimeError("bot exited")
+                await server.inject("GENERAL", "!ping")
+                await asyncio.sleep(poll)
+            return time.perf_counter() - start
+        finally:
+            bot.terminate()
+            bot.wait()
+
+
+def report(name: str, samples: List[float]):
+    print(
+        f"{name:<14}"
+        f"{statistics.median(samples) * 1000:10.1f} ms median"
+        f"{min(samples) * 1000:10.1f} ms min"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--poll", type=float, default=0.005, help="seconds between pings"
+    )
+    args = parser.parse_args()
+
+    report("interpreter", [interpreter() for _ in range(args.runs)])
+    report("import bot", [import_bot() for _ in range(args.runs)])
+    report(
+        "first reply",
+        [asyncio.run(first_reply(args.poll)) for _ in range(args.runs)],
+    )
+
+
+if __name__ == "__main__":
+    main()
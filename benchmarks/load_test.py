@@ -0,0 +1,128 @@
+"""
+End-to-end command load test against the local fake server.
+
+Commands are injected at a fixed rate and every reply is matched to its
+command to measure throughput, response latency and memory.  The fake
+server shares the event loop with the bot, so its overhead is included.
+
+Run from the repository root::
+
+    python -m benchmarks.load_test --rate 500 --duration 10
+
+Pass several event loops to compare them, one run after another::
+
+    python -m benchmarks.load_test --loop asyncio uvloop
+"""
+import argparse
+import asyncio
+import resource
+import time
+import tracemalloc
+from typing import Dict, List
+from fake_server import FakeServer, start_bot
+from rocketchatbot import EVENT_LOOPS, RocketChatBot, event_loop_policy
+from args import arg
+
+QUIET_LOGGING = {"version": 1, "root": {"level": "WARNING"}}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[round((len(values) - 1) * fraction)]
+
+
+def make_app() -> RocketChatBot:
+    app = RocketChatBot(log_config=QUIET_LOGGING)
+
+    @app.cmd("echo", args=[arg("text", type=str, help="text")], help="echoes")
+    async def echo(message):
+        return message.args.text
+
+    return app
+
+
+async def load(rate: float, duration: float, latency: float, drain: float):
+    app = make_app()
+    injected: Dict[str, float] = {}
+    latencies: List[float] = []
+
+    def on_send(param: dict):
+        sent_at = injected.pop(param["msg"], None)
+        if sent_at is not None:
+            latencies.append(time.perf_counter() - sent_at)
+
+    loop = type(asyncio.get_running_loop()).__module__.split(".")[0]
+    async with FakeServer(latency=latency, on_send=on_send) as server:
+        task = await start_bot(app, server)
+        try:
+            total = int(rate * duration)
+            start = time.perf_counter()
+            for i in range(total):
+                delay = start + i / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                key = f"cmd-{i}"
+                injected[key] = time.perf_counter()
+                await server.inject("GENERAL", f"!echo {key}")
+            injecting = time.perf_counter() - start
+
+            deadline = time.perf_counter() + drain
+            while injected and time.perf_counter() < deadline:
+                await asyncio.sleep(0.01)
+            elapsed = time.perf_counter() - start
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    frames = app._frames_read.value() + app._frames_written.value()
+    return loop, total, injecting, elapsed, frames, latencies, len(injected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rate", type=float, default=500, help="commands/s")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated RTT")
+    parser.add_argument("--drain", type=float, default=10, help="seconds to wait")
+    parser.add_argument(
+        "--loop",
+        nargs="+",
+        choices=EVENT_LOOPS,
+        default=["asyncio"],
+        help="event loops to run on",
+    )
+    parser.add_argument(
+        "--tracemalloc", action="store_true", help="trace Python allocations"
+    )
+    args = parser.parse_args()
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    for name in args.loop:
+        asyncio.set_event_loop_policy(event_loop_policy(name))
+        loop, total, injecting, elapsed, frames, latencies, lost = asyncio.run(
+            load(args.rate, args.duration, args.latency, args.drain)
+        )
+
+        print(
+            f"[{loop}] {total} commands at {args.rate:.0f}/s target, "
+            f"{injecting:.2f}s to inject"
+        )
+        print(f"throughput: {len(latencies) / elapsed:10.1f} commands/s")
+        print(f"frames:     {frames / elapsed:10.1f} frames/s")
+        print(f"p50:        {percentile(latencies, 0.5) * 1000:10.2f} ms")
+        print(f"p99:        {percentile(latencies, 0.99) * 1000:10.2f} ms")
+        print(f"unanswered: {lost:10d}")
+    print(
+        "max RSS:    "
+        f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:10.1f} MiB"
+    )
+    if args.tracemalloc:
+        _, peak = tracemalloc.get_traced_memory()
+        print(f"peak heap:  {peak / 1024 / 1024:10.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Microbenchmarks of the code run for every message, checked against a baseline.
+
+Run from the repository root::
+
+    python -m benchmarks.micro              # compare with baseline.json
+    python -m benchmarks.micro --save       # store a new baseline
+    python -m benchmarks.micro -k owo       # only cases containing "owo"
+
+Exits with status 1 if any case is slower than its baseline by more than
+the threshold.  Cases are measured in interleaved rounds and the fastest
+time is kept, so a temporary slowdown of the machine doesn't hit a single
+case.  Baselines are machine specific, refresh them with ``--save`` on the
+machine used for review.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import timeit
+from typing import Callable, Dict
+
+BASELINE = os.path.join(os.path.dirname(os.path.realpath(__file__)), "baseline.json")
+QUIET_LOGGING = {"version": 1, "root": {"level": "WARNING"}}
+
+
+def message_frame(text: str) -> dict:
+    return {
+        "msg": "changed",
+        "collection": "stream-room-messages",
+        "id": "id",
+        "fields": {
+            "eventName": "__my_messages__",
+            "args": [
+                {
+                    "_id": "message-id",
+                    "rid": "GENERAL",
+                    "msg": text,
+                    "ts": {"$date": 1600000000000},
+                    "u": {"_id": "user-id", "username": "user", "name": "User"},
+                    "_updatedAt": {"$date": 1600000000000},
+                    "mentions": [],
+                    "channels": [],
+                },
+                {"roomParticipant": True, "roomType": "c", "roomName": "general"},
+            ],
+        },
+    }
+
+
+def make_app():
+    from rocketchatbot import RocketChatBot
+    from args import arg
+
+    app = RocketChatBot(log_config=QUIET_LOGGING)
+    for i in range(20):
+
+        async def handler(message):
+            pass
+
+        handler.__name__ = f"handler{i}"
+        app.cmd(
+            f"command{i}",
+            args=[arg("text", type=str, help="text")] if i % 2 else None,
+            help="help",
+        )(handler)
+    return app
+
+
+def cases() -> Dict[str, Callable[[], None]]:
+    """ Gets every benchmark case, each a callable taking no arguments. """
+    from rocketchat_data import Message
+    from owo import owo
+    from util import get_file_by_name
+    from waiters import WaiterRegistry
+    from bot import LINUX_NO_GNU
+
+    rng = random.Random(0)
+    frame = message_frame("!command1 hello")
+    args = frame["fields"]["args"]
+    app = make_app()
+    long_text = " ".join(
+        rng.choice(["linux", "kernel", "the", "a", "system"]) for _ in range(2000)
+    )
+    long_gnu = long_text + " gnu"
+    prose = " ".join(
+        rng.choice(["you", "and", "lol", "hello", "world", "really"])
+        for _ in range(200)
+    )
+    files = [f"meme{i:05d}.png" for i in range(10000)]
+    raw_frame = json.dumps(frame)
+    result_frame = json.dumps(
+        {"msg": "result", "id": "id", "result": {"_id": "message-id", "msg": "hi"}}
+    )
+
+    def message_properties():
+        msg = Message(args)
+        msg.id, msg.room_id, msg.text, msg.username, msg.user_id, msg.edited_at
+
+    # conversations waiting in many rooms, one of them in the message's room
+    waiters = WaiterRegistry()
+    streams = [waiters.stream(room_id=f"room{i}", user="user") for i in range(999)]
+    streams.append(waiters.stream(room_id="GENERAL", user="user", maxsize=1))
+    no_waiters = WaiterRegistry()
+    msg = Message(args)
+
+    def parse_command():
+        app.get_argument_parser("GENERAL").parse_args(["command1", "hello"])
+
+    return {
+        "message_construct": lambda: Message(args),
+        "message_properties": message_properties,
+        "argument_parser": lambda: app.get_argument_parser("GENERAL"),
+        "parse_command": parse_command,
+        "waiters_dispatch": lambda: waiters.dispatch(msg),
+        "waiters_idle": lambda: no_waiters.dispatch(msg),
+        "match_short": lambda: LINUX_NO_GNU.match("I love linux"),
+        "match_long": lambda: LINUX_NO_GNU.match(long_text),
+        "match_long_gnu": lambda: LINUX_NO_GNU.match(long_gnu),
+        "match_prefix": lambda: re.match(r"!command\d+", "!command1 hello"),
+        "owo": lambda: owo(prose),
+        "get_file_by_name_hit": lambda: get_file_by_name(files, "MEME09999"),
+        "get_file_by_name_miss": lambda: get_file_by_name(files, "missing"),
+        "frame_decode": lambda: json.loads(raw_frame),
+        "frame_encode": lambda: json.dumps(frame),
+        "result_decode": lambda: json.loads(result_frame),
+    }
+
+
+def measure(
+    funcs: Dict[str, Callable[[], None]], rounds: int, repeat: int
+) -> Dict[str, float]:
+    """ Gets the fastest seconds per call of every case over interleaved rounds. """
+    timers = {name: timeit.Timer(func) for name, func in funcs.items()}
+    numbers = {name: timer.autorange()[0] for name, timer in timers.items()}
+    best = {name: float("inf") for name in funcs}
+    for _ in range(rounds):
+        for name, timer in timers.items():
+            seconds = min(timer.repeat(repeat, numbers[name])) / numbers[name]
+            best[name] = min(best[name], seconds)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--save", action="store_true", help="store as baseline")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline file")
+    parser.add_argument(
+        "--threshold", type=float, default=0.25, help="allowed slowdown fraction"
+    )
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-k", dest="filter", default="", help="case name filter")
+    args = parser.parse_args()
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+
+    funcs = {name: func for name, func in cases().items() if args.filter in name}
+    results = measure(funcs, args.rounds, args.repeat)
+    regressions = []
+    for name, seconds in results.items():
+        line = f"{name:<24} {seconds * 1e6:12.3f} us"
+        if name in baseline:
+            change = seconds / baseline[name] - 1
+            line += f"  {change:+8.1%}"
+            if change > args.threshold:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=4, sort_keys=True)
+            f.write("\n")
+        print(f"saved baseline to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} regressions over {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
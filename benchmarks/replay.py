@@ -0,0 +1,63 @@
+"""
+Replay recorded websocket traffic into a bot, without a server.
+
+Record traffic with ``app.record_traffic("traffic.jsonl")`` before
+``app.run(...)``, then run from the repository root::
+
+    python -m benchmarks.replay traffic.jsonl --app bot:app --speed 4
+    python -m benchmarks.replay traffic.jsonl --max --profile replay.prof
+"""
+import argparse
+import asyncio
+import cProfile
+import importlib
+import logging
+from recorder import replay
+
+
+def load_app(spec: str):
+    module, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module), attr or "app")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("recording", help="recording file")
+    parser.add_argument("--app", default="bot:app", help="module:attribute of bot")
+    parser.add_argument("--username", default="bot", help="name of the bot")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed")
+    parser.add_argument("--max", action="store_true", help="replay without delays")
+    parser.add_argument("--profile", help="write cProfile stats to this file")
+    parser.add_argument(
+        "--persist",
+        action="store_true",
+        help="keep the bot's timer, state, rate limit and log files",
+    )
+    args = parser.parse_args()
+
+    app = load_app(args.app)
+    logging.getLogger().setLevel(logging.WARNING)
+    speed = None if args.max else args.speed
+    coro = replay(
+        app,
+        args.recording,
+        speed=speed,
+        username=args.username,
+        persist=args.persist,
+    )
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        stats = profiler.runcall(asyncio.run, coro)
+        profiler.dump_stats(args.profile)
+    else:
+        stats = asyncio.run(coro)
+
+    print(f"replayed {stats.replayed} frames in {stats.elapsed:.3f}s")
+    print(f"bot wrote {stats.sent} frames")
+    if stats.elapsed:
+        print(f"throughput: {stats.replayed / stats.elapsed:10.1f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
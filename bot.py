@@ -3,12 +3,13 @@
 import time
 import os
 import re
-import asyncio
 import random
 from typing import Optional
 from args import arg
 
 from rocketchatbot import RocketChatBot
+from ratelimit import RateLimit
+from cache import CachePolicy
 from rocketchat_data import Message
 from owo import owo
 from random_excuse import random_excuse
@@ -19,8 +20,16 @@ MEME_DIR = os.path.join(DIR, "memes")
 MEME_EXTS = (".png", ".gif", ".jpg", ".jpeg")
 MEME_NAME_CHARS = "-_.abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
 MEME_NAME_LEN = 64
-
-app = RocketChatBot()
+TIMER_DB = os.path.join(DIR, "timers.sqlite3")
+TIMER_MAX = 30 * 24 * 3600
+RATE_LIMIT_FILE = os.path.join(DIR, "ratelimits.json")
+FEEDBACK_FILE = os.path.join(DIR, "feedback.txt")
+STATE_DB = os.path.join(DIR, "state.sqlite3")
+
+app = RocketChatBot(
+    scheduler_path=TIMER_DB, rate_limit_path=RATE_LIMIT_FILE, state_path=STATE_DB
+)
+feedback_log = app.open_log(FEEDBACK_FILE, max_bytes=1024 * 1024)
 MEME_ROOMS = ["GENERAL"]
 
 LINUX_NO_GNU = re.compile(
@@ -28,12 +37,12 @@ LINUX_NO_GNU = re.compile(
 )
 
 
-@app.cmd("ping", help="pong")
+@app.cmd("ping", help="pong", cache=True)
 async def ping(message: Message) -> str:
     return "pong"
 
 
-@app.match(LINUX_NO_GNU, rate_limit=7 * 24 * 3600)
+@app.match(LINUX_NO_GNU, rate_limit=RateLimit(1, 7 * 24 * 3600, key="room"))
 async def linux_gnu(message: Message) -> str:
     return (
         "I'd just like to interject for a moment. "
@@ -70,23 +79,24 @@ async def linux_gnu(message: Message) -> str:
     help="set an egg timer",
 )
 async def timer(message: Message) -> str:
-    if message.args.duration > 600:
-        return "duration cannot be more than 600s"
+    if message.args.duration > TIMER_MAX:
+        return f"duration cannot be more than {TIMER_MAX}s"
     elif message.args.duration < 0:
         return "duration cannot be less than 0s"
 
-    await asyncio.sleep(message.args.duration)
-    return f"Your {message.args.duration}s timer is up @{str(message.user.name)}!"
+    await message.bot.scheduler.schedule_message(
+        message.room_id,
+        f"Your {message.args.duration}s timer is up @{str(message.user.name)}!",
+        delay=message.args.duration,
+    )
 
 
 @app.cmd(
     "spam", args=[arg("text", type=str, help="text to spam")], help="spams some text",
 )
 async def spam(message: Message) -> str:
-    coros = []
     for _ in range(5):
-        coros.append(app.send_message(message.room_id, message.args.text))
-    asyncio.gather(*coros)
+        message.bot.send_message_nowait(message.room_id, message.args.text)
 
 
 @app.cmd("pong", help="ping")
@@ -98,6 +108,7 @@ async def pong(message: Message) -> str:
     "owo",
     args=[arg("text", type=str, help="text to translate")],
     help="translates text to owo",
+    cache=True,
 )
 async def owo_handler(message: Message) -> str:
     return owo(message.args.text)
@@ -121,7 +132,10 @@ async def saymyname(message: Message) -> str:
 
 
 @app.cmd(
-    "say", args=[arg("text", type=str, help="text to say")], help="says some text",
+    "say",
+    args=[arg("text", type=str, help="text to say")],
+    help="says some text",
+    cache=True,
 )
 async def say(message: Message) -> str:
     return message.args.text
@@ -134,13 +148,10 @@ async def say(message: Message) -> str:
 )
 async def feedback(message: Message) -> str:
     timestamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())
-    feedback = ""
-    for line in message.args.text.splitlines():
-        feedback += f"[{timestamp}] [{str(message.user.name)}] "
-        feedback += line
-        feedback += "\n"
-    with open("feedback.txt", "a", newline="") as f:
-        f.write(feedback)
+    header = f"[{timestamp}] [{str(message.user.name)}] "
+    feedback_log.write(
+        "".join(f"{header}{line}\n" for line in message.args.text.splitlines())
+    )
 
     return f"Thanks for the feedback @{str(message.user.name)}!"
 
@@ -150,7 +161,12 @@ async def hcf(message: Message):
     return f"@{str(message.user.name)} is not authorized for this function."
 
 
-@app.cmd("listmemes", help="lists all memes", rooms=MEME_ROOMS)
+@app.cmd(
+    "listmemes",
+    help="lists all memes",
+    rooms=MEME_ROOMS,
+    cache=CachePolicy(maxsize=1, ttl=300),
+)
 async def listmemes(message: Message) -> str:
     ret = "**Meme Menu**:\n```"
     for meme in os.listdir(MEME_DIR):
@@ -162,7 +178,7 @@ async def listmemes(message: Message) -> str:
 @app.cmd("randmeme", help="get a random meme", rooms=MEME_ROOMS)
 async def randmeme(message: Message):
     meme = os.path.join(MEME_DIR, random.choice(os.listdir(MEME_DIR)))
-    await app.upload_file(message.room_id, meme)
+    await message.bot.upload_file(message.room_id, meme)
 
 
 @app.cmd(
@@ -178,7 +194,7 @@ async def meme(message: Message) -> Optional[str]:
         return f"Invalid meme: `{str(message.args.meme)}`"
     else:
         meme = os.path.join(MEME_DIR, meme)
-        await app.upload_file(message.room_id, meme)
+        await message.bot.upload_file(message.room_id, meme)
 
 
 @app.cmd(
@@ -206,20 +222,22 @@ async def newmeme(message: Message) -> Optional[str]:
         if char not in MEME_NAME_CHARS:
             return f"file name may only contain these characters: {MEME_NAME_CHARS}"
 
-    if get_file_by_name(os.listdir(MEME_DIR), message.attachment_title) is not None:
+    if get_file_by_name(os.listdir(MEME_DIR), attachment.title) is not None:
         return "meme with the same name already exists"
 
     try:
-        await app.download_attachments(message, MEME_DIR)
+        await message.bot.download_attachments(message, MEME_DIR)
     except Exception:
         msg = "failed to download attachment"
         app.logger.exception(msg)
         return msg
     else:
-        return f"Added `{message.attachment_title}` to the meme bank."
+        app.invalidate_cache("listmemes")
+        return f"Added `{attachment.title}` to the meme bank."
 
 
 if __name__ == "__main__":
+    app.hot_reload(__name__)
     app.run(
         username="bot", password="12345", hostname="10.0.0.4", port=3000, ssl=False,
     )
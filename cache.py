@@ -0,0 +1,84 @@
+import collections
+import dataclasses
+import time
+from typing import Any, Hashable, Optional, Tuple
+
+
+@dataclasses.dataclass(frozen=True)
+class CachePolicy:
+    """
+    Response cache settings for a command.
+
+    Args:
+        maxsize: Maximum number of cached responses.
+        ttl: Seconds a response stays valid, ``None`` for no expiry.
+        per_room: ``True`` to cache responses separately for every room.
+    """
+
+    maxsize: int = 256
+    ttl: Optional[float] = None
+    per_room: bool = False
+
+
+class ResponseCache:
+    """
+    Least recently used cache with optional expiry.
+
+    Args:
+        policy: Cache settings.
+    """
+
+    def __init__(self, policy: CachePolicy):
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self._data: "collections.OrderedDict[Hashable, Tuple[float, Any]]" = (
+            collections.OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Looks up a response.
+
+        Args:
+            key: Cache key.
+
+        Returns:
+            ``True`` and the response on a hit, else ``False`` and ``None``.
+        """
+        try:
+            expires, value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return False, None
+
+        if expires < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return False, None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Stores a response, evicting the least recently used if full.
+
+        Args:
+            key: Cache key.
+            value: Response.
+        """
+        ttl = self.policy.ttl
+        expires = float("inf") if ttl is None else time.monotonic() + ttl
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.policy.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        """ Invalidates all responses. """
+        self._data.clear()
@@ -0,0 +1,302 @@
+import dataclasses
+import time
+from typing import Dict, Iterable, List, Optional, Set
+from rocketchat_data import Message
+
+
+@dataclasses.dataclass
+class RoomInfo:
+    """
+    Cached room entry.
+
+    Args:
+        id: Room ID.
+        name: Room name, ``None`` for direct chats.
+        type: Room type, one of ``"c"``, ``"p"``, ``"d"`` or ``"l"``.
+        joined: ``True`` if the bot is a member of the room.
+        members: Usernames seen in the room, dropped again when they leave
+            or are removed.
+        expires: Monotonic time after which the entry is evicted.
+    """
+
+    id: str
+    name: Optional[str]
+    type: Optional[str]
+    joined: bool = True
+    members: Set[str] = dataclasses.field(default_factory=set)
+    expires: float = 0.0
+
+
+@dataclasses.dataclass
+class UserInfo:
+    """
+    Cached user entry.
+
+    Args:
+        id: User ID.
+        username: Username of the user.
+        name: Display name of the user.
+        expires: Monotonic time after which the entry is evicted.
+    """
+
+    id: str
+    username: str
+    name: Optional[str] = None
+    expires: float = 0.0
+
+
+def _normalize_name(name: str) -> str:
+    """ Strips the channel or mention sigil from a name. """
+    return name.lstrip("#@")
+
+
+class Directory:
+    """
+    In-memory directory of rooms and users.
+
+    Entries are prefetched in bulk when the bot starts, kept fresh from
+    ``stream-notify-user`` events and observed messages, and evicted once
+    they have not been refreshed for ``ttl`` seconds.
+
+    Args:
+        ttl: Time to live of an entry in seconds.
+    """
+
+    def __init__(self, ttl: float = 3600.0):
+        self.ttl = ttl
+        self._rooms: Dict[str, RoomInfo] = {}
+        self._room_ids: Dict[str, str] = {}
+        self._users: Dict[str, UserInfo] = {}
+        self._user_ids: Dict[str, str] = {}
+        self._next_sweep = time.monotonic() + ttl / 4
+
+    def __len__(self) -> int:
+        return len(self._rooms) + len(self._users)
+
+    def update_room(self, data: dict, joined: Optional[bool] = None) -> RoomInfo:
+        """
+        Inserts or refreshes a room from a realtime API room object.
+
+        Args:
+            data: Room object, requires at least ``_id``.
+            joined: Override for the membership flag.
+
+        Returns:
+            Updated room entry.
+        """
+        room_id = data["_id"]
+        room = self._rooms.get(room_id)
+        name = data.get("name")
+        if room is None:
+            room = RoomInfo(id=room_id, name=name, type=data.get("t"))
+            self._rooms[room_id] = room
+        else:
+            if room.name is not None and room.name != name:
+                self._room_ids.pop(room.name, None)
+            room.name = name
+            room.type = data.get("t", room.type)
+
+        if name is not None:
+            self._room_ids[name] = room_id
+        if joined is not None:
+            room.joined = joined
+        room.members.update(data.get("usernames", ()))
+        room.expires = time.monotonic() + self.ttl
+        return room
+
+    def remove_room(self, room_id: str):
+        """ Removes a room from the directory. """
+        room = self._rooms.pop(room_id, None)
+        if room is not None and room.name is not None:
+            if self._room_ids.get(room.name) == room_id:
+                del self._room_ids[room.name]
+
+    def update_user(self, data: dict) -> UserInfo:
+        """
+        Inserts or refreshes a user from a user object.
+
+        Args:
+            data: User object, requires ``_id`` and ``username``.
+
+        Returns:
+            Updated user entry.
+        """
+        user_id = data["_id"]
+        username = data["username"]
+        user = self._users.get(user_id)
+        if user is None:
+            user = UserInfo(id=user_id, username=username)
+            self._users[user_id] = user
+        elif user.username != username:
+            self._user_ids.pop(user.username, None)
+            user.username = username
+
+        user.name = data.get("name", user.name)
+        user.expires = time.monotonic() + self.ttl
+        self._user_ids[username] = user_id
+        return user
+
+    def remove_user(self, user_id: str):
+        """ Removes a user from the directory. """
+        user = self._users.pop(user_id, None)
+        if user is not None and self._user_ids.get(user.username) == user_id:
+            del self._user_ids[user.username]
+
+    def room(self, key: str) -> Optional[RoomInfo]:
+        """
+        Looks up a room.
+
+        Args:
+            key: Room ID or room name.
+
+        Returns:
+            Room entry if cached, else ``None``.
+        """
+        room_id = key if key in self._rooms else self._room_ids.get(
+            _normalize_name(key)
+        )
+        if room_id is None:
+            return None
+
+        room = self._rooms[room_id]
+        if room.expires < time.monotonic():
+            self.remove_room(room_id)
+            return None
+        return room
+
+    def user(self, key: str) -> Optional[UserInfo]:
+        """
+        Looks up a user.
+
+        Args:
+            key: User ID or username.
+
+        Returns:
+            User entry if cached, else ``None``.
+        """
+        user_id = key if key in self._users else self._user_ids.get(
+            _normalize_name(key)
+        )
+        if user_id is None:
+            return None
+
+        user = self._users[user_id]
+        if user.expires < time.monotonic():
+            self.remove_user(user_id)
+            return None
+        return user
+
+    def rooms(self) -> List[RoomInfo]:
+        """ All cached rooms. """
+        return list(self._rooms.values())
+
+    def users(self) -> List[UserInfo]:
+        """ All cached users. """
+        return list(self._users.values())
+
+    def room_in(self, room_id: str, rooms: Iterable[str]) -> bool:
+        """
+        Checks if a room is in a whitelist of room IDs and room names.
+
+        Args:
+            room_id: Room ID to check.
+            rooms: Whitelist of room IDs or names.
+
+        Returns:
+            ``True`` if the room is whitelisted.
+        """
+        room = self._rooms.get(room_id)
+        for key in rooms:
+            if key == room_id:
+                return True
+            if room is not None and room.name == _normalize_name(key):
+                return True
+        return False
+
+    def observe(self, message: Message):
+        """
+        Refreshes the directory from an incoming chat message.
+
+        Args:
+            message: Received message.
+        """
+        self.update_user({"_id": message.user_id, "username": message.username})
+
+        room = self._rooms.get(message.room_id)
+        if room is None or room.name is None:
+            try:
+                info = message.room
+                room = self.update_room(
+                    {"_id": message.room_id, "name": info.name, "t": info.type},
+                    joined=info.paricipant,
+                )
+            except KeyError:
+                room = self.update_room({"_id": message.room_id})
+        else:
+            room.expires = time.monotonic() + self.ttl
+
+        kind = message.type
+        if kind == "ul":
+            room.members.discard(message.username)
+        elif kind == "ru":
+            # the text of membership changes by others is the affected user
+            room.members.discard(message.text)
+        elif kind == "au":
+            room.members.add(message.text)
+        else:
+            room.members.add(message.username)
+
+        if time.monotonic() >= self._next_sweep:
+            self.evict()
+
+    def handle_event(self, event_name: str, args: list):
+        """
+        Applies a ``stream-notify-user`` change event.
+
+        Args:
+            event_name: Event name, e.g. ``"<user id>/rooms-changed"``.
+            args: Event arguments, the action followed by the changed object.
+        """
+        event = event_name.rpartition("/")[2]
+        try:
+            action, data = args[0], args[1]
+        except (IndexError, TypeError):
+            return
+
+        if event == "rooms-changed":
+            if action == "removed":
+                self.remove_room(data["_id"])
+            else:
+                self.update_room(data)
+        elif event == "subscriptions-changed":
+            room_id = data.get("rid")
+            if room_id is None:
+                return
+            if action == "removed":
+                room = self._rooms.get(room_id)
+                if room is not None:
+                    room.joined = False
+                    # no membership changes arrive once the bot left
+                    room.members.clear()
+            else:
+                self.update_room(
+                    {"_id": room_id, "name": data.get("name"), "t": data.get("t")},
+                    joined=True,
+                )
+
+    def evict(self) -> int:
+        """
+        Evicts expired entries.
+
+        Returns:
+            Number of evicted entries.
+        """
+        now = time.monotonic()
+        self._next_sweep = now + self.ttl / 4
+        rooms = [k for k, v in self._rooms.items() if v.expires < now]
+        users = [k for k, v in self._users.items() if v.expires < now]
+        for room_id in rooms:
+            self.remove_room(room_id)
+        for user_id in users:
+            self.remove_user(user_id)
+        return len(rooms) + len(users)
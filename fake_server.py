@@ -0,0 +1,350 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+from aiohttp import web
+
+
+class FakeServer:
+    """
+    Local stand-in for a Rocket.Chat server.
+
+    Speaks just enough of the realtime (DDP) and REST APIs to drive
+    :class:`rocketchatbot.RocketChatBot` without a real server.
+
+    Args:
+        host: Interface to listen on.
+        port: Port to listen on, ``0`` picks a free port.
+        latency: Seconds to delay every method result, simulating RTT.
+        on_send: Called with the parameters of every ``sendMessage`` call.
+            Messages and edits are also kept in ``sent`` and ``edits``.
+        rate_limit:
+            ``(calls, seconds)`` allowed for ``sendMessage``, excess calls are
+            rejected with a ``too-many-requests`` error.
+    """
+
+    USER_ID = "fake-bot-id"
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        latency: float = 0.0,
+        on_send: Optional[Callable[[dict], None]] = None,
+        rate_limit: Optional[Tuple[int, float]] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.on_send = on_send
+        self.rate_limit = rate_limit
+        self.rate_limited = 0
+        self._window_start = 0.0
+        self._window_calls = 0
+        self.rooms: List[dict] = [{"_id": "GENERAL", "name": "general", "t": "c"}]
+        self.users: List[dict] = [{"_id": "fake-user-id", "username": "user"}]
+        self.sent: List[dict] = []
+        self.edits: List[dict] = []
+        self.uploads: List[dict] = []
+        self.files: Dict[str, bytes] = {}
+        self._clients: List[web.WebSocketResponse] = []
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application()
+        self.app.router.add_get("/websocket", self._websocket)
+        self.app.router.add_post("/api/v1/login", self._login)
+        self.app.router.add_get("/api/v1/users.list", self._users_list)
+        self.app.router.add_post("/api/v1/rooms.upload/{room_id}", self._upload)
+        self.app.router.add_get("/file-upload/{file_id}/{name}", self._download)
+
+    async def __aenter__(self) -> "FakeServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def start(self):
+        """ Starts listening. """
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        """ Closes all clients and stops listening. """
+        for ws in list(self._clients):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def inject(
+        self,
+        room_id: str,
+        text: str,
+        *,
+        username: str = "user",
+        room_name: Optional[str] = None,
+        attachments: Optional[List[dict]] = None,
+    ) -> str:
+        """
+        Delivers a chat message to all connected clients.
+
+        Args:
+            room_id: Room the message is posted in.
+            text: Message text.
+            username: Author of the message.
+            room_name: Name of the room, defaults to the room ID.
+            attachments: Attachments of the message, see :meth:`add_file`.
+
+        Returns:
+            ID of the injected message.
+        """
+        message_id = str(uuid.uuid4())
+        now = {"$date": int(time.time() * 1000)}
+        message = {
+            "_id": message_id,
+            "rid": room_id,
+            "msg": text,
+            "ts": now,
+            "u": {"_id": f"{username}-id", "username": username},
+            "_updatedAt": now,
+            "mentions": [],
+            "channels": [],
+        }
+        if attachments:
+            message["attachments"] = attachments
+        frame = json.dumps(
+            {
+                "msg": "changed",
+                "collection": "stream-room-messages",
+                "id": "id",
+                "fields": {
+                    "eventName": "__my_messages__",
+                    "args": [
+                        message,
+                        {
+                            "roomParticipant": True,
+                            "roomType": "c",
+                            "roomName": room_name or room_id,
+                        },
+                    ],
+                },
+            }
+        )
+        for ws in list(self._clients):
+            await ws.send_str(frame)
+        return message_id
+
+    def add_file(self, name: str, content: bytes) -> dict:
+        """
+        Stores a file that can be downloaded.
+
+        Args:
+            name: File name.
+            content: File contents.
+
+        Returns:
+            Attachment referring to the file, for :meth:`inject`.
+        """
+        file_id = str(uuid.uuid4())
+        self.files[file_id] = content
+        link = f"/file-upload/{file_id}/{name}"
+        return {
+            "type": "file",
+            "title": name,
+            "title_link": link,
+            "title_link_download": True,
+        }
+
+    async def _login(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "status": "success",
+                "data": {"authToken": "fake-token", "userId": self.USER_ID},
+            }
+        )
+
+    async def _users_list(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "users": self.users,
+                "count": len(self.users),
+                "offset": 0,
+                "total": len(self.users),
+                "success": True,
+            }
+        )
+
+    async def _upload(self, request: web.Request) -> web.Response:
+        room_id = request.match_info["room_id"]
+        form = await request.post()
+        field = form.get("file")
+        if not isinstance(field, web.FileField):
+            return web.json_response(
+                {"success": False, "error": "No file uploaded"}, status=400
+            )
+        content = field.file.read()
+        attachment = self.add_file(field.filename, content)
+        self.uploads.append(
+            {"rid": room_id, "filename": field.filename, "content": content}
+        )
+        return web.json_response(
+            {"success": True, "message": {"rid": room_id, "attachments": [attachment]}}
+        )
+
+    async def _download(self, request: web.Request) -> web.Response:
+        content = self.files.get(request.match_info["file_id"])
+        if content is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=content, content_type="application/octet-stream")
+
+    async def _websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._clients.append(ws)
+        try:
+            async for frame in ws:
+                if frame.type != web.WSMsgType.TEXT:
+                    continue
+                await self._handle(ws, json.loads(frame.data))
+        finally:
+            self._clients.remove(ws)
+        return ws
+
+    async def _handle(self, ws: web.WebSocketResponse, data: dict):
+        msg = data.get("msg")
+        if msg == "connect":
+            await ws.send_json({"msg": "connected", "session": str(uuid.uuid4())})
+        elif msg == "ping":
+            await ws.send_json({"msg": "pong", **_id_of(data)})
+        elif msg == "sub":
+            await ws.send_json({"msg": "ready", "subs": [data["id"]]})
+        elif msg == "method":
+            reply = self._method(data["method"], data.get("params", []))
+            reply = {"msg": "result", "id": data["id"], **reply}
+            if self.latency:
+                asyncio.create_task(self._delayed(ws, reply))
+            else:
+                await ws.send_json(reply)
+
+    async def _delayed(self, ws: web.WebSocketResponse, reply: dict):
+        await asyncio.sleep(self.latency)
+        if not ws.closed:
+            await ws.send_json(reply)
+
+    def _method(self, method: str, params: list) -> dict:
+        """ Runs a method call, returning the ``result`` or ``error`` field. """
+        param = params[0] if params else {}
+        if method == "login":
+            return {"result": {"id": self.USER_ID, "token": "fake-token"}}
+        elif method == "rooms/get":
+            return {"result": self.rooms}
+        elif method == "sendMessage":
+            if self.rate_limit is not None:
+                error = self._check_rate_limit()
+                if error is not None:
+                    return error
+            self.sent.append(param)
+            if self.on_send is not None:
+                self.on_send(param)
+            return {
+                "result": {
+                    **param,
+                    "ts": {"$date": int(time.time() * 1000)},
+                    "u": {"_id": self.USER_ID, "username": "bot"},
+                }
+            }
+        elif method == "updateMessage":
+            self.edits.append(param)
+            return {"result": None}
+        else:
+            return {"error": {"error": 404, "reason": f"Method '{method}' not found"}}
+
+    def _check_rate_limit(self) -> Optional[dict]:
+        """ Counts a call against the fixed rate limit window. """
+        calls, seconds = self.rate_limit
+        now = time.monotonic()
+        if now - self._window_start >= seconds:
+            self._window_start = now
+            self._window_calls = 0
+
+        self._window_calls += 1
+        if self._window_calls > calls:
+            self.rate_limited += 1
+            reset = seconds - (now - self._window_start)
+            return {
+                "error": {
+                    "error": "too-many-requests",
+                    "reason": "Error, too many requests.",
+                    "details": {"timeToReset": int(reset * 1000) + 1},
+                }
+            }
+        return None
+
+
+def _id_of(data: dict) -> dict:
+    """ Echoes the optional DDP id of a frame. """
+    return {"id": data["id"]} if "id" in data else {}
+
+
+async def start_bot(app, server: FakeServer, timeout: float = 10.0) -> asyncio.Task:
+    """
+    Connects a bot to a running fake server.
+
+    Args:
+        app: :class:`rocketchatbot.RocketChatBot` to connect.
+        server: Started fake server.
+        timeout: Seconds to wait for the bot to finish logging in.
+
+    Returns:
+        Task running the bot, cancel it to disconnect.
+    """
+    app._configure("bot", "password", server.host, port=server.port, ssl=False)
+    task = asyncio.create_task(app._bootstrap())
+    ready = asyncio.create_task(app._ready.wait())
+    done, _ = await asyncio.wait(
+        {task, ready}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+    )
+    if ready not in done:
+        ready.cancel()
+        if task.done():
+            task.result()
+        task.cancel()
+        raise TimeoutError("bot failed to start")
+    return task
+
+
+async def serve(host: str, port: int, latency: float):
+    """ Runs a fake server until cancelled, logging sent messages. """
+    logger = logging.getLogger(__name__)
+
+    def on_send(param: dict):
+        logger.info(f"[{param.get('rid')}] {param.get('msg')}")
+
+    async with FakeServer(host, port, latency=latency, on_send=on_send) as server:
+        logger.info(f"listening on {server.host}:{server.port}")
+        await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in Rocket.Chat server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="[{asctime}] {message}", style="{")
+    try:
+        asyncio.run(serve(args.host, args.port, args.latency))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
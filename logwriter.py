@@ -0,0 +1,147 @@
+import asyncio
+import concurrent.futures
+import logging
+import os
+import time
+from typing import BinaryIO, List, Optional
+
+
+class LogWriter:
+    """
+    Append-only log file written in batches off the event loop.
+
+    :meth:`write` only buffers an entry.  Buffered entries are group
+    committed by a single task, on a worker thread, once ``batch_bytes`` are
+    pending or ``flush_interval`` seconds have passed.
+
+    Args:
+        path: Log file path.
+        batch_bytes: Pending bytes that trigger a flush right away.
+        flush_interval: Seconds entries may stay buffered.
+        fsync_interval: Minimum seconds between fsyncs, ``0`` to fsync every
+            flush, ``None`` to leave syncing to the OS.
+        max_bytes: File size that triggers rotation, ``None`` to never rotate.
+        backup_count: Rotated files to keep as ``path.1`` to ``path.N``.
+        encoding: File encoding.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        batch_bytes: int = 64 * 1024,
+        flush_interval: float = 1.0,
+        fsync_interval: Optional[float] = 5.0,
+        max_bytes: Optional[int] = 10 * 1024 * 1024,
+        backup_count: int = 5,
+        encoding: str = "UTF-8",
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.batch_bytes = batch_bytes
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.encoding = encoding
+        self.flushes = 0
+        self._buffer: List[bytes] = []
+        self._pending = 0
+        self._file: Optional[BinaryIO] = None
+        self._size = 0
+        self._last_fsync = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="logwriter"
+        )
+
+    def write(self, text: str):
+        """
+        Buffers text to be appended, starting the flush task if needed.
+
+        Args:
+            text: Text to append, including any line endings.
+        """
+        data = text.encode(self.encoding)
+        self._buffer.append(data)
+        self._pending += len(data)
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+        if self._pending >= self.batch_bytes:
+            self._wakeup.set()
+
+    async def flush(self):
+        """ Writes out all buffered entries. """
+        if not self._buffer:
+            return
+        batch = b"".join(self._buffer)
+        self._buffer = []
+        self._pending = 0
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._commit, batch)
+
+    async def close(self):
+        """ Flushes, fsyncs and closes the file. """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close)
+
+    async def _loop(self):
+        """ Flushes whenever enough is pending or the interval elapses. """
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                self.logger.exception(f"failed to write {self.path}")
+
+    def _open(self) -> BinaryIO:
+        if self._file is None:
+            self._file = open(self.path, "ab")
+            self._size = self._file.tell()
+        return self._file
+
+    def _commit(self, batch: bytes):
+        f = self._open()
+        f.write(batch)
+        f.flush()
+        self._size += len(batch)
+        self.flushes += 1
+
+        now = time.monotonic()
+        if self.fsync_interval is not None and (
+            now - self._last_fsync >= self.fsync_interval
+        ):
+            os.fsync(f.fileno())
+            self._last_fsync = now
+
+        if self.max_bytes is not None and self._size >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._close()
+        if self.backup_count < 1:
+            os.remove(self.path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def _close(self):
+        if self._file is not None:
+            if self.fsync_interval is not None:
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
@@ -0,0 +1,162 @@
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+from types import CodeType, FrameType
+from typing import Callable, Deque, Dict, Optional
+from metrics import Registry
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LoopMonitor:
+    """
+    Event loop lag monitor with a watchdog thread.
+
+    A task on the loop measures how late its timer fires.  A watchdog
+    thread notices when that task stops running for longer than
+    ``threshold`` seconds, then logs the stack of the loop thread and
+    attributes the stall to the innermost registered handler on it.
+
+    Args:
+        registry: Registry to export lag and stall metrics to.
+        interval: Seconds between lag samples.
+        threshold: Seconds of lag considered a stall.
+        window: Number of recent samples kept for :meth:`percentiles`.
+    """
+
+    def __init__(
+        self,
+        registry: Optional[Registry] = None,
+        interval: float = 0.1,
+        threshold: float = 0.5,
+        window: int = 1000,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.interval = interval
+        self.threshold = threshold
+        self.samples: Deque[float] = collections.deque(maxlen=window)
+        self.stalls: Dict[str, int] = collections.Counter()
+        self._handlers: Dict[CodeType, str] = {}
+        self._beat = 0.0
+        self._reported = 0.0
+        self._thread_id: Optional[int] = None
+        self._users = 0
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self._lag = self._stall_count = None
+        if registry is not None:
+            self._lag = registry.histogram(
+                "rocketchat_loop_lag_seconds", "Event loop lag.", buckets=LAG_BUCKETS
+            )
+            self._stall_count = registry.counter(
+                "rocketchat_loop_stalls_total",
+                "Event loop stalls, by the handler running.",
+                ("handler",),
+            )
+
+    def register(self, name: str, func: Callable):
+        """
+        Registers a handler that stalls are attributed to.
+
+        Args:
+            name: Handler name, e.g. ``"command ping"``.
+            func: Handler function.
+        """
+        code = getattr(func, "__code__", None)
+        if code is not None:
+            self._handlers[code] = name
+
+    def percentiles(self) -> Dict[str, float]:
+        """ Gets the p50, p90, p99 and maximum of recent lag samples. """
+        if not self.samples:
+            return {"p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+        samples = sorted(self.samples)
+        last = len(samples) - 1
+        return {
+            "p50": samples[round(last * 0.5)],
+            "p90": samples[round(last * 0.9)],
+            "p99": samples[round(last * 0.99)],
+            "max": samples[-1],
+        }
+
+    def start(self):
+        """
+        Starts monitoring the running loop.
+
+        Bots sharing a monitor each start and stop it, monitoring stops
+        once all of them have.
+        """
+        self._users += 1
+        if self._task is not None:
+            return
+        self._thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._sample())
+        self._thread = threading.Thread(
+            target=self._watch, name="loop-monitor", daemon=True
+        )
+        self._thread.start()
+
+    async def stop(self):
+        """ Stops monitoring. """
+        self._users = max(0, self._users - 1)
+        if self._task is None or self._users:
+            return
+        self._stop.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._thread.join()
+        self._thread = None
+
+    async def _sample(self):
+        """ Records how late the timer fires. """
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self.samples.append(lag)
+            if self._lag is not None:
+                self._lag.observe(lag)
+            if lag >= self.threshold:
+                self.logger.warning(f"event loop blocked for {lag:.3f}s")
+
+    def _watch(self):
+        """ Checks for stalls from outside the loop. """
+        while not self._stop.wait(self.interval / 2):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled >= self.threshold and beat != self._reported:
+                self._reported = beat
+                self._report(stalled)
+
+    def _report(self, stalled: float):
+        frame = sys._current_frames().get(self._thread_id)
+        if frame is None:
+            return
+        handler = self._attribute(frame)
+        self.stalls[handler] += 1
+        if self._stall_count is not None:
+            self._stall_count.inc(handler)
+        stack = "".join(traceback.format_stack(frame))
+        self.logger.warning(
+            f"event loop stalled for {stalled:.3f}s in {handler}:\n{stack}"
+        )
+
+    def _attribute(self, frame: Optional[FrameType]) -> str:
+        """ Finds the innermost registered handler on a stack. """
+        while frame is not None:
+            name = self._handlers.get(frame.f_code)
+            if name is not None:
+                return name
+            frame = frame.f_back
+        return "unknown"
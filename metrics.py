@@ -0,0 +1,298 @@
+import abc
+import bisect
+import logging
+import math
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Sequence
+from typing import Tuple
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'),
+        )
+        for name, value in zip(names, values)
+    )
+    return f"{{{pairs}}}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric(abc.ABC):
+    """
+    Base metric.
+
+    Args:
+        name: Metric name.
+        help: Help text.
+        labels: Label names, values are passed positionally when recording.
+    """
+
+    TYPE = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    @abc.abstractmethod
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """ Yields the name suffix, formatted labels and value of samples. """
+
+    def expose(self) -> str:
+        """ Formats the metric in the text exposition format. """
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.TYPE}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class Counter(_Metric):
+    """ Monotonically increasing count. """
+
+    TYPE = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        """
+        Increments the count.
+
+        Args:
+            *labels: Label values.
+            amount: Amount to add.
+        """
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        """ Gets the count for label values. """
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for labels, value in sorted(self._values.items()):
+            yield "", _format_labels(self.labels, labels), value
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down.
+
+    Args:
+        func: Called at collection time for the value, instead of recording
+            it on the hot path.
+    """
+
+    TYPE = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        func: Optional[Callable[[], float]] = None,
+    ):
+        super().__init__(name, help, labels)
+        self.func = func
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str):
+        """ Sets the value. """
+        self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1):
+        """ Adds to the value. """
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        """ Subtracts from the value. """
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def value(self, *labels: str) -> float:
+        """ Gets the value for label values. """
+        if self.func is not None:
+            return self.func()
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        if self.func is not None:
+            try:
+                yield "", "", self.func()
+            except Exception:
+                logging.getLogger(__name__).exception(f"failed to collect {self.name}")
+            return
+        for labels, value in sorted(self._values.items()):
+            yield "", _format_labels(self.labels, labels), value
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in cumulative buckets.
+
+    Args:
+        buckets: Upper bounds of the buckets, in increasing order.
+    """
+
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # per label values: bucket counts, then sum
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        """
+        Records a value.
+
+        Args:
+            value: Observed value.
+            *labels: Label values.
+        """
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0] * (len(self.buckets) + 2)
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def count(self, *labels: str) -> int:
+        """ Gets the number of observations for label values. """
+        state = self._values.get(labels)
+        return sum(state[:-1]) if state else 0
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        names = self.labels + ("le",)
+        for labels, state in sorted(self._values.items()):
+            total = 0
+            for bound, count in zip(self.buckets + (math.inf,), state):
+                total += count
+                bucket_labels = _format_labels(names, labels + (_format_value(bound),))
+                yield "_bucket", bucket_labels, total
+            label_text = _format_labels(self.labels, labels)
+            yield "_sum", label_text, state[-1]
+            yield "_count", label_text, total
+
+
+class Registry:
+    """ Collection of metrics exported together. """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Multiple metrics named {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        """ Registers a :class:`Counter`. """
+        return self._register(Counter(name, help, labels))
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        func: Optional[Callable[[], float]] = None,
+    ) -> Gauge:
+        """ Registers a :class:`Gauge`. """
+        return self._register(Gauge(name, help, labels, func))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """ Registers a :class:`Histogram`. """
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def get(self, name: str) -> _Metric:
+        """ Gets a metric by name. """
+        return self._metrics[name]
+
+    def expose(self) -> str:
+        """ Formats all metrics in the text exposition format. """
+        return "".join(metric.expose() for metric in self._metrics.values())
+
+
+class MetricsServer:
+    """
+    HTTP endpoint serving a registry at ``/metrics``.
+
+    Args:
+        registry: Metrics to serve.
+        host: Interface to listen on.
+        port: Port to listen on, ``0`` for any free port.
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, registry: Registry, host: str = "127.0.0.1", port: int = 0):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner: Optional["web.AppRunner"] = None
+
+    async def start(self):
+        """ Starts listening, ``port`` is updated to the bound port. """
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        """ Stops listening. """
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+
+        return web.Response(
+            body=self.registry.expose().encode(),
+            headers={"Content-Type": self.CONTENT_TYPE},
+        )
@@ -1,25 +1,94 @@
+import itertools
 import re
 
 
 OWO_REPLACE = {"you": "yuw", "and": "awnd", "lol": "lawl"}
-WHITESPACE_SPLIT = re.compile(r"(\s+)")
+OWO_TABLE = str.maketrans("lLrR", "wWwW")
+# the single capturing group makes split() alternate text and matched words
+OWO_WORDS = re.compile(
+    r"(?<!\S)("
+    + "|".join(
+        "".join(f"[{c.lower()}{c.upper()}]" for c in word) for word in OWO_REPLACE
+    )
+    + r")(?!\S)"
+)
+# every capitalisation of every word, mapped to its replacement
+OWO_VARIANTS = {
+    "".join(letters): (
+        replacement.upper() if "".join(letters).isupper() else replacement
+    )
+    for word, replacement in OWO_REPLACE.items()
+    for letters in itertools.product(*((c.lower(), c.upper()) for c in word))
+}
+MAX_WORD_LEN = max(len(word) for word in OWO_REPLACE)
+LEADING_WORD = re.compile(r"\S*")
 
 
-def owo(text: str):
+def owo(text: str) -> str:
     """ Adapted from owotrans. """
-    ret = ""
-    for word in WHITESPACE_SPLIT.split(text):
-        upper = word.isupper()
-        if word.lower() in OWO_REPLACE:
-            word = OWO_REPLACE[word.lower()]
-            if upper:
-                word = word.upper()
-        else:
-            word = word.replace("l", "w")
-            word = word.replace("L", "W")
-            word = word.replace("r", "w")
-            word = word.replace("R", "W")
-
-        ret += word
-
-    return ret
+    parts = OWO_WORDS.split(text)
+    parts[0::2] = map(str.translate, parts[0::2], itertools.repeat(OWO_TABLE))
+    parts[1::2] = map(OWO_VARIANTS.__getitem__, parts[1::2])
+    return "".join(parts)
+
+
+class OwoTranslator:
+    """
+    Incremental :func:`owo` translator for text arriving in chunks.
+
+    Joining the output of every :meth:`feed` and the final :meth:`flush`
+    gives the same result as translating the whole text at once.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._midword = False
+
+    def feed(self, chunk: str) -> str:
+        """
+        Translates a chunk, holding back a trailing word that may continue.
+
+        Args:
+            chunk: Next part of the text.
+
+        Returns:
+            Translated text that is final.
+        """
+        text = self._pending + chunk
+        self._pending = ""
+
+        out = ""
+        if self._midword:
+            # the rest of a word too long to be replaced
+            lead = LEADING_WORD.match(text).end()
+            out = text[:lead].translate(OWO_TABLE)
+            text = text[lead:]
+            if not text:
+                return out
+            self._midword = False
+
+        # only a trailing word short enough to be replaced needs holding back
+        split = len(text)
+        limit = max(0, split - MAX_WORD_LEN - 1)
+        while split > limit and not text[split - 1].isspace():
+            split -= 1
+
+        if len(text) - split > MAX_WORD_LEN:
+            self._midword = True
+            return out + owo(text)
+        self._pending = text[split:]
+        return out + owo(text[:split])
+
+    def flush(self) -> str:
+        """
+        Translates any held back text.
+
+        Returns:
+            Remaining translated text.
+        """
+        text = self._pending
+        self._pending = ""
+        if self._midword:
+            self._midword = False
+            return text.translate(OWO_TABLE)
+        return owo(text)
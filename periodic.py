@@ -0,0 +1,265 @@
+import asyncio
+import dataclasses
+import datetime
+import inspect
+import logging
+import math
+import random
+import time
+from typing import Callable, Dict, List, Optional, Set
+from scheduler import Scheduler
+
+CRON_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 7),
+)
+
+
+def _parse_field(field: str, low: int, high: int) -> Set[int]:
+    """
+    Parses one cron field.
+
+    Args:
+        field: Field text, e.g. ``"*/15"`` or ``"1-5,10"``.
+        low: Lowest allowed value.
+        high: Highest allowed value.
+
+    Returns:
+        Allowed values.
+
+    Raises:
+        ValueError: Invalid field.
+    """
+    values = set()
+    for part in field.split(","):
+        part, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(p) for p in part.split("-", 1))
+        else:
+            start = int(part)
+            end = high if step != 1 else start
+
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"invalid cron field {field!r}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """
+    Standard five field cron expression, evaluated in local time.
+
+    Weekdays run from ``0`` (Sunday) to ``6``, ``7`` is also accepted for
+    Sunday.  If both day and weekday are restricted either may match.
+
+    Args:
+        expression: Cron expression, e.g. ``"0 9 * * 1-5"``.
+
+    Raises:
+        ValueError: Invalid expression.
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != len(CRON_FIELDS):
+            raise ValueError(f"expected 5 cron fields, got {expression!r}")
+
+        self.expression = expression
+        parsed = [
+            _parse_field(field, low, high)
+            for field, (_, low, high) in zip(fields, CRON_FIELDS)
+        ]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {weekday % 7 for weekday in weekdays}
+        self._any_day = fields[2].startswith("*")
+        self._any_weekday = fields[4].startswith("*")
+
+    def _day_matches(self, date: datetime.datetime) -> bool:
+        day = date.day in self.days
+        weekday = (date.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, when: float) -> float:
+        """
+        Gets the first matching time after a time.
+
+        Args:
+            when: Epoch time.
+
+        Returns:
+            Epoch time of the next match.
+        """
+        date = datetime.datetime.fromtimestamp(when).replace(second=0, microsecond=0)
+        date += datetime.timedelta(minutes=1)
+        # bounded by a leap year cycle of minutes for impossible dates
+        for _ in range(4 * 366 * 24 * 60):
+            if date.month not in self.months:
+                month = date.month % 12 + 1
+                year = date.year + (date.month == 12)
+                date = date.replace(year=year, month=month, day=1, hour=0, minute=0)
+            elif not self._day_matches(date):
+                date = date.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+            elif date.hour not in self.hours:
+                date = date.replace(minute=0) + datetime.timedelta(hours=1)
+            elif date.minute not in self.minutes:
+                date += datetime.timedelta(minutes=1)
+            else:
+                return date.timestamp()
+        raise ValueError(f"cron expression {self.expression!r} never matches")
+
+
+@dataclasses.dataclass
+class PeriodicJob:
+    """
+    Recurring job and its run-time metrics.
+
+    Args:
+        name: Job name.
+        func: Function or coroutine function taking no arguments.
+        interval: Seconds between runs, for :meth:`RocketChatBot.every` jobs.
+        cron: Schedule, for :meth:`RocketChatBot.cron` jobs.
+        jitter: Upper bound of a random delay added to every run.
+    """
+
+    name: str
+    func: Callable
+    interval: Optional[float] = None
+    cron: Optional[CronSchedule] = None
+    jitter: float = 0.0
+    running: bool = False
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0
+    last_run: Optional[float] = None
+    last_duration: float = 0.0
+    total_duration: float = 0.0
+    next_run: Optional[float] = None
+
+    @property
+    def mean_duration(self) -> float:
+        """ Mean run time in seconds. """
+        return self.total_duration / self.runs if self.runs else 0.0
+
+    def next_after(self, planned: float, now: float) -> float:
+        """
+        Gets the next planned run, without jitter.
+
+        Interval jobs are planned from the previous slot so they don't drift,
+        skipping any slots missed entirely.
+
+        Args:
+            planned: Epoch time of the previous planned run.
+            now: Current epoch time.
+        """
+        if self.cron is not None:
+            return self.cron.next_after(max(planned, now))
+        missed = max(0, math.floor((now - planned) / self.interval))
+        return planned + (missed + 1) * self.interval
+
+
+class PeriodicJobs:
+    """
+    Recurring jobs scheduled on a :class:`scheduler.Scheduler`.
+
+    A run is skipped rather than started while the previous run of the same
+    job is still in progress.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._jobs: Dict[str, PeriodicJob] = {}
+        self._scheduler: Optional[Scheduler] = None
+        self._running: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def add(self, job: PeriodicJob, replace: bool = False):
+        """
+        Registers a job, scheduling it if already started.
+
+        Args:
+            job: Job to register.
+            replace: ``True`` to swap in the function of a job with the same
+                name, keeping its schedule and metrics.
+
+        Raises:
+            ValueError: A job with the same name exists.
+        """
+        existing = self._jobs.get(job.name)
+        if existing is not None and replace:
+            existing.func = job.func
+            return
+        if existing is not None:
+            raise ValueError(f"Multiple periodic jobs named {job.name}")
+        self._jobs[job.name] = job
+        if self._scheduler is not None:
+            self._schedule(job, time.time())
+
+    def start(self, scheduler: Scheduler):
+        """ Schedules the first run of every job. """
+        if self._scheduler is scheduler:
+            return
+        self._scheduler = scheduler
+        now = time.time()
+        for job in self._jobs.values():
+            self._schedule(job, now)
+
+    async def stop(self):
+        """ Cancels runs in progress, jobs stay scheduled. """
+        tasks = list(self._running)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> List[PeriodicJob]:
+        """ All jobs with their run-time metrics. """
+        return list(self._jobs.values())
+
+    def _schedule(self, job: PeriodicJob, after: float):
+        planned = job.next_after(after, time.time())
+        job.next_run = planned
+        when = planned + random.uniform(0, job.jitter) if job.jitter else planned
+        self._scheduler.call_at(when, lambda: self._due(job, planned))
+
+    def _due(self, job: PeriodicJob, planned: float):
+        self._schedule(job, planned)
+        if job.running:
+            job.skipped += 1
+            self.logger.warning(f"skipped {job.name}, previous run still active")
+            return
+        job.running = True
+        task = asyncio.create_task(self._run(job))
+        self._running.add(task)
+        task.add_done_callback(lambda task: self._done(job, task))
+
+    def _done(self, job: PeriodicJob, task: asyncio.Task):
+        self._running.discard(task)
+        # also reached when cancelled before the run started
+        job.running = False
+
+    async def _run(self, job: PeriodicJob):
+        start = time.perf_counter()
+        job.last_run = time.time()
+        try:
+            if inspect.iscoroutinefunction(job.func):
+                await job.func()
+            else:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, job.func)
+        except Exception:
+            job.failures += 1
+            self.logger.exception(f"periodic job {job.name} failed")
+        finally:
+            job.running = False
+            job.runs += 1
+            job.last_duration = time.perf_counter() - start
+            job.total_duration += job.last_duration
@@ -0,0 +1,170 @@
+import collections
+import dataclasses
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from rocketchat_data import Message
+
+KEYS = ("global", "room", "user", "room_user")
+ALGORITHMS = ("token_bucket", "sliding_window")
+
+
+@dataclasses.dataclass(frozen=True)
+class RateLimit:
+    """
+    Rate limit for a handler.
+
+    Args:
+        calls: Calls allowed per period.
+        period: Period in seconds.
+        key: What the limit applies to, one of ``"global"``, ``"room"``,
+            ``"user"`` or ``"room_user"``.
+        algorithm: ``"token_bucket"`` refills continuously and allows bursts
+            of ``calls``, ``"sliding_window"`` allows ``calls`` within any
+            ``period`` long window.
+
+    Raises:
+        ValueError: Invalid key or algorithm.
+    """
+
+    calls: int
+    period: float
+    key: str = "global"
+    algorithm: str = "token_bucket"
+
+    def __post_init__(self):
+        if self.key not in KEYS:
+            raise ValueError(f"Invalid rate limit key {self.key}, expected {KEYS}")
+        if self.algorithm not in ALGORITHMS:
+            raise ValueError(
+                f"Invalid rate limit algorithm {self.algorithm}, expected {ALGORITHMS}"
+            )
+        if self.calls < 1 or self.period <= 0:
+            raise ValueError("Rate limit calls and period must be positive")
+
+    def key_for(self, message: Message) -> str:
+        """ Gets the key a message is limited under. """
+        if self.key == "room":
+            return message.room_id
+        elif self.key == "user":
+            return message.user_id
+        elif self.key == "room_user":
+            return f"{message.room_id}/{message.user_id}"
+        return ""
+
+
+class RateLimiter:
+    """
+    Keyed rate limit engine.
+
+    State is kept per handler and key in a least recently used map holding
+    at most ``max_keys`` entries, so idle keys are evicted first.
+
+    Args:
+        max_keys: Maximum number of tracked keys.
+        path: JSON file to persist state in, ``None`` to keep it in memory.
+    """
+
+    def __init__(self, max_keys: int = 10000, path: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_keys = max_keys
+        self.path = path
+        self._state: "collections.OrderedDict[Tuple[str, str], list]" = (
+            collections.OrderedDict()
+        )
+        if path is not None:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def acquire(
+        self, name: str, limit: RateLimit, message: Message, now: Optional[float] = None
+    ) -> float:
+        """
+        Consumes a call if allowed.
+
+        Args:
+            name: Handler name.
+            limit: Rate limit of the handler.
+            message: Message triggering the handler.
+            now: Current epoch time, defaults to :func:`time.time`.
+
+        Returns:
+            ``0.0`` if the call is allowed, else seconds until it would be.
+        """
+        if now is None:
+            now = time.time()
+
+        key = (name, limit.key_for(message))
+        bucket = limit.algorithm == "token_bucket"
+        state = self._state.get(key)
+        if state is None or (bucket and len(state) != 2):
+            state = [float(limit.calls), now] if bucket else []
+            self._state[key] = state
+            if len(self._state) > self.max_keys:
+                self._state.popitem(last=False)
+        else:
+            self._state.move_to_end(key)
+
+        if bucket:
+            return self._token_bucket(state, limit, now)
+        return self._sliding_window(state, limit, now)
+
+    @staticmethod
+    def _token_bucket(state: list, limit: RateLimit, now: float) -> float:
+        tokens, last = state
+        rate = limit.calls / limit.period
+        tokens = min(float(limit.calls), tokens + (now - last) * rate)
+        state[1] = now
+        if tokens >= 1:
+            state[0] = tokens - 1
+            return 0.0
+        state[0] = tokens
+        return (1 - tokens) / rate
+
+    @staticmethod
+    def _sliding_window(state: List[float], limit: RateLimit, now: float) -> float:
+        start = now - limit.period
+        while state and state[0] <= start:
+            state.pop(0)
+        if len(state) < limit.calls:
+            state.append(now)
+            return 0.0
+        return state[0] - start
+
+    def snapshot(self) -> Dict[str, list]:
+        """ Copies the state for :meth:`write`. """
+        return {
+            json.dumps(key): list(value) for key, value in self._state.items()
+        }
+
+    def write(self, snapshot: Dict[str, list]):
+        """ Atomically writes a snapshot to ``path``. """
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, self.path)
+
+    def save(self):
+        """ Persists the state to ``path``. """
+        if self.path is not None:
+            self.write(self.snapshot())
+
+    def load(self):
+        """ Loads persisted state from ``path``, if it exists. """
+        try:
+            with open(self.path) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            self.logger.exception(f"ignoring corrupt rate limit state {self.path}")
+            return
+
+        for key, value in snapshot.items():
+            self._state[tuple(json.loads(key))] = value
+        while len(self._state) > self.max_keys:
+            self._state.popitem(last=False)
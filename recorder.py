@@ -0,0 +1,273 @@
+import asyncio
+import dataclasses
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from typing import List, Optional, Set, Tuple
+from logwriter import LogWriter
+from scheduler import Scheduler
+from state import StateStore
+
+READ = "r"
+WRITE = "w"
+REDACTED = "<redacted>"
+AUTH_METHODS = ("login", "resume")
+
+
+class FrameRecorder:
+    """
+    Records raw websocket frames as lines of ``[seconds, direction, frame]``.
+
+    Seconds count from the first recorded frame, direction is ``"r"`` for
+    frames read and ``"w"`` for frames written.  Credentials are redacted:
+    the parameters of ``login`` and ``resume`` calls and the token in their
+    results.
+
+    Args:
+        log: Writer to append lines to, e.g. from
+            :meth:`RocketChatBot.open_log`.
+    """
+
+    def __init__(self, log: LogWriter):
+        self.log = log
+        self._start: Optional[float] = None
+        self._auth_calls: Set[str] = set()
+
+    def record(self, direction: str, frame: str):
+        """
+        Records a frame.
+
+        Args:
+            direction: ``"r"`` or ``"w"``.
+            frame: Raw frame text.
+        """
+        now = time.perf_counter()
+        if self._start is None:
+            self._start = now
+        frame = self._redact(direction, frame)
+        self.log.write(json.dumps([round(now - self._start, 6), direction, frame]))
+        self.log.write("\n")
+
+    def _redact(self, direction: str, frame: str) -> str:
+        """ Removes credentials from a frame. """
+        if direction == WRITE:
+            if not any(f'"{method}"' in frame for method in AUTH_METHODS):
+                return frame
+            data = json.loads(frame)
+            if data.get("msg") != "method" or data.get("method") not in AUTH_METHODS:
+                return frame
+            self._auth_calls.add(data.get("id"))
+            data["params"] = [REDACTED]
+            return json.dumps(data)
+
+        if not self._auth_calls or '"result"' not in frame:
+            return frame
+        data = json.loads(frame)
+        if data.get("msg") != "result" or data.get("id") not in self._auth_calls:
+            return frame
+        self._auth_calls.discard(data["id"])
+        result = data.get("result")
+        if isinstance(result, dict) and "token" in result:
+            result["token"] = REDACTED
+        return json.dumps(data)
+
+
+def load_recording(path: str) -> List[Tuple[float, str, str]]:
+    """
+    Reads a recording, including the files it was rotated into.
+
+    Rotated files are read oldest first.  Times are shifted so the oldest
+    frame kept is at ``0``, in case the oldest files were dropped.
+
+    Args:
+        path: Recording written by :class:`FrameRecorder`.
+
+    Returns:
+        Seconds, direction and frame of every recorded frame.
+    """
+    paths = [path]
+    while os.path.exists(f"{path}.{len(paths)}"):
+        paths.append(f"{path}.{len(paths)}")
+
+    frames = []
+    for part in reversed(paths):
+        with open(part) as f:
+            frames.extend(tuple(json.loads(line)) for line in f if line.strip())
+    if frames and frames[0][0]:
+        offset = frames[0][0]
+        frames = [(when - offset, way, frame) for when, way, frame in frames]
+    return frames
+
+
+class ReplaySocket:
+    """
+    Websocket stand-in feeding recorded chat frames to a bot.
+
+    Only ``changed`` frames read by the bot are replayed.  Frames the bot
+    writes are answered right away, method calls with an empty result and
+    subscriptions with ``ready``, so handlers run as if a server replied.
+
+    Args:
+        frames: Recorded frames, see :func:`load_recording`.
+        speed: Playback speed relative to the recording, ``None`` to replay
+            as fast as possible.
+    """
+
+    def __init__(
+        self, frames: List[Tuple[float, str, str]], speed: Optional[float] = 1.0
+    ):
+        self.frames = [
+            (when, frame)
+            for when, direction, frame in frames
+            if direction == READ and json.loads(frame).get("msg") == "changed"
+        ]
+        self.speed = speed
+        self.replayed = 0
+        self.sent = 0
+        self.last_activity = 0.0
+        self.exhausted = asyncio.Event()
+        self._replies: "asyncio.Queue[str]" = asyncio.Queue()
+        self._start: Optional[float] = None
+        if not self.frames:
+            self.exhausted.set()
+
+    async def recv(self) -> str:
+        """ Gets the next reply or the next recorded frame once it is due. """
+        if not self._replies.empty() or self.replayed == len(self.frames):
+            return await self._replies.get()
+
+        if self._start is None:
+            self._start = time.perf_counter()
+        when, frame = self.frames[self.replayed]
+        if self.speed is not None:
+            delay = self._start + when / self.speed - time.perf_counter()
+            if delay > 0:
+                reply = asyncio.ensure_future(self._replies.get())
+                done, _ = await asyncio.wait({reply}, timeout=delay)
+                if done:
+                    return reply.result()
+                reply.cancel()
+
+        self.replayed += 1
+        self.last_activity = time.perf_counter()
+        if self.replayed == len(self.frames):
+            self.exhausted.set()
+        return frame
+
+    async def send(self, frame: str):
+        """ Answers a frame written by the bot. """
+        self.sent += 1
+        self.last_activity = time.perf_counter()
+        data = json.loads(frame)
+        msg = data.get("msg")
+        if msg == "method":
+            params = data.get("params") or [{}]
+            result = {"_id": params[0].get("_id") or str(uuid.uuid4())}
+            reply = {"msg": "result", "id": data["id"], "result": result}
+        elif msg == "sub":
+            reply = {"msg": "ready", "subs": [data["id"]]}
+        elif msg == "connect":
+            reply = {"msg": "connected", "session": str(uuid.uuid4())}
+        else:
+            return
+        self._replies.put_nowait(json.dumps(reply))
+
+
+@dataclasses.dataclass
+class ReplayStats:
+    """
+    Outcome of a replay.
+
+    Args:
+        replayed: Recorded frames fed to the bot.
+        sent: Frames the bot wrote.
+        elapsed: Seconds from the start until the last frame was replayed or
+            written.
+    """
+
+    replayed: int
+    sent: int
+    elapsed: float
+
+
+async def replay(
+    app,
+    path: str,
+    *,
+    speed: Optional[float] = 1.0,
+    username: str = "bot",
+    idle: float = 0.1,
+    timeout: float = 60.0,
+    persist: bool = False,
+) -> ReplayStats:
+    """
+    Replays a recording into a bot's dispatch, without a server.
+
+    Args:
+        app: :class:`rocketchatbot.RocketChatBot` with its handlers registered.
+        path: Recording written by :class:`FrameRecorder`.
+        speed: Playback speed relative to the recording, ``None`` to replay
+            as fast as possible.
+        username: Name the bot ignores messages from.
+        idle: Seconds without pending calls or writes after the last frame
+            that count as done.
+        timeout: Seconds to wait for handlers after the last frame.
+        persist: ``True`` to keep the bot's scheduler, state, rate limit and
+            log files.  By default they are swapped for in-memory stores and
+            logs are written to a temporary directory, so a replay doesn't
+            leave timers or state behind for the next real run.
+
+    Returns:
+        Replay statistics.
+    """
+    ws = ReplaySocket(load_recording(path), speed)
+    scratch = None
+    if not persist:
+        scratch = tempfile.mkdtemp(prefix="replay-")
+        app.scheduler = Scheduler()
+        app.state = StateStore()
+        app.rate_limiter.path = None
+        app._recorder = None
+        for log in app._logs:
+            log.path = os.path.join(scratch, os.path.basename(log.path))
+
+    app._configure(username, "", "replay.invalid", ssl=False)
+    app._write_queue = asyncio.Queue()
+    app._chat_queue = asyncio.Queue()
+    app._connected = asyncio.Event()
+
+    start = time.perf_counter()
+    tasks = [
+        asyncio.create_task(app._write_loop(ws)),
+        asyncio.create_task(app._read_loop(ws)),
+        asyncio.create_task(app._chat_loop()),
+    ]
+    try:
+        await ws.exhausted.wait()
+        deadline = time.perf_counter() + timeout
+        sent = -1
+        while time.perf_counter() < deadline:
+            busy = (
+                app._chat_queue.qsize()
+                or app._write_queue.qsize()
+                or app._completion_event
+                or app._acks
+            )
+            if not busy and sent == ws.sent:
+                break
+            sent = ws.sent
+            await asyncio.sleep(idle)
+        elapsed = max(ws.last_activity - start, 0.0)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if scratch is not None:
+            for log in app._logs:
+                await log.close()
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    return ReplayStats(replayed=ws.replayed, sent=ws.sent, elapsed=elapsed)
@@ -0,0 +1,401 @@
+import asyncio
+import collections
+import dataclasses
+import email.utils
+import json
+import logging
+import time
+from typing import Callable, Dict, Mapping, Optional, Tuple, Union
+import aiohttp
+from multidict import CIMultiDict
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+
+
+@dataclasses.dataclass
+class RestResponse:
+    """
+    Fully read REST response.
+
+    Args:
+        status: HTTP status code.
+        headers: Response headers.
+        body: Response body.
+        request_info: Request that produced the response.
+        cached: ``True`` if the body was served from the conditional GET cache.
+    """
+
+    status: int
+    headers: Mapping[str, str]
+    body: bytes
+    request_info: Optional[aiohttp.RequestInfo] = None
+    cached: bool = False
+
+    def text(self, encoding: str = "UTF-8") -> str:
+        """ Body decoded as text. """
+        return self.body.decode(encoding)
+
+    def json(self):
+        """ Body decoded as JSON. """
+        return json.loads(self.body)
+
+    def raise_for_status(self):
+        """
+        Raises:
+            aiohttp.ClientResponseError: status code is not 2xx or 304.
+        """
+        if not (200 <= self.status < 300 or self.status == 304):
+            raise aiohttp.ClientResponseError(
+                request_info=self.request_info,
+                history=(),
+                status=self.status,
+                message=self.body.decode(errors="replace"),
+                headers=self.headers,
+            )
+
+
+@dataclasses.dataclass
+class EndpointStats:
+    """ Latency statistics for one endpoint. """
+
+    count: int = 0
+    errors: int = 0
+    retries: int = 0
+    cache_hits: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        """ Mean request latency in seconds. """
+        return self.total / self.count if self.count else 0.0
+
+    def record(self, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+
+def retry_delay(
+    headers: Mapping[str, str], now: Optional[float] = None
+) -> Optional[float]:
+    """
+    Gets the server requested delay before retrying a request.
+
+    Honours ``Retry-After`` (seconds or HTTP date) and Rocket.Chat's
+    ``X-RateLimit-Reset`` (epoch milliseconds).
+
+    Args:
+        headers: Response headers.
+        now: Current epoch time, defaults to :func:`time.time`.
+
+    Returns:
+        Delay in seconds, ``None`` if the server did not request one.
+    """
+    if now is None:
+        now = time.time()
+
+    retry_after = headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                date = email.utils.parsedate_to_datetime(retry_after)
+            except (TypeError, ValueError):
+                pass
+            else:
+                return max(0.0, date.timestamp() - now)
+
+    reset = headers.get("X-RateLimit-Reset")
+    if reset is not None:
+        try:
+            return max(0.0, int(reset) / 1000 - now)
+        except ValueError:
+            pass
+
+    return None
+
+
+def create_session(
+    *,
+    limit: int = 32,
+    limit_per_host: int = 16,
+    keepalive_timeout: float = 60.0,
+    ttl_dns_cache: int = 300,
+) -> aiohttp.ClientSession:
+    """
+    Creates a session pooling connections the way :class:`RestClient` does.
+
+    Args:
+        limit: Total number of pooled connections.
+        limit_per_host: Number of pooled connections per host.
+        keepalive_timeout: Seconds to keep idle connections alive.
+        ttl_dns_cache: Seconds to cache DNS resolutions.
+
+    Returns:
+        Session to share between clients with their ``session`` argument.
+    """
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=limit,
+            limit_per_host=limit_per_host,
+            keepalive_timeout=keepalive_timeout,
+            ttl_dns_cache=ttl_dns_cache,
+            use_dns_cache=True,
+        )
+    )
+
+
+async def _save(resp: aiohttp.ClientResponse, file: str):
+    """ Writes a response body to a file in chunks, off the event loop. """
+    loop = asyncio.get_running_loop()
+    f = await loop.run_in_executor(None, open, file, "wb")
+    try:
+        async for chunk in resp.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+            await loop.run_in_executor(None, f.write, chunk)
+    finally:
+        await loop.run_in_executor(None, f.close)
+
+
+class RestClient:
+    """
+    Pooled REST client with retries, conditional GETs and latency stats.
+
+    Args:
+        base_url: URL prepended to all request paths.
+        ssl: SSL context to utilize.
+        limit: Total number of pooled connections.
+        limit_per_host: Number of pooled connections per host.
+        keepalive_timeout: Seconds to keep idle connections alive.
+        ttl_dns_cache: Seconds to cache DNS resolutions.
+        max_retries: Retries for rate limited or failed requests.
+        backoff: Initial retry delay when the server does not request one.
+        max_backoff: Upper bound of any retry delay.
+        cache_size: Number of GET responses kept for conditional requests.
+        session: Session shared with other clients, e.g. from
+            :func:`create_session`, its connection pool is used instead of
+            creating one and it is left open on close.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        ssl=None,
+        limit: int = 32,
+        limit_per_host: int = 16,
+        keepalive_timeout: float = 60.0,
+        ttl_dns_cache: int = 300,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 60.0,
+        cache_size: int = 256,
+        session: Optional[aiohttp.ClientSession] = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.base_url = base_url.rstrip("/")
+        self.headers: Dict[str, str] = {}
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.cache_size = cache_size
+        self._ssl = ssl
+        self._connector_args = dict(
+            limit=limit,
+            limit_per_host=limit_per_host,
+            keepalive_timeout=keepalive_timeout,
+            ttl_dns_cache=ttl_dns_cache,
+        )
+        self._session: Optional[aiohttp.ClientSession] = session
+        self._owns_session = session is None
+        self._cache: "collections.OrderedDict[Tuple, RestResponse]" = (
+            collections.OrderedDict()
+        )
+        self._blocked_until: Dict[str, float] = {}
+        self._stats: Dict[str, EndpointStats] = collections.defaultdict(
+            EndpointStats
+        )
+
+    async def __aenter__(self) -> "RestClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def open(self):
+        """ Creates the pooled session. """
+        if self._session is None:
+            self._session = create_session(**self._connector_args)
+
+    async def close(self):
+        """ Closes the pooled session and its connections, unless shared. """
+        if self._session is not None and self._owns_session:
+            await self._session.close()
+            self._session = None
+
+    def stats(self) -> Dict[str, EndpointStats]:
+        """ Latency statistics keyed by endpoint. """
+        return dict(self._stats)
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: Optional[dict] = None,
+        data: Union[None, dict, bytes, Callable] = None,
+        headers: Optional[dict] = None,
+        endpoint: Optional[str] = None,
+        cache: bool = False,
+        save_to: Optional[str] = None,
+    ) -> RestResponse:
+        """
+        Performs a request.
+
+        Args:
+            method: HTTP method.
+            path: Path relative to the base URL, or an absolute URL.
+            params: Query parameters.
+            data:
+                Request body.  A callable is invoked for every attempt,
+                allowing bodies such as file uploads to be rebuilt on retry.
+            headers: Extra headers, merged over the authentication headers.
+            endpoint: Name to record statistics under, defaults to ``path``.
+            cache: ``True`` to send conditional GETs and reuse cached bodies.
+            save_to: File to stream a ``200`` response body to, written off
+                the event loop.  The returned response has an empty body.
+
+        Returns:
+            Fully read response.
+
+        Raises:
+            aiohttp.ClientError: request failed after all retries.
+        """
+        if self._session is None:
+            await self.open()
+
+        method = method.upper()
+        if endpoint is None:
+            endpoint = path
+        url = path if "://" in path else f"{self.base_url}{path}"
+        stats = self._stats[endpoint]
+        req_headers = {**self.headers, **(headers or {})}
+
+        cache_key = None
+        cached = None
+        if cache and method == "GET":
+            cache_key = (url, tuple(sorted((params or {}).items())))
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                etag = cached.headers.get("ETag")
+                last_modified = cached.headers.get("Last-Modified")
+                if etag is not None:
+                    req_headers["If-None-Match"] = etag
+                if last_modified is not None:
+                    req_headers["If-Modified-Since"] = last_modified
+
+        attempt = 0
+        while True:
+            blocked = self._blocked_until.get(endpoint, 0.0) - time.monotonic()
+            if blocked > 0:
+                await asyncio.sleep(min(blocked, self.max_backoff))
+
+            body = data() if callable(data) else data
+            start = time.perf_counter()
+            try:
+                async with self._session.request(
+                    method,
+                    url,
+                    params=params,
+                    data=body,
+                    headers=req_headers,
+                    ssl=self._ssl,
+                ) as resp:
+                    if save_to is not None and resp.status == 200:
+                        await _save(resp, save_to)
+                        content = b""
+                    else:
+                        content = await resp.read()
+                    response = RestResponse(
+                        status=resp.status,
+                        headers=CIMultiDict(resp.headers),
+                        body=content,
+                        request_info=resp.request_info,
+                    )
+            except aiohttp.ClientConnectionError:
+                stats.record(time.perf_counter() - start)
+                stats.errors += 1
+                if method not in IDEMPOTENT_METHODS or attempt >= self.max_retries:
+                    raise
+                delay = None
+            else:
+                stats.record(time.perf_counter() - start)
+                self._update_rate_limit(endpoint, response.headers)
+
+                retryable = response.status == 429 or (
+                    response.status in RETRY_STATUS and method in IDEMPOTENT_METHODS
+                )
+                if not retryable or attempt >= self.max_retries:
+                    break
+                stats.errors += 1
+                delay = retry_delay(response.headers)
+
+            if delay is None:
+                delay = self.backoff * 2 ** attempt
+            delay = min(delay, self.max_backoff)
+            attempt += 1
+            stats.retries += 1
+            self.logger.debug(f"retrying {method} {endpoint} in {delay:.3f}s")
+            await asyncio.sleep(delay)
+
+        if response.status >= 400:
+            stats.errors += 1
+
+        if cache_key is not None:
+            if response.status == 304 and cached is not None:
+                stats.cache_hits += 1
+                self._cache.move_to_end(cache_key)
+                return dataclasses.replace(cached, cached=True)
+            elif response.status == 200 and (
+                "ETag" in response.headers or "Last-Modified" in response.headers
+            ):
+                self._cache[cache_key] = response
+                self._cache.move_to_end(cache_key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return response
+
+    async def get(self, path: str, **kwargs) -> RestResponse:
+        """ Performs a GET request, see :meth:`request`. """
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> RestResponse:
+        """ Performs a POST request, see :meth:`request`. """
+        return await self.request("POST", path, **kwargs)
+
+    async def download(self, path: str, file: str, **kwargs) -> RestResponse:
+        """
+        Streams a GET response body to a file, see :meth:`request`.
+
+        Args:
+            path: Path relative to the base URL, or an absolute URL.
+            file: File to write, only created if the response is a ``200``.
+            **kwargs: :meth:`request` options.
+        """
+        return await self.request("GET", path, save_to=file, **kwargs)
+
+    def _update_rate_limit(self, endpoint: str, headers: Mapping[str, str]):
+        """ Blocks an endpoint until reset once its rate limit is exhausted. """
+        reset = headers.get("X-RateLimit-Reset")
+        if headers.get("X-RateLimit-Remaining") == "0" and reset is not None:
+            delay = retry_delay({"X-RateLimit-Reset": reset})
+            if delay:
+                self._blocked_until[endpoint] = time.monotonic() + delay
+        else:
+            self._blocked_until.pop(endpoint, None)
@@ -1,4 +1,7 @@
-from typing import Optional, List
+from typing import TYPE_CHECKING, Optional, List
+
+if TYPE_CHECKING:
+    from rocketchatbot import RocketChatBot
 
 
 class User:
@@ -200,8 +203,13 @@ class Message:
 
     .. _`API reference page`:
         https://rocket.chat/docs/developer-guides/realtime-api/the-message-object/
+
+    Attributes:
+        bot: Bot that received the message, set before it is dispatched.
     """
 
+    bot: "RocketChatBot"
+
     def __init__(self, data: List[dict]):
         self._data = data[0]
         self._room_data = data[1]
@@ -226,6 +234,14 @@ class Message:
         """ Epoch timestamp. """
         return self._data["ts"]["$date"]
 
+    @property
+    def type(self) -> Optional[str]:
+        """
+        System message type, e.g. ``"ul"`` for a user leaving.  ``None`` for
+        chat messages.
+        """
+        return self._data.get("t")
+
     @property
     def user(self) -> User:
         """ User structure. """
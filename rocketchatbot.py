@@ -1,25 +1,93 @@
 import asyncio
 import logging
-import logging.config
 import inspect
 import uuid
 import json
 import copy
+import importlib.util
 import os
 import re
+import signal
+import sys
+import threading
 import time
-import websockets
 import queue
 import shlex
 import aiohttp
 import dataclasses
-from typing import Optional, List, NamedTuple
+from typing import TYPE_CHECKING, Optional, List, NamedTuple
+from typing import AsyncIterator, Dict, Iterable
 from typing import Callable
 from typing import Union
 from typing import Pattern
+from typing import Tuple
+from types import ModuleType
 from rocketchat_data import Message
+from directory import Directory
+from rest import RestClient
+from scheduler import Scheduler
+from periodic import CronSchedule, PeriodicJob, PeriodicJobs
+from ratelimit import RateLimit, RateLimiter
+from cache import CachePolicy, ResponseCache
+from logwriter import LogWriter
+from state import StateStore
+from metrics import MetricsServer, Registry
+from tracing import Tracer
+from loopmonitor import LoopMonitor
+from recorder import READ, WRITE, FrameRecorder
+from waiters import MessageStream, Predicate, WaiterRegistry
 from args import ArgumentParser
 from args import arg
+from util import module_name, qualified_name
+
+if TYPE_CHECKING:
+    from sharding import ShardPool
+
+EVENT_LOOPS = ("asyncio", "uvloop", "auto")
+
+
+def event_loop_policy(name: str) -> asyncio.AbstractEventLoopPolicy:
+    """
+    Gets the policy creating event loops of a runtime.
+
+    Args:
+        name: ``"asyncio"``, ``"uvloop"``, or ``"auto"`` for uvloop if it
+            is installed and asyncio otherwise.
+
+    Returns:
+        Event loop policy.
+
+    Raises:
+        ValueError: Unknown event loop.
+        ImportError: ``"uvloop"`` requested but not installed.
+    """
+    if name not in EVENT_LOOPS:
+        raise ValueError(f"Unknown event loop {name}")
+    if name != "asyncio":
+        try:
+            import uvloop
+        except ImportError:
+            if name == "uvloop":
+                raise
+            logging.getLogger(__name__).info("uvloop not installed, using asyncio")
+        else:
+            return uvloop.EventLoopPolicy()
+    return asyncio.DefaultEventLoopPolicy()
+
+
+class DDPError(Exception):
+    """
+    Error returned by the server for a DDP method call.
+
+    Args:
+        error: Error object of the ``result`` message.
+    """
+
+    def __init__(self, error: dict):
+        self.error = error
+        super().__init__(
+            error.get("reason") or error.get("message") or str(error.get("error"))
+        )
 
 
 class _Command(NamedTuple):
@@ -30,13 +98,17 @@ class _Command(NamedTuple):
         coro: Coroutine callable for the command.
         help: Help text.
         args: Arguments for the command.
-        rooms: Whitelist of rooms to allow this command in.
+        rooms: Whitelist of room IDs or names to allow this command in.
+        timeout: Seconds before the handler is cancelled.
+        cache: Memoized responses.
     """
 
     coro: Callable
     help: str
     args: Optional[List[arg]]
     rooms: Optional[List[str]]
+    timeout: Optional[float] = None
+    cache: Optional[ResponseCache] = None
 
 
 @dataclasses.dataclass
@@ -46,13 +118,23 @@ class _Match:
 
     Args:
         coro: Coroutine callable for the match.
+        pattern: Pattern to match messages against.
         rate_limit: Rate limit for the match.
+        name: Name the rate limit state is kept under.
+        after: Names of match handlers that must finish first.
+        timeout: Seconds before the handler is cancelled.
     """
 
     coro: Callable
     pattern: Pattern
-    rate_limit: Optional[int]
-    last_called: Optional[int] = None
+    rate_limit: Optional[RateLimit]
+    name: str
+    after: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+
+    def is_named(self, names: Iterable[str]) -> bool:
+        """ Checks if the handler is referred to by any of the names. """
+        return any(n == self.name or n == self.coro.__name__ for n in names)
 
 
 class RocketChatBot:
@@ -60,11 +142,30 @@ class RocketChatBot:
     Application class.
 
     Args:
-        log_config: override default logging config
+        log_config: override default logging config, applied when the bot
+            starts, ``False`` to leave logging as configured
         prefix: prefix for all bot commands
+        directory_ttl: seconds before an idle room or user is evicted from
+            the directory cache
+        scheduler_path: SQLite database persisting scheduled messages,
+            ``None`` to keep them in memory
+        rate_limit_path: JSON file persisting match rate limits,
+            ``None`` to keep them in memory
+        state_path: SQLite database persisting :attr:`state`,
+            ``None`` to keep it in memory
+        metrics_port: local port serving :attr:`metrics` at ``/metrics``,
+            ``None`` to not serve them
+        loop_monitor: monitor shared with another bot, which exports its
+            metrics, ``None`` to create one exporting to :attr:`metrics`
     """
 
     ENCODING = "UTF-8"
+    WRITE_BATCH_SIZE = 64
+    STREAM_EDIT_INTERVAL = 0.5
+    SEND_MESSAGE_FRAME = (
+        '{{"msg": "method", "id": "{msg_id}", "method": "sendMessage", '
+        '"params": [{{"_id": "{message_id}", "rid": {room_id}, "msg": {message}}}]}}'
+    )
 
     LOGGING_CONFIG_DEFAULTS = {
         "version": 1,
@@ -85,15 +186,104 @@ class RocketChatBot:
         "root": {"level": "DEBUG", "handlers": ["console"]},
     }
 
-    def __init__(self, log_config: Optional[dict] = None, prefix: str = "!"):
-        logging.config.dictConfig(log_config or self.LOGGING_CONFIG_DEFAULTS)
+    def __init__(
+        self,
+        log_config: Union[None, bool, dict] = None,
+        prefix: str = "!",
+        directory_ttl: float = 3600.0,
+        scheduler_path: Optional[str] = None,
+        rate_limit_path: Optional[str] = None,
+        state_path: Optional[str] = None,
+        metrics_port: Optional[int] = None,
+        loop_monitor: Optional[LoopMonitor] = None,
+    ):
+        self._log_config = log_config
         self.logger = logging.getLogger(__name__)
         self.prefix = prefix
         self.start_time = time.time()
         self._completion_event = {}
         self._completion = {}
+        self._acks = {}
         self._commands = {}
+        self._parsers: Dict[Tuple[str, Tuple[str, ...]], ArgumentParser] = {}
         self._match = []
+        self.directory = Directory(ttl=directory_ttl)
+        self.waiters = WaiterRegistry()
+        self.user_id = None
+        self.rest: Optional[RestClient] = None
+        self.scheduler = Scheduler(scheduler_path)
+        self.periodic = PeriodicJobs()
+        # loaded once the bot is configured to run, see _load_rate_limits
+        self.rate_limiter = RateLimiter()
+        self.rate_limiter.path = rate_limit_path
+        self._rate_limits_loaded = False
+        self._logs: List[LogWriter] = []
+        self.state = StateStore(state_path)
+        self.metrics = Registry()
+        self.tracer = Tracer()
+        self.loop_monitor = loop_monitor or LoopMonitor(self.metrics)
+        self._recorder: Optional[FrameRecorder] = None
+        self._shards: Optional["ShardPool"] = None
+        self._reload_files: Dict[str, str] = {}
+        self._reload_mtimes: Dict[str, float] = {}
+        self._reload_signal: Optional[int] = None
+        self._staged_jobs: Optional[List[PeriodicJob]] = None
+        self._metrics_server = None
+        if metrics_port is not None:
+            self._metrics_server = MetricsServer(self.metrics, port=metrics_port)
+        self._init_metrics()
+        if rate_limit_path is not None:
+            self.every(60, name="rate-limit-save")(self._save_rate_limits)
+
+    def _init_metrics(self):
+        """ Registers the runtime metrics. """
+
+        def queue_depth(name: str) -> Callable[[], int]:
+            return lambda: getattr(self, name).qsize() if hasattr(self, name) else 0
+
+        metrics = self.metrics
+        self._frames_read = metrics.counter(
+            "rocketchat_frames_read_total", "Websocket frames read."
+        )
+        self._frames_written = metrics.counter(
+            "rocketchat_frames_written_total", "Websocket frames written."
+        )
+        self._dispatched = metrics.counter(
+            "rocketchat_messages_dispatched_total",
+            "Messages dispatched to handlers.",
+            ("kind", "handler"),
+        )
+        self._handler_latency = metrics.histogram(
+            "rocketchat_handler_seconds",
+            "Handler run time including posting the response.",
+            ("kind", "handler"),
+        )
+        self._ddp_rtt = metrics.histogram(
+            "rocketchat_ddp_call_seconds", "DDP method call round trip.", ("method",)
+        )
+        self._upload_bytes = metrics.counter(
+            "rocketchat_upload_bytes_total", "Bytes of uploaded files."
+        )
+        metrics.gauge(
+            "rocketchat_write_queue_depth",
+            "Frames waiting to be written.",
+            func=queue_depth("_write_queue"),
+        )
+        metrics.gauge(
+            "rocketchat_chat_queue_depth",
+            "Chat messages waiting to be dispatched.",
+            func=queue_depth("_chat_queue"),
+        )
+        metrics.gauge(
+            "rocketchat_pending_calls",
+            "DDP calls awaiting a result.",
+            func=lambda: len(self._completion_event) + len(self._acks),
+        )
+        metrics.gauge(
+            "rocketchat_message_waiters",
+            "Message streams and wait_for calls awaiting messages.",
+            func=lambda: len(self.waiters),
+        )
 
     def run(
         self,
@@ -103,6 +293,8 @@ class RocketChatBot:
         *,
         port: Optional[int] = None,
         ssl=None,
+        workers: int = 0,
+        loop: str = "asyncio",
     ):
         """
         Start execution of the bot.
@@ -112,36 +304,185 @@ class RocketChatBot:
             password: password for the assoicated username
             hostname: hostname or IPv4 of the RocketChat server
             port: RocketChat server port
-            ssl: SSL context to utilize
+            ssl: SSL context to utilize, ``False`` for plain ws/http
+            workers: number of worker processes to dispatch messages to,
+                sharded by room, ``0`` to dispatch in this process
+            loop: event loop to run on, see :func:`event_loop_policy`,
+                workers run on the same one
+        """
+        policy = asyncio.get_event_loop_policy()
+        asyncio.set_event_loop_policy(event_loop_policy(loop))
+        self._configure(username, password, hostname, port=port, ssl=ssl)
+        if workers:
+            self.start_workers(workers)
+        try:
+            asyncio.run(self._bootstrap())
+        finally:
+            self.stop_workers()
+            asyncio.set_event_loop_policy(policy)
+
+    async def start(
+        self,
+        username: str,
+        password: str,
+        hostname: str,
+        *,
+        port: Optional[int] = None,
+        ssl=None,
+        session: Optional[aiohttp.ClientSession] = None,
+    ):
+        """
+        Runs the bot in the running event loop until it disconnects.
+
+        Several bots, e.g. from :meth:`clone`, can run concurrently in one
+        event loop, sharing its default executor.  Pass them a session from
+        :func:`rest.create_session` to also share REST connections::
+
+            async with create_session() as session:
+                await asyncio.gather(
+                    app.start("bot", "pw", "chat.example.com", session=session),
+                    app.clone().start("bot", "pw", "example.org", session=session),
+                )
+
+        Args:
+            username: username for the account to run the bot
+            password: password for the assoicated username
+            hostname: hostname or IPv4 of the RocketChat server
+            port: RocketChat server port
+            ssl: SSL context to utilize, ``False`` for plain ws/http
+            session: session whose connection pool REST requests share
+                with other bots, see :func:`rest.create_session`
+        """
+        self._configure(
+            username, password, hostname, port=port, ssl=ssl, session=session
+        )
+        await self._bootstrap()
+
+    def clone(self, **options) -> "RocketChatBot":
+        """
+        Creates a bot for another account or server with the same handlers.
+
+        Commands and match handlers are shared, including those registered
+        later and the response caches of commands.  The tracer and loop
+        monitor are shared too, loop metrics are only exported by this bot.
+        Everything bound to a connection, like the directory, scheduler,
+        periodic jobs, rate limits and state, is not.
+        Handlers reach the bot that received a message as ``message.bot``.
+
+        Args:
+            **options: Constructor arguments other than ``log_config`` and
+                ``loop_monitor``, ``prefix`` defaults to the one of this bot.
+
+        Returns:
+            New bot, start it with :meth:`start`.
         """
+        options.setdefault("prefix", self.prefix)
+        bot = type(self)(log_config=False, loop_monitor=self.loop_monitor, **options)
+        bot._commands = self._commands
+        bot._parsers = self._parsers
+        bot._match = self._match
+        bot.tracer = self.tracer
+        return bot
+
+    def start_workers(self, workers: int):
+        """
+        Forks worker processes to dispatch messages to, see :meth:`run`.
+
+        Must be called before the event loop starts.
+
+        Args:
+            workers: number of worker processes
+        """
+        from sharding import ShardPool
+
+        self._shards = ShardPool(workers)
+        self._shards.start(self)
+
+    def stop_workers(self):
+        """ Stops the worker processes, if any. """
+        if self._shards is not None:
+            self._shards.stop()
+            self._shards = None
+
+    def _configure(
+        self,
+        username: str,
+        password: str,
+        hostname: str,
+        *,
+        port: Optional[int] = None,
+        ssl=None,
+        session: Optional[aiohttp.ClientSession] = None,
+    ):
+        """ Sets up the connection parameters, see :meth:`run`. """
+        self._setup_logging()
+        self._load_rate_limits()
         self.username = username
         self.password = password
         self.hostname = hostname.strip("/")
         self.port = port
         self._ssl = ssl
-        self._session = None
 
         port_str = f":{self.port}" if port is not None else ""
 
-        self._ws_url = f"wss://{self.hostname}{port_str}/websocket"
-        s = "s" if ssl is None else ""
+        s = "" if ssl is False else "s"
+        self._ws_url = f"ws{s}://{self.hostname}{port_str}/websocket"
         self._http_url = f"http{s}://{self.hostname}{port_str}"
         self._rest_url = f"{self._http_url}/api/v1"
+        self.rest = RestClient(self._rest_url, ssl=ssl, session=session)
+        self._ready = asyncio.Event()
 
-        asyncio.run(self._bootstrap())
+    def _load_rate_limits(self):
+        """
+        Loads the persisted rate limits, once.
+
+        Deferred from construction, so modules constructing bots while
+        being reloaded don't read the file.
+        """
+        if not self._rate_limits_loaded and self.rate_limiter.path is not None:
+            self.rate_limiter.load()
+        self._rate_limits_loaded = True
+
+    def _setup_logging(self):
+        """ Applies the logging config, once. """
+        if self._log_config is False:
+            return
+        import logging.config
+
+        # loggers of handlers and components exist by now, keep them working
+        config = {
+            "disable_existing_loggers": False,
+            **(self._log_config or self.LOGGING_CONFIG_DEFAULTS),
+        }
+        logging.config.dictConfig(config)
+        self._log_config = False
 
     async def _bootstrap(self):
         """ Starts the bot. """
+        import websockets.client
+
+        loop = asyncio.get_running_loop()
+        # signal handlers can only be installed from the main thread
+        reload_signal = None
+        if threading.current_thread() is threading.main_thread():
+            reload_signal = self._reload_signal
         self._write_queue = asyncio.Queue()
         self._chat_queue = asyncio.Queue()
         self._connected = asyncio.Event()
+        # results of calls failed when a previous connection closed
+        self._completion = {}
+        ssl = None if self._ssl is False else self._ssl
         async with websockets.client.connect(
-            self._ws_url, ssl=self._ssl
-        ) as ws, aiohttp.ClientSession() as session:
-            self._session = session
+            self._ws_url, ssl=ssl
+        ) as ws, self.rest:
             write_task = asyncio.create_task(self._write_loop(ws))
             read_task = asyncio.create_task(self._read_loop(ws))
-            chat_task = asyncio.create_task(self._chat_loop())
+            if self._shards is None:
+                chat_task = asyncio.create_task(self._chat_loop())
+            else:
+                chat_task = asyncio.gather(
+                    self._shard_loop(), self._shards.collect(self)
+                )
 
             async def ws_bootstrap():
                 # open the connection
@@ -151,9 +492,20 @@ class RocketChatBot:
                 await self._connected.wait()
 
                 # login
-                await self._method(
+                login = await self._method(
                     "login", user={"username": self.username}, password=self.password,
                 )
+                self.user_id = login["id"]
+
+                # keep the directory fresh
+                for event in ("rooms-changed", "subscriptions-changed"):
+                    await self._msg(
+                        "sub",
+                        {
+                            "name": "stream-notify-user",
+                            "params": [f"{self.user_id}/{event}", False],
+                        },
+                    )
 
                 # subscribe to all messages
                 await self._msg(
@@ -165,46 +517,124 @@ class RocketChatBot:
                 )
 
             async def rest_bootstap():
-                async with self._session.post(
-                    url=f"{self._rest_url}/login",
-                    data={"user": self.username, "password": self.password},
-                    ssl=self._ssl,
-                ) as resp:
-                    text = await resp.text()
-                    if resp.status != 200:
-                        self.logger.error(text)
-                    data = json.loads(text)
-
-                self._headers = {
+                resp = await self.rest.post(
+                    "/login", data={"user": self.username, "password": self.password}
+                )
+                if resp.status != 200:
+                    self.logger.error(resp.text())
+                data = resp.json()
+
+                self.rest.headers = {
                     "X-Auth-Token": data["data"]["authToken"],
                     "X-User-Id": data["data"]["userId"],
                 }
 
+            async def startup():
+                await asyncio.gather(rest_bootstap(), ws_bootstrap())
+                await self._prefetch_directory()
+                if self._shards is not None:
+                    self._shards.configure(self)
+                await self.scheduler.start(self.send_message)
+                self.periodic.start(self.scheduler)
+                self.loop_monitor.start()
+                if reload_signal is not None:
+                    loop.add_signal_handler(reload_signal, self.reload)
+                if self._metrics_server is not None:
+                    await self._metrics_server.start()
+                    self.logger.info(
+                        f"serving metrics on port {self._metrics_server.port}"
+                    )
+                self._ready.set()
+
+            tasks = [asyncio.create_task(startup()), write_task, read_task, chat_task]
             try:
-                await asyncio.gather(
-                    rest_bootstap(), ws_bootstrap(), write_task, read_task, chat_task,
-                )
+                await asyncio.gather(*tasks)
             except Exception:
                 self.logger.exception("failed to gather tasks")
                 return
+            finally:
+                if self._shards is not None:
+                    self._shards.close()
+                if reload_signal is not None:
+                    loop.remove_signal_handler(reload_signal)
+                self._fail_pending(ConnectionError("connection closed"))
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await self.loop_monitor.stop()
+                await self.periodic.stop()
+                await self.scheduler.stop()
+                self.rate_limiter.save()
+                await self.state.close()
+                if self._metrics_server is not None:
+                    await self._metrics_server.stop()
+                for log in self._logs:
+                    await log.close()
+
+    async def _prefetch_directory(self):
+        """ Fills the directory with all rooms and users in bulk. """
+        try:
+            rooms = await self._method("rooms/get", **{"$date": 0})
+            if isinstance(rooms, dict):
+                rooms = rooms.get("update", [])
+            for room in rooms or []:
+                self.directory.update_room(room, joined=True)
+        except Exception:
+            self.logger.exception("failed to prefetch rooms")
+
+        offset = 0
+        count = 500
+        try:
+            while True:
+                resp = await self.rest.get(
+                    "/users.list",
+                    params={"offset": offset, "count": count},
+                )
+                if resp.status != 200:
+                    self.logger.warning(f"failed to prefetch users: {resp.text()}")
+                    break
+                data = resp.json()
+
+                for user in data["users"]:
+                    self.directory.update_user(user)
+
+                offset += data["count"]
+                if not data["count"] or offset >= data["total"]:
+                    break
+        except Exception:
+            self.logger.exception("failed to prefetch users")
+
+        self.logger.info(f"directory prefetched {len(self.directory)} entries")
 
     def get_argument_parser(self, room_id: str) -> ArgumentParser:
         """
         Gets the argument parser for a given room.
 
+        Parsers are built on first use and shared by all rooms that allow the
+        same commands, until another command is registered.
+
         Args:
             room_id: Room id.
 
         Returns:
             ArgumentParser object for the room.
         """
-        parser = ArgumentParser(prog=self.prefix, description="Rocket.Chat bot")
-        subparsers = parser.add_subparsers(help="commands")
-        for command_flag, command in self._commands.items():
-            if command.rooms is None or room_id in command.rooms:
+        allowed = tuple(
+            command_flag
+            for command_flag, command in self._commands.items()
+            if command.rooms is None or self.directory.room_in(room_id, command.rooms)
+        )
+        key = (self.prefix, allowed)
+        parser = self._parsers.get(key)
+        if parser is None:
+            parser = ArgumentParser(prog=self.prefix, description="Rocket.Chat bot")
+            subparsers = parser.add_subparsers(help="commands")
+            for command_flag in allowed:
+                command = self._commands[command_flag]
                 subparser = subparsers.add_parser(command_flag, help=command.help)
                 for a in command.args:
                     subparser.add_argument(a.name, type=a.type, help=a.help)
+            self._parsers[key] = parser
 
         return parser
 
@@ -225,67 +655,504 @@ class RocketChatBot:
                 "Required argument `message` missing " f"in the {coro.__name__}() cmd?"
             )
 
-    def match(self, pattern: Union[str, Pattern], rate_limit: Optional[int] = None):
+    def match(
+        self,
+        pattern: Union[str, Pattern],
+        rate_limit: Union[None, int, RateLimit] = None,
+        *,
+        after: Optional[List[Union[str, Callable]]] = None,
+        timeout: Optional[float] = None,
+    ):
+        """
+        Decorator to register a coroutine for messages matching a pattern.
+
+        Match handlers and the command of a message run concurrently.
+
+        Args:
+            pattern: Regular expression matched against the message text.
+            rate_limit:
+                Rate limit, an integer allows one call per that many seconds
+                server wide.
+            after:
+                Match handlers, or their names, that must finish before this
+                one runs when they match the same message.  Names are
+                qualified by module, a script's module by its file name,
+                see :func:`util.qualified_name`.
+            timeout: Seconds before the handler is cancelled.
+
+        Raises:
+            ValueError:
+                Request argument missing from decorated function,
+                or the ordering constraints form a cycle.
+        """
         if isinstance(pattern, str):
             pattern = re.compile(pattern)
+        if isinstance(rate_limit, int):
+            rate_limit = RateLimit(calls=1, period=rate_limit)
+        after = tuple(
+            module_name(a) if isinstance(a, str) else qualified_name(a)
+            for a in after or ()
+        )
 
         def response(coro: Callable) -> Callable:
             self.validate_args(coro)
-            self._match.append(
-                _Match(coro=coro, pattern=pattern, rate_limit=rate_limit)
+            match = _Match(
+                coro=coro,
+                pattern=pattern,
+                rate_limit=rate_limit,
+                name=qualified_name(coro),
+                after=after,
+                timeout=timeout,
             )
+            self._check_match_order(self._match + [match])
+            self._match.append(match)
+            self.loop_monitor.register(f"match {match.name}", coro)
             return coro
 
         return response
 
+    @staticmethod
+    def _check_match_order(matches: List[_Match]):
+        """
+        Checks that match ordering constraints are acyclic.
+
+        Raises:
+            ValueError: The constraints form a cycle.
+        """
+        visiting = set()
+        done = set()
+
+        def visit(match: _Match):
+            if match.name in done:
+                return
+            if match.name in visiting:
+                raise ValueError(f"Match ordering cycle through {match.name}")
+            visiting.add(match.name)
+            for other in matches:
+                if other is not match and other.is_named(match.after):
+                    visit(other)
+            visiting.discard(match.name)
+            done.add(match.name)
+
+        for match in matches:
+            visit(match)
+
     def cmd(
         self,
         command: str,
         args: Optional[List[arg]] = None,
         help: Optional[str] = None,
         rooms: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
+        cache: Union[bool, CachePolicy] = False,
     ):
         """
         Decorator to register a coroutine as a command.
 
+        The coroutine returns the response, or is an async generator whose
+        yielded chunks are posted progressively by editing one message.
+
         Args:
             command: Command without prefix.
             args: Command arguments.
             help: Text to display upon a help command.
-            rooms: Whitelist of rooms to allow the command on.
+            rooms: Whitelist of room IDs or names to allow the command on.
+            timeout: Seconds before the handler is cancelled.
+            cache:
+                ``True`` or a :class:`cache.CachePolicy` to memoize responses
+                of a handler that only depends on its arguments.
 
         Raises:
             ValueError:
                 Request argument missing from decorated function,
-                or multiple handlers defined for one command.
+                multiple handlers defined for one command,
+                or a streaming handler is cached.
         """
         if args is None:
             args = []
+        if cache is True:
+            cache = CachePolicy()
 
         def response(coro: Callable) -> Callable:
             self.validate_args(coro)
 
             if command in self._commands:
                 raise ValueError(f"Multiple handlers defined for {command}")
+            if cache and inspect.isasyncgenfunction(coro):
+                raise ValueError(f"Streaming command {command} cannot be cached")
 
+            self._parsers.clear()
             self._commands[command] = _Command(
-                coro=coro, rooms=rooms, help=help, args=args
+                coro=coro,
+                rooms=rooms,
+                help=help,
+                args=args,
+                timeout=timeout,
+                cache=ResponseCache(cache) if cache else None,
             )
+            self.loop_monitor.register(f"command {command}", coro)
 
             return coro
 
         return response
 
+    def every(
+        self, seconds: float, *, jitter: float = 0.0, name: Optional[str] = None
+    ):
+        """
+        Decorator to run a function periodically.
+
+        Args:
+            seconds: Interval between runs.
+            jitter: Upper bound of a random delay added to every run.
+            name: Job name for metrics, defaults to the function name.
+
+        Raises:
+            ValueError:
+                Invalid interval, or multiple jobs with the same name.
+        """
+        if seconds <= 0:
+            raise ValueError(f"Invalid interval {seconds}")
+
+        def response(func: Callable) -> Callable:
+            self._add_job(
+                PeriodicJob(
+                    name=name or func.__name__,
+                    func=func,
+                    interval=seconds,
+                    jitter=jitter,
+                )
+            )
+            return func
+
+        return response
+
+    def cron(self, expression: str, *, jitter: float = 0.0, name: Optional[str] = None):
+        """
+        Decorator to run a function on a cron schedule.
+
+        Args:
+            expression: Five field cron expression in local time.
+            jitter: Upper bound of a random delay added to every run.
+            name: Job name for metrics, defaults to the function name.
+
+        Raises:
+            ValueError:
+                Invalid expression, or multiple jobs with the same name.
+        """
+        schedule = CronSchedule(expression)
+
+        def response(func: Callable) -> Callable:
+            self._add_job(
+                PeriodicJob(
+                    name=name or func.__name__,
+                    func=func,
+                    cron=schedule,
+                    jitter=jitter,
+                )
+            )
+            return func
+
+        return response
+
+    def messages(
+        self,
+        room_id: Optional[str] = None,
+        user: Optional[str] = None,
+        predicate: Optional[Predicate] = None,
+        *,
+        maxsize: int = 100,
+    ) -> MessageStream:
+        """
+        Iterates over incoming messages, for conversations within a handler::
+
+            async with app.messages(room_id=message.room_id, user=name) as replies:
+                await app.send_message(message.room_id, "What's your guess?")
+                async for reply in replies:
+                    ...
+
+        Messages still reach the command and match handlers.  Messages are
+        buffered from the call on, dropping the oldest beyond ``maxsize``.
+
+        Args:
+            room_id: Room the messages are posted in, ``None`` for any room.
+            user: Username of the author, ``None`` for any user.
+            predicate: Further filter on the messages.
+            maxsize: Number of buffered messages.
+
+        Returns:
+            Stream of messages, close it or leave the ``async with`` block to
+            stop receiving messages.
+        """
+        return self.waiters.stream(room_id, user, predicate, maxsize)
+
+    async def wait_for(
+        self,
+        predicate: Optional[Predicate] = None,
+        timeout: Optional[float] = None,
+        *,
+        room_id: Optional[str] = None,
+        user: Optional[str] = None,
+    ) -> Message:
+        """
+        Waits for the next incoming message.
+
+        Args:
+            predicate: Filter on the messages.
+            timeout: Seconds to wait, ``None`` to wait indefinitely.
+            room_id: Room the message is posted in, ``None`` for any room.
+            user: Username of the author, ``None`` for any user.
+
+        Returns:
+            First matching message.
+
+        Raises:
+            asyncio.TimeoutError: No message matched in time.
+        """
+        return await self.waiters.wait_for(
+            predicate, timeout, room_id=room_id, user=user
+        )
+
+    def _add_job(self, job: PeriodicJob):
+        """ Registers a periodic job, or stages it while reloading. """
+        if self._staged_jobs is not None:
+            self._staged_jobs.append(job)
+        else:
+            self.periodic.add(job)
+
+    def hot_reload(
+        self,
+        *modules: Union[str, ModuleType],
+        signum: Optional[int] = signal.SIGHUP,
+        interval: Optional[float] = 1.0,
+    ):
+        """
+        Reloads handler modules on a signal or when their files change.
+
+        Args:
+            *modules: Modules defining handlers, or their names.
+            signum: Signal triggering a reload, ``None`` for none.  Only
+                handled when the bot runs on the main thread.
+            interval: Seconds between checks of the module files, ``None`` to
+                not watch them.
+        """
+        for module in modules:
+            if isinstance(module, str):
+                module = sys.modules[module]
+            self._reload_files[module.__name__] = module.__file__
+            self._reload_mtimes[module.__file__] = os.stat(module.__file__).st_mtime
+        self._reload_signal = signum
+        if interval is not None:
+            self.every(interval, name="hot-reload")(self._check_reload)
+
+    async def _check_reload(self):
+        """ Reloads once a module file changed. """
+        changed = False
+        for path, mtime in self._reload_mtimes.items():
+            try:
+                current = os.stat(path).st_mtime
+            except OSError:
+                continue
+            if current != mtime:
+                self._reload_mtimes[path] = current
+                changed = True
+        if changed:
+            self.reload()
+
+    def reload(self, *modules: Union[str, ModuleType]) -> bool:
+        """
+        Reloads handler modules in place, without reconnecting.
+
+        Each module runs again from its file as a new module, ``__main__``
+        as ``__mp_main__`` so it doesn't start another bot.  Once all modules
+        loaded, the handlers and periodic jobs they registered, on this bot
+        or on bots they constructed, replace the previous ones in one step.
+        The modules' references to the bots they constructed and to the logs
+        those opened are pointed at this bot and its logs, other options of
+        those bots are ignored.  Constructing a bot starts nothing and loads
+        no files, so these bots are cheap to discard.  Handlers already
+        running finish on the old code, timers and state are kept.  Worker
+        processes keep their handlers.
+
+        Args:
+            *modules: Modules or module names, defaults to those passed to
+                :meth:`hot_reload`.
+
+        Returns:
+            ``True`` if reloaded, ``False`` if a module failed to load and
+            the previous handlers were kept.
+        """
+        files = dict(self._reload_files)
+        if modules:
+            files = {}
+            for module in modules:
+                if isinstance(module, str):
+                    module = sys.modules[module]
+                files[module.__name__] = module.__file__
+
+        names = set(files)
+        if "__main__" in names:
+            names.add("__mp_main__")
+        commands, matches = self._commands, self._match
+        self._commands = {
+            command_flag: command
+            for command_flag, command in commands.items()
+            if command.coro.__module__ not in names
+        }
+        self._match = [match for match in matches if match.coro.__module__ not in names]
+        self._staged_jobs = []
+        try:
+            loaded = [self._load_module(name, path) for name, path in files.items()]
+        except Exception:
+            self.logger.exception(f"failed to reload {', '.join(files)}")
+            self._commands, self._match = commands, matches
+            return False
+        finally:
+            jobs, self._staged_jobs = self._staged_jobs, None
+        for module in loaded:
+            jobs.extend(self._adopt_module(module))
+
+        # swap in place, clones share the handler tables
+        commands.clear()
+        commands.update(self._commands)
+        matches[:] = self._match
+        self._commands, self._match = commands, matches
+        self._parsers.clear()
+        for job in jobs:
+            self.periodic.add(job, replace=True)
+        for module in loaded:
+            if module.__name__ != "__main__" and module.__name__ in sys.modules:
+                sys.modules[module.__name__] = module
+        self.logger.info(f"reloaded {', '.join(files)}")
+        return True
+
+    def _adopt_module(self, module: ModuleType) -> List[PeriodicJob]:
+        """
+        Takes over the handlers of the bots a reloaded module constructed.
+
+        Args:
+            module: Reloaded module.
+
+        Returns:
+            Periodic jobs of the module's bots, to register here.
+        """
+        bots = {
+            id(value): value
+            for value in vars(module).values()
+            if isinstance(value, RocketChatBot) and value is not self
+        }
+        jobs = []
+        logs = {}
+        for bot in bots.values():
+            self._commands.update(bot._commands)
+            self._match.extend(bot._match)
+            # stalls are attributed by the monitor of this bot
+            for command_flag, command in bot._commands.items():
+                self.loop_monitor.register(f"command {command_flag}", command.coro)
+            for match in bot._match:
+                self.loop_monitor.register(f"match {match.name}", match.coro)
+            # jobs of the bot itself, e.g. saving rate limits, stay with it
+            jobs.extend(
+                job
+                for job in bot.periodic.stats()
+                if getattr(job.func, "__self__", None) is not bot
+            )
+            for log in bot._logs:
+                logs[id(log)] = self._adopt_log(log)
+
+        for name, value in list(vars(module).items()):
+            if id(value) in bots:
+                setattr(module, name, self)
+            elif id(value) in logs:
+                setattr(module, name, logs[id(value)])
+        return jobs
+
+    def _adopt_log(self, log: LogWriter) -> LogWriter:
+        """ Gets the open log with the same path, or adds the log. """
+        for existing in self._logs:
+            if existing.path == log.path:
+                return existing
+        self._logs.append(log)
+        return log
+
+    @staticmethod
+    def _load_module(name: str, path: str) -> ModuleType:
+        """ Runs a module file as a new module. """
+        if name == "__main__":
+            # like multiprocessing, skip the ``if __name__ == "__main__"`` block
+            name = "__mp_main__"
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    def open_log(self, path: str, **options) -> LogWriter:
+        """
+        Opens an append-only log that is flushed and closed on shutdown.
+
+        Opening a path again returns its writer.
+
+        Args:
+            path: Log file path.
+            **options: :class:`logwriter.LogWriter` options.
+
+        Returns:
+            Log writer.
+        """
+        for log in self._logs:
+            if log.path == path:
+                return log
+        return self._adopt_log(LogWriter(path, **options))
+
+    def record_traffic(self, path: str, **options) -> FrameRecorder:
+        """
+        Records all websocket frames for :func:`recorder.replay`.
+
+        Args:
+            path: Recording file path.
+            **options: :class:`logwriter.LogWriter` options, recordings are
+                not rotated unless ``max_bytes`` is given.
+
+        Returns:
+            Frame recorder.
+        """
+        options.setdefault("max_bytes", None)
+        self._recorder = FrameRecorder(self.open_log(path, **options))
+        return self._recorder
+
+    async def _save_rate_limits(self):
+        """ Persists the rate limiter state off the event loop. """
+        snapshot = self.rate_limiter.snapshot()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.rate_limiter.write, snapshot)
+
     async def _write_loop(self, ws):
-        """ Writes to the websocket. """
+        """ Writes to the websocket, draining queued frames in batches. """
         try:
             while True:
-                data = await self._write_queue.get()
-                log_data = json.dumps(data)
-                if len(log_data) > 80:
-                    log_data = json.dumps(data, indent=4)
-                self.logger.debug(f"[WRITE] {log_data}")
-                await ws.send(json.dumps(data))
+                batch = [await self._write_queue.get()]
+                while len(batch) < self.WRITE_BATCH_SIZE:
+                    try:
+                        batch.append(self._write_queue.get_nowait())
+                    except asyncio.QueueEmpty:
+                        break
+
+                self._frames_written.inc(amount=len(batch))
+                debug = self.logger.isEnabledFor(logging.DEBUG)
+                recorder = self._recorder
+                for data in batch:
+                    if isinstance(data, str):
+                        raw_data = data
+                    else:
+                        raw_data = json.dumps(data)
+                    if recorder is not None:
+                        recorder.record(WRITE, raw_data)
+                    if debug:
+                        log_data = raw_data
+                        if len(log_data) > 80 and not isinstance(data, str):
+                            log_data = json.dumps(data, indent=4)
+                        self.logger.debug(f"[WRITE] {log_data}")
+                    await ws.send(raw_data)
         except Exception:
             self.logger.exception("write loop died")
             raise
@@ -295,6 +1162,9 @@ class RocketChatBot:
         try:
             while True:
                 raw_data = await ws.recv()
+                self._frames_read.inc()
+                if self._recorder is not None:
+                    self._recorder.record(READ, raw_data)
                 data = json.loads(raw_data)
                 if len(raw_data) < 80:
                     log_data = data
@@ -314,8 +1184,35 @@ class RocketChatBot:
                     self._connected.set()
                 elif msg == "result":
                     msg_id = data["id"]
-                    self._completion[msg_id] = data["result"]
-                    self._completion_event[msg_id].set()
+                    if self._shards is not None and self._shards.route(
+                        msg_id, raw_data
+                    ):
+                        continue
+                    if "error" in data:
+                        result = DDPError(data["error"])
+                    else:
+                        result = data.get("result")
+
+                    ack = self._acks.pop(msg_id, None)
+                    if ack is not None:
+                        future, message_id, sent_at = ack
+                        self._ddp_rtt.observe(
+                            time.perf_counter() - sent_at, "sendMessage"
+                        )
+                        if future.done():
+                            pass
+                        elif isinstance(result, DDPError):
+                            future.set_exception(result)
+                        else:
+                            future.set_result(message_id)
+                    else:
+                        self._completion[msg_id] = result
+                        self._completion_event[msg_id].set()
+                elif msg == "ready":
+                    for msg_id in data["subs"]:
+                        if msg_id in self._completion_event:
+                            self._completion[msg_id] = None
+                            self._completion_event[msg_id].set()
                 elif msg == "nosub":
                     msg_id = data["id"]
                     self._completion[msg_id] = None
@@ -331,7 +1228,11 @@ class RocketChatBot:
                         collection == "stream-room-messages"
                         and event_name == "__my_messages__"
                     ):
-                        await self._chat_queue.put(data)
+                        await self._chat_queue.put((data, time.perf_counter()))
+                    elif collection == "stream-notify-user":
+                        self.directory.handle_event(
+                            event_name, data["fields"].get("args")
+                        )
                     else:
                         self.logger.debug("nope")
         except Exception:
@@ -340,8 +1241,8 @@ class RocketChatBot:
 
     async def _chat_loop(self):
         """ Handles chatbot commands. """
+        pending = {asyncio.create_task(self._chat_queue.get())}
         try:
-            pending = [asyncio.create_task(self._chat_queue.get())]
             while True:
                 done, pending = await asyncio.wait(
                     pending, return_when=asyncio.FIRST_COMPLETED
@@ -349,17 +1250,45 @@ class RocketChatBot:
 
                 for task in done:
                     result = task.result()
-                    if isinstance(result, dict):
-                        pending.add(asyncio.create_task(self._chat_task(result)))
+                    if isinstance(result, tuple):
+                        pending.add(asyncio.create_task(self._chat_task(*result)))
                         pending.add(asyncio.create_task(self._chat_queue.get()))
         except Exception:
             self.logger.exception("chat loop died")
             raise
+        finally:
+            # handlers still running and the pending queue read
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _shard_loop(self):
+        """ Forwards chat messages to the worker processes. """
+        try:
+            await self._ready.wait()
+            while True:
+                data, _ = await self._chat_queue.get()
+                try:
+                    self._shards.dispatch(data)
+                except (KeyError, IndexError, TypeError):
+                    self.logger.warning("dropping chat message without a room")
+        except Exception:
+            self.logger.exception("shard loop died")
+            raise
 
-    async def _chat_task(self, data: dict):
-        """ Handles chat messages. """
+    async def _chat_task(self, data: dict, received_at: float):
+        """
+        Handles chat messages.
+
+        Args:
+            data: ``changed`` frame of the message.
+            received_at: :func:`time.perf_counter` time the frame was read.
+        """
+        trace = None
         try:
             msg = Message(data["fields"]["args"])
+            msg.bot = self
+            self.directory.observe(msg)
             if (
                 msg.username == self.username
                 or msg.edited_at is not None
@@ -367,75 +1296,225 @@ class RocketChatBot:
             ):
                 return
 
+            self.waiters.dispatch(msg)
+            trace = self.tracer.start(msg.id, received_at, room_id=msg.room_id)
+            self.tracer.record("queue", received_at, time.perf_counter())
+
+            matches = []
             for match in self._match:
                 if match.pattern.match(msg.text):
                     if match.rate_limit is not None:
-                        if match.last_called is None:
-                            elapsed = float("inf")
-                        else:
-                            elapsed = time.monotonic() - match.last_called
-
-                        remaining = match.rate_limit - elapsed
-
+                        remaining = self.rate_limiter.acquire(
+                            match.name, match.rate_limit, msg
+                        )
                         if remaining > 0:
                             self.logger.debug(f"rate limited, {remaining:.3f}s left")
-                            return
-
-                    match.last_called = time.monotonic()
-                    try:
-                        response = await match.coro(msg)
-                    except Exception:
-                        self.logger.exception("failed to handle match")
-                    else:
-                        if response is not None:
-                            await self.send_message(msg.room_id, response)
+                            continue
+                    matches.append(match)
 
+            finished = {id(match): asyncio.Event() for match in matches}
+            tasks = [
+                self._match_task(match, msg, matches, finished) for match in matches
+            ]
             if msg.text.startswith(self.prefix):
-                parser = self.get_argument_parser(msg.room_id)
-
-                async def send_enqueued_messages() -> int:
-                    num_messages = 0
-                    while True:
-                        try:
-                            message = parser.msg_q.get_nowait()
-                            num_messages += 1
-                        except queue.Empty:
-                            break
-                        else:
-                            await self.send_message(msg.room_id, f"```\n{message}```")
+                tasks.append(self._command_task(msg))
+            await asyncio.gather(*tasks)
+        except Exception:
+            self.logger.exception("failed to handle message")
+        finally:
+            self.tracer.finish(trace)
 
-                    return num_messages
+    async def _match_task(
+        self,
+        match: _Match,
+        msg: Message,
+        matches: List[_Match],
+        finished: Dict[int, asyncio.Event],
+    ):
+        """ Runs a match handler once the handlers it is ordered after finish. """
+        try:
+            for other in matches:
+                if other is not match and other.is_named(match.after):
+                    await finished[id(other)].wait()
 
-                text = msg.text[len(self.prefix) :]
-                args = shlex.split(text)
-                command = args[0]
+            self._dispatched.inc("match", match.name)
+            start = time.perf_counter()
+            try:
+                with self.tracer.span("handler", kind="match", handler=match.name):
+                    await asyncio.wait_for(
+                        self._respond(match.coro, msg), match.timeout
+                    )
+            finally:
+                self._handler_latency.observe(
+                    time.perf_counter() - start, "match", match.name
+                )
+        except asyncio.TimeoutError:
+            self.logger.warning(f"match {match.name} timed out")
+        except Exception:
+            self.logger.exception("failed to handle match")
+        finally:
+            finished[id(match)].set()
 
-                if command == "help":
-                    parser.print_help()
-                    await send_enqueued_messages()
-                    return
-                else:
-                    try:
-                        msg.args = parser.parse_args(args)
-                    except Exception as e:
-                        if not await send_enqueued_messages():
-                            await self.send_message(
-                                msg.room_id, str(e),
-                            )
-                        return
-                    else:
-                        await send_enqueued_messages()
+    async def _command_task(self, msg: Message):
+        """ Parses and runs a command. """
+        parser = self.get_argument_parser(msg.room_id)
 
-                coro = self._commands[command].coro
+        async def send_enqueued_messages() -> int:
+            num_messages = 0
+            while True:
                 try:
-                    response = await coro(msg)
-                except Exception:
-                    self.logger.exception("failed to handle command")
+                    message = parser.msg_q.get_nowait()
+                    num_messages += 1
+                except queue.Empty:
+                    break
                 else:
-                    if response is not None:
-                        await self.send_message(msg.room_id, response)
+                    await self.send_message(msg.room_id, f"```\n{message}```")
+
+            return num_messages
+
+        text = msg.text[len(self.prefix) :]
+        args = shlex.split(text)
+        command = args[0]
+
+        if command == "help":
+            parser.print_help()
+            await send_enqueued_messages()
+            return
+        else:
+            try:
+                with self.tracer.span("parse", command=command):
+                    msg.args = parser.parse_args(args)
+            except Exception as e:
+                if not await send_enqueued_messages():
+                    await self.send_message(
+                        msg.room_id, str(e),
+                    )
+                return
+            else:
+                await send_enqueued_messages()
+
+        command = self._commands[command]
+        if command.cache is None:
+            respond = self._respond(command.coro, msg)
+        else:
+            key = tuple(sorted(vars(msg.args).items()))
+            if command.cache.policy.per_room:
+                key = (msg.room_id, key)
+            respond = self._respond_cached(command.coro, msg, command.cache, key)
+
+        self._dispatched.inc("command", args[0])
+        start = time.perf_counter()
+        try:
+            with self.tracer.span("handler", kind="command", handler=args[0]):
+                await asyncio.wait_for(respond, command.timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"command {args[0]} timed out")
         except Exception:
-            self.logger.exception("failed to handle message")
+            self.logger.exception("failed to handle command")
+        finally:
+            self._handler_latency.observe(
+                time.perf_counter() - start, "command", args[0]
+            )
+
+    async def _respond(self, coro: Callable, msg: Message):
+        """
+        Runs a handler and posts its response.
+
+        Handlers either return the whole response, or are async generators
+        whose chunks are streamed with :meth:`_stream_response`.
+        """
+        response = coro(msg)
+        if inspect.isasyncgen(response):
+            await self._stream_response(msg.room_id, response)
+        else:
+            response = await response
+            if response is not None:
+                await self.send_message(msg.room_id, response)
+
+    async def _respond_cached(
+        self, coro: Callable, msg: Message, cache: ResponseCache, key: tuple
+    ):
+        """ Posts a memoized response, running the handler on a miss. """
+        hit, response = cache.get(key)
+        if not hit:
+            response = await coro(msg)
+            cache.put(key, response)
+        if response is not None:
+            await self.send_message(msg.room_id, response)
+
+    def invalidate_cache(self, command: Optional[str] = None):
+        """
+        Drops memoized command responses.
+
+        Args:
+            command: Command to invalidate, ``None`` for all commands.
+        """
+        for name, cmd in self._commands.items():
+            if cmd.cache is not None and command in (None, name):
+                cmd.cache.clear()
+
+    def cache_stats(self) -> Dict[str, Tuple[int, int, int]]:
+        """
+        Gets response cache counters.
+
+        Returns:
+            Hits, misses and cached responses per cached command.
+        """
+        return {
+            name: (cmd.cache.hits, cmd.cache.misses, len(cmd.cache))
+            for name, cmd in self._commands.items()
+            if cmd.cache is not None
+        }
+
+    async def _stream_response(self, room_id: str, chunks: AsyncIterator[str]):
+        """
+        Posts the chunks yielded by a streaming handler.
+
+        The first chunk is posted right away and later chunks are appended
+        with ``updateMessage`` edits.  Edits are coalesced so that at most one
+        is made every ``STREAM_EDIT_INTERVAL`` seconds.
+
+        Args:
+            room_id: room identifier
+            chunks: response chunks
+        """
+        parts: List[str] = []
+        message_id = None
+        posted = 0
+        last_edit = 0.0
+        edit_task = None
+
+        async def edit():
+            nonlocal posted, last_edit
+            delay = last_edit + self.STREAM_EDIT_INTERVAL - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            count = len(parts)
+            try:
+                await self._method(
+                    "updateMessage", _id=message_id, rid=room_id, msg="".join(parts)
+                )
+            except DDPError:
+                self.logger.exception("failed to update streamed message")
+            posted = count
+            last_edit = time.monotonic()
+
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                parts.append(chunk)
+                if message_id is None:
+                    message_id = await self.send_message(room_id, chunk)
+                    posted = 1
+                    last_edit = time.monotonic()
+                elif edit_task is None or edit_task.done():
+                    edit_task = asyncio.create_task(edit())
+        finally:
+            if edit_task is not None:
+                await edit_task
+            if message_id is not None and posted < len(parts):
+                await edit()
 
     async def send_message(self, room_id: str, message: str) -> str:
         """
@@ -447,22 +1526,165 @@ class RocketChatBot:
 
         Returns:
             Message id.
+
+        Raises:
+            DDPError: the server rejected the message.
         """
         message_id = str(uuid.uuid4())
         await self._method("sendMessage", _id=message_id, rid=room_id, msg=message)
         return message_id
 
+    def send_message_nowait(
+        self,
+        room_id: str,
+        message: str,
+        callback: Optional[Callable[[asyncio.Future], None]] = None,
+    ) -> asyncio.Future:
+        """
+        Posts a chat message without waiting for the server round trip.
+
+        The message is enqueued for the write loop, which batches all pending
+        frames.  Failures are logged even if the returned future is never
+        awaited.
+
+        Args:
+            room_id: room identifier
+            message: message contents
+            callback: called with the future once the server acknowledges
+
+        Returns:
+            Future resolving to the message id, or raising :class:`DDPError`.
+        """
+        future = self._send_message_frame(json.dumps(room_id), json.dumps(message))
+        future.add_done_callback(self._log_ack_failure)
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+    def _send_message_frame(self, room_id: str, message: str) -> asyncio.Future:
+        """
+        Enqueues a ``sendMessage`` frame built from ``SEND_MESSAGE_FRAME``.
+
+        Args:
+            room_id: JSON encoded room identifier
+            message: JSON encoded message contents
+
+        Returns:
+            Future resolving to the message id once acknowledged.
+        """
+        message_id = str(uuid.uuid4())
+        msg_id = str(uuid.uuid4())
+        future = asyncio.get_running_loop().create_future()
+        self._acks[msg_id] = (future, message_id, time.perf_counter())
+        self._write_queue.put_nowait(
+            self.SEND_MESSAGE_FRAME.format(
+                msg_id=msg_id, message_id=message_id, room_id=room_id, message=message
+            )
+        )
+        return future
+
+    async def broadcast(
+        self,
+        room_ids: Iterable[str],
+        message: str,
+        *,
+        concurrency: int = 64,
+        max_retries: int = 5,
+    ) -> Dict[str, Union[str, Exception]]:
+        """
+        Posts the same chat message to many rooms.
+
+        Sends are pipelined with at most ``concurrency`` awaiting an ack.
+        When the server rate limits a send, all sends pause until the limit
+        resets and the rejected send is retried.  If the connection closes,
+        the remaining rooms fail with the same :class:`ConnectionError`
+        without being sent.
+
+        Args:
+            room_ids: room identifiers
+            message: message contents
+            concurrency: maximum number of unacknowledged messages
+            max_retries: retries per room after being rate limited
+
+        Returns:
+            Message id, or the exception that failed the send, per room.
+        """
+        encoded = json.dumps(message)
+        semaphore = asyncio.Semaphore(concurrency)
+        resume_at = 0.0
+        closed: Optional[ConnectionError] = None
+
+        async def send(room_id: str) -> Union[str, Exception]:
+            nonlocal resume_at, closed
+            encoded_room = json.dumps(room_id)
+            async with semaphore:
+                for attempt in range(max_retries + 1):
+                    delay = resume_at - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    if closed is not None:
+                        return closed
+                    try:
+                        return await self._send_message_frame(encoded_room, encoded)
+                    except ConnectionError as e:
+                        closed = e
+                        return e
+                    except DDPError as e:
+                        if e.error.get("error") != "too-many-requests":
+                            return e
+                        if attempt == max_retries:
+                            return e
+                        details = e.error.get("details") or {}
+                        reset = details.get("timeToReset", 1000) / 1000
+                        resume_at = max(resume_at, time.monotonic() + reset)
+
+        room_ids = list(dict.fromkeys(room_ids))
+        results = await asyncio.gather(*[send(room_id) for room_id in room_ids])
+        return dict(zip(room_ids, results))
+
+    def _fail_pending(self, error: Exception):
+        """ Fails every call and message still waiting for the server. """
+        acks = self._acks
+        self._acks = {}
+        for future, _, _ in acks.values():
+            if not future.done():
+                future.set_exception(error)
+        events = self._completion_event
+        self._completion_event = {}
+        for msg_id, event in events.items():
+            self._completion[msg_id] = error
+            event.set()
+
+    def _log_ack_failure(self, future: asyncio.Future):
+        """ Logs failed fire-and-forget messages. """
+        if not future.cancelled() and future.exception() is not None:
+            self.logger.error(f"failed to send message: {future.exception()}")
+
     async def _method(self, method: str, **kwargs) -> dict:
         """ Performs a method call. """
-        return await self._msg("method", {"method": method, "params": [{**kwargs}]})
+        start = time.perf_counter()
+        try:
+            with self.tracer.span("ddp", method=method):
+                return await self._msg(
+                    "method", {"method": method, "params": [{**kwargs}]}
+                )
+        finally:
+            self._ddp_rtt.observe(time.perf_counter() - start, method)
 
     async def _get_msg(self, msg_id: str) -> dict:
-        """ Gets the result of a message. """
+        """
+        Gets the result of a message.
+
+        Raises:
+            DDPError: the server returned an error.
+            ConnectionError: the connection closed first.
+        """
         await self._completion_event[msg_id].wait()
-        del self._completion_event[msg_id]
-        ret = copy.deepcopy(self._completion[msg_id])
-        del self._completion[msg_id]
-        return ret
+        self._completion_event.pop(msg_id, None)
+        ret = self._completion.pop(msg_id)
+        if isinstance(ret, Exception):
+            raise ret
+        return copy.deepcopy(ret)
 
     async def _send_msg(
         self, msg: str, data: Optional[dict] = None, *, noid: bool = False
@@ -516,23 +1738,32 @@ class RocketChatBot:
         """
         if not os.path.isfile(file):
             raise FileNotFoundError(f"no file found at {file}")
+        self._upload_bytes.inc(amount=os.path.getsize(file))
 
-        with open(file, "rb") as f:
-            payload = {"file": f}
-            async with self._session.post(
-                url=f"{self._rest_url}/rooms.upload/{room_id}",
-                data=payload,
-                headers=self._headers,
-                ssl=self._ssl,
-            ) as resp:
-                text = await resp.text()
-                if resp.status != 200:
-                    self.logger.debug(text)
-                    resp.raise_for_status()
+        opened = []
+
+        def payload() -> aiohttp.FormData:
+            # aiohttp streams file objects in chunks read on its executor
+            f = open(file, "rb")
+            opened.append(f)
+            data = aiohttp.FormData()
+            data.add_field("file", f, filename=os.path.basename(file))
+            return data
+
+        try:
+            resp = await self.rest.post(
+                f"/rooms.upload/{room_id}", data=payload, endpoint="rooms.upload"
+            )
+        finally:
+            for f in opened:
+                f.close()
+        if resp.status != 200:
+            self.logger.debug(resp.text())
+            resp.raise_for_status()
 
     async def download_attachments(self, message: Message, directory: str):
         """
-        Downloads messages from the chat.
+        Downloads the attachments of a message.
 
         Args:
             message: message to download from
@@ -541,15 +1772,12 @@ class RocketChatBot:
         Raises:
             aiohttp.ClientResponseError: request failed
         """
-        async with self._session.get(
-            f"{self._http_url}{message.image_url}",
-            headers=self._headers,
-            ssl=self._ssl,
-        ) as resp:
+        for attachment in message.attachments:
+            resp = await self.rest.download(
+                f"{self._http_url}{attachment.title_link}",
+                os.path.join(directory, attachment.title),
+                endpoint="file-download",
+            )
             if resp.status != 200:
                 self.logger.error(f"Unexpected response code: {resp.status}")
                 resp.raise_for_status()
-            else:
-                path = os.path.join(directory, message.attachment_title)
-                with open(path, "wb") as f:
-                    f.write(await resp.read())
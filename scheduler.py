@@ -0,0 +1,281 @@
+import asyncio
+import concurrent.futures
+import dataclasses
+import heapq
+import inspect
+import itertools
+import logging
+import sqlite3
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+
+@dataclasses.dataclass(order=True)
+class _Job:
+    """
+    Scheduled job.
+
+    Args:
+        when: Epoch time the job is due.
+        seq: Tie breaker keeping jobs due at the same time in order.
+        id: Job identifier.
+        room_id: Room to post ``message`` in, for persisted replies.
+        message: Deferred reply.
+        callback: In-memory callback, for jobs that are not persisted.
+    """
+
+    when: float
+    seq: int
+    id: str = dataclasses.field(compare=False)
+    room_id: Optional[str] = dataclasses.field(default=None, compare=False)
+    message: Optional[str] = dataclasses.field(default=None, compare=False)
+    callback: Optional[Callable] = dataclasses.field(default=None, compare=False)
+    cancelled: bool = dataclasses.field(default=False, compare=False)
+
+
+class Scheduler:
+    """
+    Timer service driven by a single heap and a single task.
+
+    Deferred replies are persisted to SQLite so they survive restarts,
+    callbacks are kept in memory only.
+
+    Args:
+        path: SQLite database path, ``None`` to keep everything in memory.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self._heap: List[_Job] = []
+        self._jobs: Dict[str, _Job] = {}
+        self._seq = itertools.count()
+        self._send: Optional[Callable[[str, str], Awaitable]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._fired: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    async def start(self, send: Callable[[str, str], Awaitable]):
+        """
+        Loads persisted replies and starts firing due jobs.
+
+        Args:
+            send: Coroutine function posting a message to a room.
+        """
+        self._send = send
+        self._wakeup = asyncio.Event()
+        if self.path is not None and self._db is None:
+            rows = await self._run(self._load)
+            for job_id, when, room_id, message in rows:
+                if job_id not in self._jobs:
+                    self._push(
+                        _Job(
+                            when=when,
+                            seq=next(self._seq),
+                            id=job_id,
+                            room_id=room_id,
+                            message=message,
+                        )
+                    )
+            if rows:
+                self.logger.info(f"loaded {len(rows)} persisted timers")
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """
+        Stops firing jobs and cancels jobs still running, pending jobs stay
+        persisted.
+        """
+        tasks = list(self._fired)
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def schedule_message(
+        self,
+        room_id: str,
+        message: str,
+        *,
+        delay: Optional[float] = None,
+        at: Optional[float] = None,
+    ) -> str:
+        """
+        Schedules a persisted deferred reply.
+
+        Args:
+            room_id: Room to post the message in.
+            message: Message contents.
+            delay: Seconds from now to post the message.
+            at: Epoch time to post the message, instead of ``delay``.
+
+        Returns:
+            Job identifier.
+        """
+        job = _Job(
+            when=_due(delay, at),
+            seq=next(self._seq),
+            id=str(uuid.uuid4()),
+            room_id=room_id,
+            message=message,
+        )
+        if self.path is not None:
+            await self._run(self._insert, job)
+        self._push(job)
+        return job.id
+
+    def call_later(self, delay: float, callback: Callable) -> str:
+        """
+        Schedules an in-memory callback.
+
+        Args:
+            delay: Seconds from now to run the callback.
+            callback: Function or coroutine function taking no arguments.
+
+        Returns:
+            Job identifier.
+        """
+        return self.call_at(_due(delay, None), callback)
+
+    def call_at(self, when: float, callback: Callable) -> str:
+        """
+        Schedules an in-memory callback at an epoch time.
+
+        Args:
+            when: Epoch time to run the callback.
+            callback: Function or coroutine function taking no arguments.
+
+        Returns:
+            Job identifier.
+        """
+        job = _Job(
+            when=when, seq=next(self._seq), id=str(uuid.uuid4()), callback=callback
+        )
+        self._push(job)
+        return job.id
+
+    async def cancel(self, job_id: str) -> bool:
+        """
+        Cancels a pending job.
+
+        Args:
+            job_id: Job identifier.
+
+        Returns:
+            ``True`` if the job was pending.
+        """
+        job = self._jobs.pop(job_id, None)
+        if job is None:
+            return False
+        job.cancelled = True
+        if job.callback is None and self.path is not None:
+            await self._run(self._delete, job_id)
+        return True
+
+    def _push(self, job: _Job):
+        self._jobs[job.id] = job
+        heapq.heappush(self._heap, job)
+        if self._wakeup is not None and self._heap[0] is job:
+            self._wakeup.set()
+
+    async def _loop(self):
+        """ Sleeps until the earliest job is due, then fires it. """
+        try:
+            while True:
+                while self._heap and self._heap[0].cancelled:
+                    heapq.heappop(self._heap)
+
+                self._wakeup.clear()
+                if not self._heap:
+                    await self._wakeup.wait()
+                    continue
+
+                delay = self._heap[0].when - time.time()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                job = heapq.heappop(self._heap)
+                del self._jobs[job.id]
+                task = asyncio.create_task(self._fire(job))
+                self._fired.add(task)
+                task.add_done_callback(self._fired.discard)
+        except Exception:
+            self.logger.exception("scheduler loop died")
+            raise
+
+    async def _fire(self, job: _Job):
+        try:
+            if job.callback is not None:
+                result = job.callback()
+                if inspect.isawaitable(result):
+                    await result
+            else:
+                await self._send(job.room_id, job.message)
+                if self.path is not None:
+                    await self._run(self._delete, job.id)
+        except Exception:
+            self.logger.exception(f"failed to run scheduled job {job.id}")
+
+    async def _run(self, func: Callable, *args):
+        """ Runs a database operation on the scheduler thread. """
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="scheduler"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS timers "
+                "(id TEXT PRIMARY KEY, due REAL, room_id TEXT, message TEXT)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _load(self) -> list:
+        return self._connect().execute(
+            "SELECT id, due, room_id, message FROM timers ORDER BY due"
+        ).fetchall()
+
+    def _insert(self, job: _Job):
+        db = self._connect()
+        db.execute(
+            "INSERT INTO timers VALUES (?, ?, ?, ?)",
+            (job.id, job.when, job.room_id, job.message),
+        )
+        db.commit()
+
+    def _delete(self, job_id: str):
+        db = self._connect()
+        db.execute("DELETE FROM timers WHERE id = ?", (job_id,))
+        db.commit()
+
+
+def _due(delay: Optional[float], at: Optional[float]) -> float:
+    """ Converts a delay or epoch time to an epoch time. """
+    if at is not None:
+        return at
+    if delay is None:
+        raise ValueError("either delay or at is required")
+    return time.time() + delay
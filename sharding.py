@@ -0,0 +1,415 @@
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+from rest import RestClient
+from scheduler import Scheduler
+from util import qualified_name
+
+CHAT = "chat"
+FRAME = "frame"
+CONFIG = "config"
+CALL = "call"
+RESULT = "result"
+
+# methods workers may call in the connection process
+STATE = "state"
+SCHEDULER = "scheduler"
+REMOTE_METHODS = {
+    STATE: ("get", "set", "delete", "incr", "items"),
+    SCHEDULER: ("schedule_message", "cancel"),
+}
+
+
+def shard_path(path: str, index: int) -> str:
+    """ Gets the path of a worker's copy of a log, e.g. ``log.shard0.txt``. """
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{index}{ext}"
+
+
+def shard_of(room_id: str, shards: int) -> int:
+    """ Gets the shard a room is handled by. """
+    return zlib.crc32(room_id.encode()) % shards
+
+
+class ShardPool:
+    """
+    Worker processes that chat messages are dispatched to, sharded by room.
+
+    The connection process keeps the websocket.  Every message of a room is
+    handled by the same worker, in order.  Frames written by the workers are
+    sent through the connection process, which routes the results of their
+    calls back to them.
+
+    Workers are forked, so they inherit every registered handler.  Each runs
+    its own rate limiter and response cache, so only room keyed rate limits
+    hold across workers.  State and persisted replies go through the
+    connection process: ``app.state`` namespaces and
+    ``app.scheduler.schedule_message`` of a worker call the store and
+    scheduler there, so shards never overwrite each other's state and
+    replies survive restarts.  Callbacks scheduled with ``call_later`` stay
+    in the worker.  Each worker writes its own copy of the logs opened with
+    :meth:`RocketChatBot.open_log`, e.g. ``feedback.shard0.txt`` for
+    ``feedback.txt``, so workers never rotate a file under each other.
+
+    Args:
+        workers: Number of worker processes.
+    """
+
+    def __init__(self, workers: int):
+        self.logger = logging.getLogger(__name__)
+        self.workers = workers
+        self.routes: Dict[str, int] = {}
+        self._context = multiprocessing.get_context("fork")
+        self._inboxes: List[multiprocessing.Queue] = []
+        self._outbox: Optional[multiprocessing.Queue] = None
+        self._processes: List[multiprocessing.Process] = []
+        self._calls: Set[asyncio.Task] = set()
+
+    def start(self, app):
+        """
+        Forks the workers, must be called before any event loop runs.
+
+        Args:
+            app: :class:`rocketchatbot.RocketChatBot` with its handlers.
+        """
+        self._outbox = self._context.Queue()
+        for index in range(self.workers):
+            inbox = self._context.Queue()
+            process = self._context.Process(
+                target=_worker_main,
+                args=(app, index, inbox, self._outbox),
+                name=f"shard-{index}",
+                daemon=True,
+            )
+            process.start()
+            self._inboxes.append(inbox)
+            self._processes.append(process)
+
+    def stop(self, timeout: float = 5.0):
+        """ Stops the workers, terminating any that don't exit in time. """
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._inboxes = []
+        self._processes = []
+
+    def close(self):
+        """ Unblocks :meth:`collect` so its event loop can shut down. """
+        if self._outbox is not None:
+            self._outbox.put(None)
+
+    def configure(self, app):
+        """ Sends the connection parameters of a logged in bot to the workers. """
+        config = {
+            "username": app.username,
+            "user_id": app.user_id,
+            "http_url": app._http_url,
+            "rest_url": app._rest_url,
+            # SSL contexts can't be pickled, workers forked after
+            # configuring inherit them instead
+            "ssl": app._ssl if isinstance(app._ssl, bool) else None,
+            "headers": app.rest.headers,
+        }
+        for inbox in self._inboxes:
+            inbox.put((CONFIG, config))
+
+    def dispatch(self, data: dict):
+        """ Forwards a ``changed`` frame to the worker of its room. """
+        room_id = data["fields"]["args"][0]["rid"]
+        self._inboxes[shard_of(room_id, self.workers)].put((CHAT, data))
+
+    def route(self, msg_id: str, raw_data: str) -> bool:
+        """
+        Forwards a result to the worker that made the call.
+
+        Returns:
+            ``True`` if the call was made by a worker.
+        """
+        shard = self.routes.pop(msg_id, None)
+        if shard is None:
+            return False
+        self._inboxes[shard].put((FRAME, raw_data))
+        return True
+
+    async def collect(self, app):
+        """
+        Moves frames written by the workers to the websocket write queue and
+        runs their state and scheduler calls.
+
+        Args:
+            app: :class:`rocketchatbot.RocketChatBot` holding the connection.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                batch = [await loop.run_in_executor(None, self._outbox.get)]
+                while True:
+                    try:
+                        batch.append(self._outbox.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in batch:
+                    return
+                for kind, shard, payload in batch:
+                    if kind == CALL:
+                        task = asyncio.create_task(self._call(app, shard, *payload))
+                        self._calls.add(task)
+                        task.add_done_callback(self._calls.discard)
+                        continue
+                    msg_id, frame = payload
+                    if msg_id is not None:
+                        self.routes[msg_id] = shard
+                    app._write_queue.put_nowait(frame)
+        finally:
+            calls = list(self._calls)
+            for task in calls:
+                task.cancel()
+            await asyncio.gather(*calls, return_exceptions=True)
+
+    async def _call(
+        self,
+        app,
+        shard: int,
+        call_id: int,
+        target: str,
+        method: str,
+        args: tuple,
+        kwargs: dict,
+    ):
+        """ Runs a call of a worker and sends it the result. """
+        result = error = None
+        try:
+            if method not in REMOTE_METHODS.get(target, ()):
+                raise ValueError(f"workers can't call {target}.{method}")
+            if target == STATE:
+                obj = app.state.namespace(args[0])
+                args = args[1:]
+            else:
+                obj = app.scheduler
+            result = await getattr(obj, method)(*args, **kwargs)
+        except Exception as e:
+            self.logger.exception(f"failed {target}.{method} call of shard {shard}")
+            error = e
+        self._inboxes[shard].put((RESULT, (call_id, result, error)))
+
+
+class ShardSocket:
+    """
+    Websocket stand-in of a worker, backed by its process queues.
+
+    Chat messages go straight to the bot's chat queue, frames are returned
+    to its read loop.
+    """
+
+    def __init__(self, app, index: int, inbox, outbox):
+        self.app = app
+        self.index = index
+        self.inbox = inbox
+        self.outbox = outbox
+        self.closed = asyncio.Event()
+        self._call_ids = itertools.count()
+        self._calls: Dict[int, asyncio.Future] = {}
+
+    async def recv(self) -> str:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await loop.run_in_executor(None, _receive, self.inbox)
+            if item is None:
+                self.closed.set()
+                for future in self._calls.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError("shard stopped"))
+                self._calls.clear()
+                await asyncio.Future()
+            kind, payload = item
+            if kind == CHAT:
+                self.app._chat_queue.put_nowait((payload, time.perf_counter()))
+            elif kind == FRAME:
+                return payload
+            elif kind == RESULT:
+                self._resolve(*payload)
+
+    async def send(self, frame: str):
+        msg_id = json.loads(frame).get("id")
+        self.outbox.put((FRAME, self.index, (msg_id, frame)))
+
+    async def call(self, target: str, method: str, *args, **kwargs) -> Any:
+        """
+        Calls the state store or scheduler of the connection process.
+
+        Args:
+            target: ``"state"`` or ``"scheduler"``.
+            method: Method name, see ``REMOTE_METHODS``.
+            *args: Arguments, for state calls the namespace name first.
+            **kwargs: Keyword arguments.
+
+        Returns:
+            Result of the call.
+        """
+        call_id = next(self._call_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._calls[call_id] = future
+        self.outbox.put((CALL, self.index, (call_id, target, method, args, kwargs)))
+        return await future
+
+    def _resolve(self, call_id: int, result: Any, error: Optional[Exception]):
+        future = self._calls.pop(call_id, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+class ShardNamespace:
+    """ Namespace of a :class:`ShardStateStore`, see :class:`state.Namespace`. """
+
+    def __init__(self, socket: ShardSocket, name: str):
+        self.socket = socket
+        self.name = name
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        return await self.socket.call(STATE, "get", self.name, key, default)
+
+    async def set(self, key: str, value: Any):
+        await self.socket.call(STATE, "set", self.name, key, value)
+
+    async def delete(self, key: str) -> bool:
+        return await self.socket.call(STATE, "delete", self.name, key)
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        return await self.socket.call(STATE, "incr", self.name, key, amount)
+
+    async def items(self) -> List[Tuple[str, Any]]:
+        return await self.socket.call(STATE, "items", self.name)
+
+
+class ShardStateStore:
+    """
+    State store of a worker, backed by the store of the connection process.
+
+    Every read and write is a call to the connection process, which owns the
+    only cache and writer, so updates from different shards never race.
+    """
+
+    def __init__(self, socket: ShardSocket):
+        self.socket = socket
+        self._namespaces: Dict[str, ShardNamespace] = {}
+
+    def namespace(self, name: Union[str, Callable]) -> ShardNamespace:
+        """ Gets a namespace, see :meth:`state.StateStore.namespace`. """
+        if callable(name):
+            name = qualified_name(name)
+        namespace = self._namespaces.get(name)
+        if namespace is None:
+            namespace = self._namespaces[name] = ShardNamespace(self.socket, name)
+        return namespace
+
+    async def flush(self):
+        """ Nothing to write, the connection process writes the state. """
+
+    async def close(self):
+        """ Nothing to close, the connection process owns the store. """
+
+
+class ShardScheduler(Scheduler):
+    """
+    In-memory scheduler of a worker.
+
+    Callbacks run in the worker.  Persisted replies are scheduled on the
+    scheduler of the connection process, so they survive restarts.
+    """
+
+    def __init__(self, socket: ShardSocket):
+        super().__init__()
+        self.socket = socket
+
+    async def schedule_message(
+        self,
+        room_id: str,
+        message: str,
+        *,
+        delay: Optional[float] = None,
+        at: Optional[float] = None,
+    ) -> str:
+        return await self.socket.call(
+            SCHEDULER, "schedule_message", room_id, message, delay=delay, at=at
+        )
+
+    async def cancel(self, job_id: str) -> bool:
+        if await super().cancel(job_id):
+            return True
+        return await self.socket.call(SCHEDULER, "cancel", job_id)
+
+
+def _receive(inbox):
+    """ Gets the next item for a worker, ``None`` once its parent is gone. """
+    parent = multiprocessing.parent_process()
+    while True:
+        try:
+            return inbox.get(timeout=1.0)
+        except queue.Empty:
+            if parent is not None and not parent.is_alive():
+                return None
+
+
+def _worker_main(app, index: int, inbox, outbox):
+    """ Entry point of a worker process. """
+    try:
+        asyncio.run(_run_worker(app, index, inbox, outbox))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _run_worker(app, index: int, inbox, outbox):
+    loop = asyncio.get_running_loop()
+    item = await loop.run_in_executor(None, _receive, inbox)
+    if item is None:
+        return
+    _, config = item
+
+    app.username = config["username"]
+    app.user_id = config["user_id"]
+    app._http_url = config["http_url"]
+    app._rest_url = config["rest_url"]
+    app.rest = RestClient(config["rest_url"], ssl=getattr(app, "_ssl", config["ssl"]))
+    app.rest.headers = config["headers"]
+    ws = ShardSocket(app, index, inbox, outbox)
+    app.scheduler = ShardScheduler(ws)
+    app.state = ShardStateStore(ws)
+    app._shards = None
+    app._recorder = None
+    app.rate_limiter.path = None
+    for log in app._logs:
+        log.path = shard_path(log.path, index)
+    app._write_queue = asyncio.Queue()
+    app._chat_queue = asyncio.Queue()
+    app._connected = asyncio.Event()
+    async with app.rest:
+        await app.scheduler.start(app.send_message)
+        tasks = [
+            asyncio.create_task(app._write_loop(ws)),
+            asyncio.create_task(app._read_loop(ws)),
+            asyncio.create_task(app._chat_loop()),
+        ]
+        try:
+            await ws.closed.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await app.scheduler.stop()
+            await app.state.close()
+            for log in app._logs:
+                await log.close()
@@ -0,0 +1,212 @@
+import asyncio
+import concurrent.futures
+import json
+import logging
+import sqlite3
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from util import qualified_name
+
+_DELETED = object()
+
+
+class Namespace:
+    """
+    Keys of one handler in a :class:`StateStore`.
+
+    Values must be JSON serializable.  The namespace is read from disk once,
+    on first access, after which reads are served from memory.
+    """
+
+    def __init__(self, store: "StateStore", name: str):
+        self.store = store
+        self.name = name
+        self._data: Optional[Dict[str, Any]] = None
+        self._loading: Optional[asyncio.Future] = None
+
+    async def _load(self) -> Dict[str, Any]:
+        if self._data is None:
+            if self._loading is None:
+                self._loading = asyncio.ensure_future(self.store._read(self.name))
+            data = await asyncio.shield(self._loading)
+            if self._data is None:
+                self._data = data
+        return self._data
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        """
+        Gets a value.
+
+        Args:
+            key: Key.
+            default: Value if the key is not set.
+        """
+        return (await self._load()).get(key, default)
+
+    async def set(self, key: str, value: Any):
+        """
+        Sets a value, written to disk in the background.
+
+        Args:
+            key: Key.
+            value: JSON serializable value.
+        """
+        (await self._load())[key] = value
+        self.store._mark(self.name, key, value)
+
+    async def delete(self, key: str) -> bool:
+        """
+        Deletes a value.
+
+        Args:
+            key: Key.
+
+        Returns:
+            ``True`` if the key was set.
+        """
+        data = await self._load()
+        if key not in data:
+            return False
+        del data[key]
+        self.store._mark(self.name, key, _DELETED)
+        return True
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        """
+        Adds to a counter.
+
+        Args:
+            key: Key.
+            amount: Amount to add, to ``0`` if the key is not set.
+
+        Returns:
+            New count.
+        """
+        data = await self._load()
+        value = data.get(key, 0) + amount
+        data[key] = value
+        self.store._mark(self.name, key, value)
+        return value
+
+    async def items(self) -> List[Tuple[str, Any]]:
+        """ All keys and values. """
+        return list((await self._load()).items())
+
+
+class StateStore:
+    """
+    Key-value store backed by SQLite in WAL mode.
+
+    Writes update the in-memory cache right away and are batched into a
+    single transaction on a worker thread every ``flush_interval`` seconds.
+
+    Args:
+        path: SQLite database path, ``None`` to keep everything in memory.
+        flush_interval: Seconds writes may stay pending.
+    """
+
+    def __init__(self, path: Optional[str] = None, flush_interval: float = 1.0):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.flush_interval = flush_interval
+        self._namespaces: Dict[str, Namespace] = {}
+        self._dirty: Dict[Tuple[str, str], Any] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="state"
+        )
+
+    def namespace(self, name: Union[str, Callable]) -> Namespace:
+        """
+        Gets the namespace of a handler.
+
+        Handlers are keyed by module and qualified name, e.g.
+        ``bot.timer``, so handlers of the same name don't share keys.  A
+        script's ``__main__`` module counts as its file name.
+
+        Args:
+            name: Namespace name, or a handler to use the name of.
+        """
+        if callable(name):
+            name = qualified_name(name)
+        namespace = self._namespaces.get(name)
+        if namespace is None:
+            namespace = self._namespaces[name] = Namespace(self, name)
+        return namespace
+
+    async def flush(self):
+        """ Writes all pending changes. """
+        if not self._dirty or self.path is None:
+            self._dirty.clear()
+            return
+        dirty = self._dirty
+        self._dirty = {}
+        upserts = []
+        deletes = []
+        for (namespace, key), value in dirty.items():
+            if value is _DELETED:
+                deletes.append((namespace, key))
+            else:
+                upserts.append((namespace, key, json.dumps(value)))
+        await self._run(self._write, upserts, deletes)
+
+    async def close(self):
+        """ Writes pending changes and closes the database. """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+
+    def _mark(self, namespace: str, key: str, value: Any):
+        self._dirty[(namespace, key)] = value
+        if self._task is None and self.path is not None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self):
+        """ Flushes pending changes every interval. """
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                self.logger.exception(f"failed to write state to {self.path}")
+
+    async def _read(self, namespace: str) -> Dict[str, Any]:
+        if self.path is None:
+            return {}
+        rows = await self._run(self._select, namespace)
+        return {key: json.loads(value) for key, value in rows}
+
+    async def _run(self, func: Callable, *args):
+        """ Runs a database operation on the state thread. """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS state "
+                "(namespace TEXT, key TEXT, value TEXT, PRIMARY KEY (namespace, key))"
+            )
+            self._db.commit()
+        return self._db
+
+    def _select(self, namespace: str) -> list:
+        return self._connect().execute(
+            "SELECT key, value FROM state WHERE namespace = ?", (namespace,)
+        ).fetchall()
+
+    def _write(self, upserts: list, deletes: list):
+        db = self._connect()
+        with db:
+            db.executemany("INSERT OR REPLACE INTO state VALUES (?, ?, ?)", upserts)
+            db.executemany(
+                "DELETE FROM state WHERE namespace = ? AND key = ?", deletes
+            )
@@ -0,0 +1,28 @@
+from cache import CachePolicy, ResponseCache
+
+
+def test_lru_eviction():
+    cache = ResponseCache(CachePolicy(maxsize=2))
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == (True, 1)
+    cache.put("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+    assert (cache.hits, cache.misses, len(cache)) == (3, 1, 2)
+
+
+def test_ttl_expiry():
+    cache = ResponseCache(CachePolicy(ttl=-1))
+    cache.put("a", 1)
+    assert cache.get("a") == (False, None)
+    assert len(cache) == 0
+
+
+def test_cached_none():
+    cache = ResponseCache(CachePolicy())
+    cache.put("a", None)
+    assert cache.get("a") == (True, None)
+    cache.clear()
+    assert cache.get("a") == (False, None)
@@ -0,0 +1,85 @@
+from typing import Optional
+import pytest
+from directory import Directory
+from rocketchat_data import Message
+
+
+def make_message(
+    room_id: str,
+    room_name: str,
+    username: str,
+    text: str = "hello",
+    type: Optional[str] = None,
+) -> Message:
+    return Message(
+        [
+            {
+                "_id": "m1",
+                "rid": room_id,
+                "msg": text,
+                "u": {"_id": f"{username}-id", "username": username},
+                **({"t": type} if type else {}),
+            },
+            {"roomParticipant": True, "roomType": "c", "roomName": room_name},
+        ]
+    )
+
+
+@pytest.mark.parametrize(
+    "rooms, allowed",
+    [
+        (["GENERAL"], True),
+        (["general"], True),
+        (["#general"], True),
+        (["random"], False),
+        ([], False),
+    ],
+)
+def test_room_in(rooms, allowed: bool):
+    directory = Directory()
+    directory.update_room({"_id": "GENERAL", "name": "general", "t": "c"})
+    assert directory.room_in("GENERAL", rooms) == allowed
+
+
+def test_observe():
+    directory = Directory()
+    directory.observe(make_message("r1", "memes", "alice"))
+    assert directory.room("memes").id == "r1"
+    assert directory.room("r1").members == {"alice"}
+    assert directory.user("@alice").id == "alice-id"
+
+
+def test_members_leave():
+    directory = Directory()
+    for username in ("alice", "bob", "carol"):
+        directory.observe(make_message("r1", "memes", username))
+    directory.observe(make_message("r1", "memes", "alice", "alice", type="ul"))
+    directory.observe(make_message("r1", "memes", "carol", "bob", type="ru"))
+    directory.observe(make_message("r1", "memes", "carol", "dave", type="au"))
+    assert directory.room("r1").members == {"carol", "dave"}
+
+    directory.handle_event("uid/subscriptions-changed", ["removed", {"rid": "r1"}])
+    room = directory.room("r1")
+    assert not room.joined and room.members == set()
+
+
+def test_rename_event():
+    directory = Directory()
+    directory.update_room({"_id": "r1", "name": "old", "t": "c"})
+    directory.handle_event(
+        "uid/rooms-changed", ["updated", {"_id": "r1", "name": "new"}]
+    )
+    assert directory.room("old") is None
+    assert directory.room("new").id == "r1"
+
+    directory.handle_event("uid/rooms-changed", ["removed", {"_id": "r1"}])
+    assert directory.room("r1") is None
+
+
+def test_ttl_eviction():
+    directory = Directory(ttl=-1)
+    directory.update_room({"_id": "r1", "name": "general", "t": "c"})
+    directory.update_user({"_id": "u1", "username": "alice"})
+    assert directory.room("general") is None
+    assert directory.evict() == 1
+    assert len(directory) == 0
@@ -0,0 +1,56 @@
+import asyncio
+import os
+from logwriter import LogWriter
+
+
+def test_group_commit(tmp_path):
+    path = os.path.join(tmp_path, "log.txt")
+
+    async def scenario():
+        log = LogWriter(path, flush_interval=0.05, fsync_interval=0)
+        for i in range(100):
+            log.write(f"entry {i}\n")
+        assert not os.path.exists(path)
+        await asyncio.sleep(0.1)
+        assert log.flushes == 1
+        log.write("last\n")
+        await log.close()
+        return log
+
+    log = asyncio.run(scenario())
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert lines == [f"entry {i}" for i in range(100)] + ["last"]
+    assert log.flushes == 2
+
+
+def test_batch_size_triggers_flush(tmp_path):
+    path = os.path.join(tmp_path, "log.txt")
+
+    async def scenario():
+        log = LogWriter(path, batch_bytes=10, flush_interval=60)
+        log.write("0123456789\n")
+        await asyncio.sleep(0.05)
+        assert log.flushes == 1
+        await log.close()
+
+    asyncio.run(scenario())
+
+
+def test_rotation(tmp_path):
+    path = os.path.join(tmp_path, "log.txt")
+
+    async def scenario():
+        log = LogWriter(path, max_bytes=10, backup_count=2, fsync_interval=None)
+        for i in range(4):
+            log.write(f"{i}" * 10)
+            await log.flush()
+        await log.close()
+
+    asyncio.run(scenario())
+    assert not os.path.exists(path)
+    with open(f"{path}.1") as f:
+        assert f.read() == "3" * 10
+    with open(f"{path}.2") as f:
+        assert f.read() == "2" * 10
+    assert not os.path.exists(f"{path}.3")
@@ -0,0 +1,37 @@
+import asyncio
+import time
+from loopmonitor import LoopMonitor
+from metrics import Registry
+
+
+def test_stall_attributed_to_handler():
+    registry = Registry()
+    monitor = LoopMonitor(registry, interval=0.02, threshold=0.1)
+
+    async def blocking_handler():
+        time.sleep(0.3)
+
+    monitor.register("command block", blocking_handler)
+
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(0.1)
+        await blocking_handler()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+
+    asyncio.run(scenario())
+    assert monitor.stalls == {"command block": 1}
+    assert registry.get("rocketchat_loop_stalls_total").value("command block") == 1
+    percentiles = monitor.percentiles()
+    assert percentiles["max"] >= 0.25
+    assert percentiles["p50"] < 0.1
+
+
+def test_no_samples():
+    assert LoopMonitor().percentiles() == {
+        "p50": 0.0,
+        "p90": 0.0,
+        "p99": 0.0,
+        "max": 0.0,
+    }
@@ -0,0 +1,43 @@
+import pytest
+from metrics import Registry
+
+
+def test_exposition():
+    registry = Registry()
+    counter = registry.counter("calls_total", "Calls.", ("handler",))
+    gauge = registry.gauge("depth", "Depth.", func=lambda: 3)
+    histogram = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1))
+
+    counter.inc("ping")
+    counter.inc("ping", amount=2)
+    counter.inc('we"ird')
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert counter.value("ping") == 3
+    assert gauge.value() == 3
+    assert histogram.count() == 3
+    assert registry.expose() == (
+        "# HELP calls_total Calls.\n"
+        "# TYPE calls_total counter\n"
+        'calls_total{handler="ping"} 3\n'
+        'calls_total{handler="we\\"ird"} 1\n'
+        "# HELP depth Depth.\n"
+        "# TYPE depth gauge\n"
+        "depth 3\n"
+        "# HELP latency_seconds Latency.\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{le="0.1"} 1\n'
+        'latency_seconds_bucket{le="1"} 2\n'
+        'latency_seconds_bucket{le="+Inf"} 3\n'
+        "latency_seconds_sum 5.55\n"
+        "latency_seconds_count 3\n"
+    )
+
+
+def test_duplicate_name():
+    registry = Registry()
+    registry.counter("calls_total", "Calls.")
+    with pytest.raises(ValueError):
+        registry.gauge("calls_total", "Calls.")
@@ -1,7 +1,69 @@
+import random
+import re
 import pytest
-from owo import owo
+from owo import owo, OwoTranslator
 
 
-@pytest.mark.parametrize("text, expected", [("```\nlol\n```", "```\nlawl\n```")])
+def reference_owo(text: str) -> str:
+    """ Word by word translator the compiled one must match. """
+    replace = {"you": "yuw", "and": "awnd", "lol": "lawl"}
+    ret = ""
+    for word in re.split(r"(\s+)", text):
+        upper = word.isupper()
+        if word.lower() in replace:
+            word = replace[word.lower()]
+            if upper:
+                word = word.upper()
+        else:
+            word = word.replace("l", "w").replace("L", "W")
+            word = word.replace("r", "w").replace("R", "W")
+        ret += word
+    return ret
+
+
+def random_text(rng: random.Random, length: int) -> str:
+    words = ["you", "YOU", "You", "and", "AND", "lol", "LoL", "lolol", "rl", "x"]
+    seps = [" ", "\n", "\t", "  ", "　"]
+    parts = []
+    while len(parts) < length:
+        parts.append(rng.choice(words))
+        parts.append(rng.choice(seps + [""]))
+    return "".join(parts)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("```\nlol\n```", "```\nlawl\n```"),
+        ("", ""),
+        ("you and me", "yuw awnd me"),
+        ("YOU AND LOL", "YUW AWND LAWL"),
+        ("You", "yuw"),
+        ("lolyou", "wowyou"),
+        ("hello world", "hewwo wowwd"),
+        ("  lol\tlol  ", "  lawl\tlawl  "),
+    ],
+)
 def test_owo(text: str, expected: str):
     assert owo(text) == expected
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_reference(seed: int):
+    text = random_text(random.Random(seed), 200)
+    assert owo(text) == reference_owo(text)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_chunked(seed: int):
+    rng = random.Random(seed)
+    text = random_text(rng, 200)
+    translator = OwoTranslator()
+    out = []
+    pos = 0
+    while pos < len(text):
+        size = rng.randint(0, 8)
+        out.append(translator.feed(text[pos : pos + size]))
+        pos += size
+    out.append(translator.flush())
+    assert "".join(out) == owo(text)
@@ -0,0 +1,97 @@
+import asyncio
+import datetime
+import pytest
+from periodic import CronSchedule, PeriodicJob, PeriodicJobs
+from scheduler import Scheduler
+
+# Wednesday
+START = datetime.datetime(2020, 1, 1, 12, 30, 15)
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    [
+        ("* * * * *", datetime.datetime(2020, 1, 1, 12, 31)),
+        ("*/15 * * * *", datetime.datetime(2020, 1, 1, 12, 45)),
+        ("0 9 * * *", datetime.datetime(2020, 1, 2, 9, 0)),
+        ("0 9 * * 1-5", datetime.datetime(2020, 1, 2, 9, 0)),
+        ("0 0 * * 0", datetime.datetime(2020, 1, 5, 0, 0)),
+        ("0 0 * * 7", datetime.datetime(2020, 1, 5, 0, 0)),
+        ("0 0 1 * *", datetime.datetime(2020, 2, 1, 0, 0)),
+        ("0 0 29 2 *", datetime.datetime(2020, 2, 29, 0, 0)),
+        ("0 0 15 * 0", datetime.datetime(2020, 1, 5, 0, 0)),
+        ("30,45 12 * * *", datetime.datetime(2020, 1, 1, 12, 45)),
+    ],
+)
+def test_cron_next_after(expression: str, expected: datetime.datetime):
+    schedule = CronSchedule(expression)
+    assert schedule.next_after(START.timestamp()) == expected.timestamp()
+
+
+@pytest.mark.parametrize(
+    "expression", ["* * * *", "60 * * * *", "* * 0 * *", "5-1 * * * *", "*/0 * * * *"]
+)
+def test_cron_invalid(expression: str):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_interval_no_drift():
+    job = PeriodicJob(name="job", func=print, interval=10)
+    assert job.next_after(100, 100.5) == 110
+    assert job.next_after(100, 135) == 140
+
+
+def test_overlap_skipped():
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+
+        jobs = PeriodicJobs()
+        job = PeriodicJob(name="slow", func=slow, interval=0.02)
+        jobs.add(job)
+        scheduler = Scheduler()
+        await scheduler.start(None)
+        jobs.start(scheduler)
+        await asyncio.sleep(0.15)
+        await scheduler.stop()
+        release.set()
+        await asyncio.sleep(0.01)
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.runs == 1
+    assert job.skipped >= 3
+    assert not job.running
+
+
+def test_stop_cancels_runs():
+    async def scenario():
+        jobs = PeriodicJobs()
+        job = PeriodicJob(name="slow", func=asyncio.Event().wait, interval=0.01)
+        jobs.add(job)
+        scheduler = Scheduler()
+        await scheduler.start(None)
+        jobs.start(scheduler)
+        await asyncio.sleep(0.05)
+        assert job.running and len(jobs._running) == 1
+        await jobs.stop()
+        await scheduler.stop()
+        assert not jobs._running
+        return job
+
+    job = asyncio.run(scenario())
+    assert not job.running
+
+
+def test_replace_job():
+    jobs = PeriodicJobs()
+    job = PeriodicJob(name="job", func=print, interval=10)
+    jobs.add(job)
+    with pytest.raises(ValueError):
+        jobs.add(PeriodicJob(name="job", func=repr, interval=10))
+    jobs.add(PeriodicJob(name="job", func=repr, interval=5), replace=True)
+    assert jobs.stats() == [job]
+    assert job.func is repr and job.interval == 10
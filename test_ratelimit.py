@@ -0,0 +1,64 @@
+import os
+import pytest
+from ratelimit import RateLimit, RateLimiter
+from rocketchat_data import Message
+
+
+def make_message(room_id: str = "room", user_id: str = "user") -> Message:
+    return Message(
+        [{"rid": room_id, "msg": "", "u": {"_id": user_id, "username": user_id}}, {}]
+    )
+
+
+@pytest.mark.parametrize("algorithm", ["token_bucket", "sliding_window"])
+def test_calls_per_period(algorithm: str):
+    limiter = RateLimiter()
+    limit = RateLimit(calls=2, period=10, algorithm=algorithm)
+    message = make_message()
+    assert limiter.acquire("h", limit, message, now=0) == 0
+    assert limiter.acquire("h", limit, message, now=1) == 0
+    assert limiter.acquire("h", limit, message, now=2) > 0
+    assert limiter.acquire("h", limit, message, now=12) == 0
+
+
+@pytest.mark.parametrize(
+    "key, other, limited",
+    [
+        ("global", make_message("other", "other"), True),
+        ("room", make_message("room", "other"), True),
+        ("room", make_message("other", "user"), False),
+        ("user", make_message("other", "user"), True),
+        ("user", make_message("room", "other"), False),
+        ("room_user", make_message("room", "other"), False),
+        ("room_user", make_message("room", "user"), True),
+    ],
+)
+def test_keys(key: str, other: Message, limited: bool):
+    limiter = RateLimiter()
+    limit = RateLimit(calls=1, period=10, key=key)
+    assert limiter.acquire("h", limit, make_message(), now=0) == 0
+    assert (limiter.acquire("h", limit, other, now=1) > 0) == limited
+
+
+def test_lru_eviction():
+    limiter = RateLimiter(max_keys=2)
+    limit = RateLimit(calls=1, period=10, key="room")
+    for room_id in ("a", "b", "a", "c"):
+        limiter.acquire("h", limit, make_message(room_id), now=0)
+    assert len(limiter) == 2
+    assert limiter.acquire("h", limit, make_message("b"), now=0) == 0
+    assert limiter.acquire("h", limit, make_message("c"), now=0) > 0
+
+
+def test_persistence(tmp_path):
+    path = os.path.join(tmp_path, "limits.json")
+    limit = RateLimit(calls=1, period=10)
+    limiter = RateLimiter(path=path)
+    limiter.acquire("h", limit, make_message(), now=0)
+    limiter.save()
+    assert RateLimiter(path=path).acquire("h", limit, make_message(), now=1) > 0
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        RateLimit(calls=1, period=10, key="channel")
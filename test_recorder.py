@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import time
+from fake_server import FakeServer, start_bot
+from recorder import READ, REDACTED, WRITE, ReplaySocket, load_recording, replay
+from rocketchatbot import RocketChatBot
+
+QUIET_LOGGING = {"version": 1, "root": {"level": "WARNING"}}
+
+
+def make_app(replies: list) -> RocketChatBot:
+    app = RocketChatBot(log_config=QUIET_LOGGING)
+
+    @app.cmd("ping", help="pong")
+    async def ping(message):
+        replies.append(message.text)
+        return "pong"
+
+    return app
+
+
+def test_record_and_replay(tmp_path):
+    path = os.path.join(tmp_path, "traffic.jsonl")
+    recorded = []
+    app = make_app(recorded)
+    app.record_traffic(path)
+
+    async def record():
+        async with FakeServer() as server:
+            task = await start_bot(app, server)
+            for _ in range(3):
+                await server.inject("GENERAL", "!ping")
+                await asyncio.sleep(0.05)
+            while len(server.sent) < 3:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            # the log is closed when the bot shuts down
+            for log in app._logs:
+                await log.close()
+
+    asyncio.run(record())
+    frames = load_recording(path)
+    assert {direction for _, direction, _ in frames} == {READ, WRITE}
+    with open(path) as f:
+        text = f.read()
+    assert "password" not in text and "fake-token" not in text
+    methods = [json.loads(frame) for _, _, frame in frames if '"login"' in frame]
+    assert [frame["params"] for frame in methods] == [[REDACTED]]
+    assert [when for when, _, _ in frames] == sorted(when for when, _, _ in frames)
+
+    replayed = []
+
+    async def run(speed):
+        return await replay(make_app(replayed), path, speed=speed, idle=0.02)
+
+    stats = asyncio.run(run(None))
+    assert stats.replayed == 3
+    assert stats.sent == 3
+    assert replayed == ["!ping"] * 3
+
+    stats = asyncio.run(run(1.0))
+    assert stats.elapsed >= 0.1
+    assert len(replayed) == 6
+
+
+def test_replay_socket_pacing():
+    changed = json.dumps({"msg": "changed"})
+    frames = [(0.0, READ, changed), (0.2, READ, changed), (0.3, WRITE, changed)]
+
+    async def scenario():
+        ws = ReplaySocket(frames, speed=2.0)
+        start = time.perf_counter()
+        await ws.recv()
+        await ws.send(json.dumps({"msg": "method", "id": "1", "params": [{}]}))
+        reply = json.loads(await ws.recv())
+        assert reply["id"] == "1"
+        await ws.recv()
+        assert ws.exhausted.is_set()
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(scenario())
+    assert 0.09 <= elapsed < 0.2
+
+
+def test_replay_leaves_stores_alone(tmp_path):
+    recording = os.path.join(tmp_path, "traffic.jsonl")
+    frame = json.dumps(
+        {
+            "msg": "changed",
+            "collection": "stream-room-messages",
+            "fields": {
+                "eventName": "__my_messages__",
+                "args": [
+                    {
+                        "_id": "message-id",
+                        "rid": "GENERAL",
+                        "msg": "!remember",
+                        "u": {"_id": "user-id", "username": "user"},
+                    },
+                    {"roomType": "c", "roomName": "general"},
+                ]
+            },
+        }
+    )
+    with open(recording, "w") as f:
+        f.write(json.dumps([0.0, READ, frame]) + "\n")
+
+    app = RocketChatBot(
+        log_config=QUIET_LOGGING,
+        scheduler_path=os.path.join(tmp_path, "timers.sqlite3"),
+        state_path=os.path.join(tmp_path, "state.sqlite3"),
+        rate_limit_path=os.path.join(tmp_path, "ratelimits.json"),
+    )
+    log = app.open_log(os.path.join(tmp_path, "feedback.txt"))
+
+    handled = []
+
+    @app.cmd("remember", help="touches every store")
+    async def remember(message):
+        handled.append(message.text)
+        log.write("feedback\n")
+        await app.state.namespace("remember").set("seen", True)
+        await app.scheduler.schedule_message(message.room_id, "later", delay=3600)
+
+    async def run():
+        stats = await replay(app, recording, speed=None, idle=0.02)
+        await app.state.close()
+        await app.scheduler.stop()
+        return stats
+
+    assert asyncio.run(run()).replayed == 1
+    assert handled == ["!remember"]
+    assert sorted(os.listdir(tmp_path)) == ["traffic.jsonl"]
+
+
+def test_load_rotated_recording(tmp_path):
+    path = os.path.join(tmp_path, "traffic.jsonl")
+    parts = {f"{path}.2": [5.0, 6.0], f"{path}.1": [7.0], path: [8.5]}
+    for part, times in parts.items():
+        with open(part, "w") as f:
+            for when in times:
+                f.write(json.dumps([when, READ, "{}"]) + "\n")
+
+    frames = load_recording(path)
+    assert [when for when, _, _ in frames] == [0.0, 1.0, 2.0, 3.5]
+
+    app = make_app([])
+    app.record_traffic(os.path.join(tmp_path, "new.jsonl"))
+    assert app._recorder.log.max_bytes is None
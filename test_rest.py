@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+from aiohttp import web
+from rest import RestClient, create_session, retry_delay
+
+
+@pytest.mark.parametrize(
+    "headers, delay",
+    [
+        ({}, None),
+        ({"Retry-After": "3"}, 3.0),
+        ({"Retry-After": "Thu, 01 Jan 1970 00:00:10 GMT"}, 5.0),
+        ({"X-RateLimit-Reset": "7000"}, 2.0),
+        ({"X-RateLimit-Reset": "1000"}, 0.0),
+    ],
+)
+def test_retry_delay(headers: dict, delay):
+    assert retry_delay(headers, now=5.0) == delay
+
+
+async def serve_and_request(handler, **kwargs):
+    app = web.Application()
+    app.router.add_get("/thing", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        async with RestClient(f"http://127.0.0.1:{port}", backoff=0) as client:
+            first = await client.get("/thing", **kwargs)
+            second = await client.get("/thing", **kwargs)
+            return first, second, client.stats()["/thing"]
+    finally:
+        await runner.cleanup()
+
+
+def test_retry_on_429():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return web.Response(status=429, headers={"Retry-After": "0"})
+        return web.Response(text="ok")
+
+    first, second, stats = asyncio.run(serve_and_request(handler))
+    assert first.text() == "ok"
+    assert second.text() == "ok"
+    assert len(calls) == 3
+    assert stats.retries == 1
+    assert stats.count == 3
+
+
+def test_conditional_get():
+    async def handler(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(text="body", headers={"ETag": '"v1"'})
+
+    first, second, stats = asyncio.run(serve_and_request(handler, cache=True))
+    assert not first.cached
+    assert second.cached
+    assert second.text() == "body"
+    assert stats.cache_hits == 1
+
+
+def test_shared_session():
+    async def scenario():
+        async with create_session(limit_per_host=4) as session:
+            client = RestClient("http://127.0.0.1", session=session)
+            await client.open()
+            await client.close()
+            connector = session.connector
+            return client._session is session, session.closed, connector
+
+    shared, closed, connector = asyncio.run(scenario())
+    assert shared and not closed
+    assert connector.limit == 32
+    assert connector.limit_per_host == 4
+
+
+def test_download(tmp_path):
+    payload = bytes(range(256)) * 1024
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return web.Response(status=503)
+        if request.path == "/missing":
+            return web.Response(status=404, text="missing")
+        return web.Response(body=payload)
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_get("/thing", handler)
+        app.router.add_get("/missing", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        try:
+            async with RestClient(f"http://127.0.0.1:{port}", backoff=0) as client:
+                found = await client.download("/thing", str(tmp_path / "thing"))
+                missing = await client.download("/missing", str(tmp_path / "missing"))
+                return found, missing
+        finally:
+            await runner.cleanup()
+
+    found, missing = asyncio.run(scenario())
+    assert found.status == 200 and found.body == b""
+    assert (tmp_path / "thing").read_bytes() == payload
+    assert missing.status == 404 and missing.text() == "missing"
+    assert not (tmp_path / "missing").exists()
@@ -0,0 +1,577 @@
+import asyncio
+import os
+import sys
+import threading
+import aiohttp
+import pytest
+from fake_server import FakeServer, start_bot
+from rest import create_session
+from rocketchatbot import RocketChatBot, event_loop_policy
+from args import arg
+from tracing import RingBufferExporter
+
+QUIET_LOGGING = {"version": 1, "root": {"level": "WARNING"}}
+
+
+def make_app() -> RocketChatBot:
+    app = RocketChatBot(log_config=QUIET_LOGGING)
+
+    @app.cmd("ping", help="pong")
+    async def ping(message):
+        return "pong"
+
+    return app
+
+
+async def run_with_server(app: RocketChatBot, scenario, **server_kwargs):
+    async with FakeServer(**server_kwargs) as server:
+        task = await start_bot(app, server)
+        try:
+            return await scenario(server)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+async def wait_for_sent(server: FakeServer, count: int):
+    while len(server.sent) < count:
+        await asyncio.sleep(0.01)
+
+
+def test_command_round_trip():
+    app = make_app()
+
+    async def scenario(server):
+        await server.inject("GENERAL", "!ping")
+        await asyncio.wait_for(wait_for_sent(server, 1), 5)
+        return server.sent
+
+    sent = asyncio.run(run_with_server(app, scenario))
+    assert [(s["rid"], s["msg"]) for s in sent] == [("GENERAL", "pong")]
+    assert app.directory.room("general").id == "GENERAL"
+
+
+def test_send_message_nowait():
+    app = make_app()
+
+    async def scenario(server):
+        futures = [app.send_message_nowait("GENERAL", str(i)) for i in range(10)]
+        ids = await asyncio.wait_for(asyncio.gather(*futures), 5)
+        return ids, server.sent
+
+    ids, sent = asyncio.run(run_with_server(app, scenario, latency=0.01))
+    assert ids == [s["_id"] for s in sent]
+    assert [s["msg"] for s in sent] == [str(i) for i in range(10)]
+
+
+async def drop_clients(server: FakeServer):
+    for ws in list(server._clients):
+        await ws.close()
+
+
+def test_pending_acks_fail_on_disconnect():
+    app = make_app()
+
+    async def scenario(server):
+        future = app.send_message_nowait("GENERAL", "lost")
+        await asyncio.sleep(0.05)
+        await drop_clients(server)
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(future, 5)
+        return app._acks
+
+    assert asyncio.run(run_with_server(app, scenario, latency=1.0)) == {}
+
+
+def test_start_cleans_up_on_disconnect():
+    app = make_app()
+    started = asyncio.Event()
+
+    @app.cmd("hang", help="never finishes")
+    async def hang(message):
+        started.set()
+        await asyncio.Event().wait()
+
+    async def main():
+        async with FakeServer() as server:
+            bot = asyncio.create_task(
+                app.start("bot", "password", server.host, port=server.port, ssl=False)
+            )
+            await asyncio.sleep(0)
+            await asyncio.wait_for(app._ready.wait(), 10)
+            await server.inject("GENERAL", "!hang")
+            await asyncio.wait_for(started.wait(), 5)
+            server.latency = 10
+            call = asyncio.create_task(app._method("rooms/get"))
+            await asyncio.sleep(0.05)
+            await drop_clients(server)
+            await asyncio.wait_for(bot, 5)
+            with pytest.raises(ConnectionError):
+                await call
+            return {
+                task.get_coro().__qualname__
+                for task in asyncio.all_tasks()
+                if task is not asyncio.current_task()
+                # replies the server still delays
+                and task.get_coro().__qualname__ != "FakeServer._delayed"
+            }
+
+    assert asyncio.run(main()) == set()
+
+
+def test_broadcast_rate_limited():
+    app = make_app()
+    rooms = [f"room{i}" for i in range(60)]
+
+    async def scenario(server):
+        results = await asyncio.wait_for(app.broadcast(rooms, "hello"), 10)
+        return results, server
+
+    results, server = asyncio.run(
+        run_with_server(app, scenario, rate_limit=(20, 0.05))
+    )
+    assert list(results) == rooms
+    assert all(isinstance(r, str) for r in results.values())
+    assert sorted(s["rid"] for s in server.sent) == sorted(rooms)
+    assert server.rate_limited > 0
+
+
+def test_broadcast_disconnect():
+    app = make_app()
+    rooms = [f"room{i}" for i in range(20)]
+
+    async def scenario(server):
+        broadcast = asyncio.create_task(app.broadcast(rooms, "hello", concurrency=5))
+        await asyncio.sleep(0.05)
+        await drop_clients(server)
+        return await asyncio.wait_for(broadcast, 5), server
+
+    results, server = asyncio.run(run_with_server(app, scenario, latency=1.0))
+    assert list(results) == rooms
+    assert all(isinstance(r, ConnectionError) for r in results.values())
+    assert len(server.sent) == 5
+
+
+def test_streaming_response():
+    app = make_app()
+    app.STREAM_EDIT_INTERVAL = 0.05
+
+    @app.cmd("count", help="counts")
+    async def count(message):
+        for i in range(5):
+            yield str(i)
+
+    async def scenario(server):
+        await server.inject("GENERAL", "!count")
+        while not server.edits or server.edits[-1]["msg"] != "01234":
+            await asyncio.sleep(0.01)
+        return server
+
+    server = asyncio.run(run_with_server(app, scenario))
+    assert [s["msg"] for s in server.sent] == ["0"]
+    assert {e["_id"] for e in server.edits} == {server.sent[0]["_id"]}
+    assert len(server.edits) <= 2
+
+
+def test_concurrent_dispatch_with_order():
+    app = make_app()
+    events = []
+
+    @app.match("!ping", timeout=0.3)
+    async def slow(message):
+        await asyncio.sleep(1)
+        events.append("slow")
+
+    @app.match("!ping")
+    async def first(message):
+        await asyncio.sleep(0.01)
+        events.append("first")
+
+    @app.match("!ping", after=[first])
+    async def second(message):
+        events.append("second")
+        return "matched"
+
+    async def scenario(server):
+        await server.inject("GENERAL", "!ping")
+        await asyncio.wait_for(wait_for_sent(server, 2), 0.2)
+        await asyncio.sleep(0.3)
+        return [s["msg"] for s in server.sent]
+
+    sent = asyncio.run(run_with_server(app, scenario))
+    assert sorted(sent) == ["matched", "pong"]
+    assert events == ["first", "second"]
+
+
+def test_match_order_cycle():
+    app = make_app()
+
+    @app.match("a", after=["b"])
+    async def a(message):
+        pass
+
+    with pytest.raises(ValueError):
+
+        @app.match("b", after=["a"])
+        async def b(message):
+            pass
+
+
+def test_cached_command():
+    app = make_app()
+    calls = []
+
+    @app.cmd("echo", args=[arg("text")], cache=True)
+    async def echo(message):
+        calls.append(message.args.text)
+        return message.args.text
+
+    async def scenario(server):
+        for i, text in enumerate(("!echo a", "!echo a", "!echo b")):
+            await server.inject("GENERAL", text)
+            await asyncio.wait_for(wait_for_sent(server, i + 1), 5)
+        return [s["msg"] for s in server.sent]
+
+    sent = asyncio.run(run_with_server(app, scenario))
+    assert sorted(sent) == ["a", "a", "b"]
+    assert calls == ["a", "b"]
+    assert app.cache_stats() == {"echo": (1, 2, 2)}
+    app.invalidate_cache("echo")
+    assert app.cache_stats() == {"echo": (1, 2, 0)}
+
+
+def test_metrics_endpoint():
+    app = RocketChatBot(log_config=QUIET_LOGGING, metrics_port=0)
+
+    @app.cmd("ping", help="pong")
+    async def ping(message):
+        return "pong"
+
+    async def scenario(server):
+        await server.inject("GENERAL", "!ping")
+        await asyncio.wait_for(wait_for_sent(server, 1), 5)
+        port = app._metrics_server.port
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{port}/metrics") as resp:
+                return await resp.text()
+
+    text = asyncio.run(run_with_server(app, scenario))
+    assert (
+        'rocketchat_messages_dispatched_total{kind="command",handler="ping"} 1'
+        in text
+    )
+    assert 'rocketchat_handler_seconds_count{kind="command",handler="ping"} 1' in text
+    assert 'rocketchat_ddp_call_seconds_count{method="login"} 1' in text
+    assert app._frames_read.value() > 0
+    assert app._frames_written.value() > 0
+
+
+def test_message_tracing():
+    app = make_app()
+    ring = RingBufferExporter()
+    app.tracer.add_exporter(ring)
+
+    async def scenario(server):
+        await server.inject("GENERAL", "!ping")
+        await asyncio.wait_for(wait_for_sent(server, 1), 5)
+        while not ring.traces:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(run_with_server(app, scenario))
+    (trace,) = ring.traces
+    assert trace.attributes == {"room_id": "GENERAL"}
+    names = [span.name for span in trace.spans]
+    assert names == ["queue", "parse", "ddp", "handler"]
+    assert trace.spans[2].attributes == {"method": "sendMessage"}
+
+
+def test_upload_and_download(tmp_path):
+    app = make_app()
+    source = tmp_path / "meme.png"
+    source.write_bytes(b"\x89PNG fake")
+    target = tmp_path / "downloads"
+    target.mkdir()
+    downloaded = []
+
+    @app.cmd("save", help="saves attachments")
+    async def save(message):
+        await app.download_attachments(message, str(target))
+        downloaded.append(message.id)
+
+    async def scenario(server):
+        await app.upload_file("GENERAL", str(source))
+        (upload,) = server.uploads
+        attachment = server.add_file("copy.png", upload["content"])
+        await server.inject("GENERAL", "!save", attachments=[attachment])
+        for _ in range(500):
+            if downloaded:
+                break
+            await asyncio.sleep(0.01)
+        return upload
+
+    upload = asyncio.run(run_with_server(app, scenario))
+    assert upload["rid"] == "GENERAL"
+    assert upload["filename"] == "meme.png"
+    assert (target / "copy.png").read_bytes() == b"\x89PNG fake"
+
+
+def test_sharded_dispatch(tmp_path):
+    app = make_app()
+    log = app.open_log(os.path.join(tmp_path, "where.txt"))
+
+    @app.cmd("where", args=[arg("seq", type=int, help="sequence")], help="pid")
+    async def where(message):
+        log.write(f"{os.getpid()}\n")
+        await message.bot.state.namespace(where).incr("calls")
+        if message.args.seq == 0:
+            await message.bot.scheduler.schedule_message(
+                message.room_id, "later", delay=0
+            )
+        return f"{message.room_id} {message.args.seq} {os.getpid()}"
+
+    rooms = [f"room{i}" for i in range(8)]
+    app.start_workers(2)
+
+    async def scenario(server):
+        for room_id in rooms:
+            for seq in range(5):
+                await server.inject(room_id, f"!where {seq}")
+        await asyncio.wait_for(wait_for_sent(server, 48), 10)
+        # state of all shards is kept by the connection process
+        assert await app.state.namespace(where).get("calls") == 40
+        return [s for s in server.sent if s["msg"] != "later"]
+
+    try:
+        sent = asyncio.run(run_with_server(app, scenario))
+    finally:
+        app.stop_workers()
+
+    replies = [s["msg"].split() for s in sent]
+    pids = {pid for _, _, pid in replies}
+    assert len(pids) == 2 and str(os.getpid()) not in pids
+    for room_id in rooms:
+        handled = [(int(seq), pid) for room, seq, pid in replies if room == room_id]
+        assert sorted(seq for seq, _ in handled) == list(range(5))
+        assert len({pid for _, pid in handled}) == 1
+
+    # every worker writes its own log
+    assert sorted(os.listdir(tmp_path)) == ["where.shard0.txt", "where.shard1.txt"]
+    logged = []
+    for name in os.listdir(tmp_path):
+        with open(os.path.join(tmp_path, name)) as f:
+            logged.append(set(f.read().split()))
+    assert all(len(pids) == 1 for pids in logged)
+    assert set.union(*logged) == pids
+
+
+def test_multiple_bots_in_one_loop():
+    app = make_app()
+
+    @app.cmd("whoami", help="account")
+    async def whoami(message):
+        return message.bot.username
+
+    other = app.clone()
+
+    async def main():
+        async with FakeServer() as first, FakeServer() as second:
+            async with create_session() as session:
+                tasks = [
+                    asyncio.create_task(
+                        bot.start(
+                            username,
+                            "password",
+                            server.host,
+                            port=server.port,
+                            ssl=False,
+                            session=session,
+                        )
+                    )
+                    for bot, username, server in (
+                        (app, "bot", first),
+                        (other, "other", second),
+                    )
+                ]
+                await asyncio.sleep(0)
+                try:
+                    await asyncio.wait_for(app._ready.wait(), 10)
+                    await asyncio.wait_for(other._ready.wait(), 10)
+                    await first.inject("GENERAL", "!whoami")
+                    await second.inject("GENERAL", "!whoami")
+                    await second.inject("GENERAL", "!ping")
+                    await asyncio.wait_for(wait_for_sent(first, 1), 5)
+                    await asyncio.wait_for(wait_for_sent(second, 2), 5)
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                assert app.rest._session is session and not session.closed
+            return first.sent, second.sent
+
+    first, second = asyncio.run(main())
+    assert [s["msg"] for s in first] == ["bot"]
+    assert sorted(s["msg"] for s in second) == ["other", "pong"]
+    assert app.loop_monitor._task is None
+    assert other.loop_monitor is app.loop_monitor
+    assert "rocketchat_loop_lag_seconds" in app.metrics.expose()
+    assert "rocketchat_loop_lag_seconds" not in other.metrics.expose()
+
+
+def test_event_loop_policy():
+    assert isinstance(event_loop_policy("asyncio"), asyncio.DefaultEventLoopPolicy)
+    with pytest.raises(ValueError):
+        event_loop_policy("trio")
+
+    try:
+        import uvloop
+    except ImportError:
+        with pytest.raises(ImportError):
+            event_loop_policy("uvloop")
+        expected = asyncio.DefaultEventLoopPolicy
+    else:
+        expected = uvloop.EventLoopPolicy
+    assert isinstance(event_loop_policy("auto"), expected)
+
+
+def test_argument_parser_cache():
+    app = make_app()
+
+    @app.cmd("secret", help="hidden", rooms=["SECRET"])
+    async def secret(message):
+        return "shh"
+
+    parser = app.get_argument_parser("GENERAL")
+    assert app.get_argument_parser("OTHER") is parser
+    assert app.get_argument_parser("SECRET") is not parser
+
+    @app.cmd("later", help="registered later")
+    async def later(message):
+        return "late"
+
+    updated = app.get_argument_parser("GENERAL")
+    assert updated is not parser
+    assert updated.parse_args(["later"]) is not None
+
+
+HANDLERS = '''
+import asyncio
+from rocketchatbot import RocketChatBot
+
+app = RocketChatBot(log_config={{"version": 1, "root": {{"level": "CRITICAL"}}}})
+log = app.open_log({log!r})
+
+
+@app.cmd("version", help="handler version")
+async def version(message):
+    return "{version}"
+
+
+@app.every(3600, name="tick")
+async def tick():
+    pass
+
+
+@app.cmd("slow", help="finishes after a reload")
+async def slow(message):
+    await asyncio.sleep(0.3)
+    return "slow {version}"
+
+
+if __name__ == "__main__":
+    app.run("bot", "password", "localhost")
+'''
+
+
+def test_hot_reload(tmp_path, monkeypatch):
+    path = tmp_path / "reloadable_handlers.py"
+    options = {"log": str(tmp_path / "log.txt")}
+    path.write_text(HANDLERS.format(version="1", **options))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import reloadable_handlers
+
+    app = reloadable_handlers.app
+    log = reloadable_handlers.log
+    app.hot_reload(reloadable_handlers, signum=None, interval=None)
+
+    async def scenario(server):
+        await server.inject("GENERAL", "!slow")
+        await server.inject("GENERAL", "!version")
+        await asyncio.wait_for(wait_for_sent(server, 1), 5)
+
+        # changed file is picked up by the watcher
+        path.write_text(HANDLERS.format(version="2", **options))
+        mtime = os.stat(path).st_mtime
+        os.utime(path, (mtime + 1, mtime + 1))
+        await app._check_reload()
+        await server.inject("GENERAL", "!version")
+        await asyncio.wait_for(wait_for_sent(server, 3), 5)
+
+        path.write_text("syntax error(")
+        assert not app.reload()
+        await server.inject("GENERAL", "!version")
+        await asyncio.wait_for(wait_for_sent(server, 4), 5)
+        return [s["msg"] for s in server.sent]
+
+    try:
+        sent = asyncio.run(run_with_server(app, scenario))
+        reloaded = sys.modules["reloadable_handlers"]
+    finally:
+        monkeypatch.delitem(sys.modules, "reloadable_handlers")
+    assert sent == ["1", "2", "slow 1", "2"]
+    assert reloaded is not reloadable_handlers
+    assert reloaded.app is app and reloaded.log is log
+    assert [job.func for job in app.periodic.stats()] == [reloaded.tick]
+    handlers = app.loop_monitor._handlers
+    assert handlers[reloaded.version.__code__] == "command version"
+
+
+def test_hot_reload_off_main_thread():
+    app = make_app()
+    app.hot_reload(__name__, interval=None)
+    result = []
+
+    async def scenario(server):
+        await server.inject("GENERAL", "!ping")
+        await asyncio.wait_for(wait_for_sent(server, 1), 5)
+        return [s["msg"] for s in server.sent]
+
+    thread = threading.Thread(
+        target=lambda: result.append(asyncio.run(run_with_server(app, scenario)))
+    )
+    thread.start()
+    thread.join(10)
+    assert result == [["pong"]]
+
+
+def test_conversation():
+    app = make_app()
+
+    @app.cmd("quiz", help="asks a question")
+    async def quiz(message):
+        async with app.messages(message.room_id, message.username) as replies:
+            await app.send_message(message.room_id, "2 + 2?")
+            async for reply in replies:
+                if reply.text == "4":
+                    break
+                await app.send_message(message.room_id, "no")
+        confirm = await app.wait_for(
+            lambda msg: msg.text in ("yes", "no"), 5, room_id=message.room_id
+        )
+        return f"correct, {confirm.text}"
+
+    async def scenario(server):
+        await server.inject("GENERAL", "!quiz")
+        await asyncio.wait_for(wait_for_sent(server, 1), 5)
+        await server.inject("OTHER", "4")
+        await server.inject("GENERAL", "4", username="someone")
+        await server.inject("GENERAL", "3")
+        await asyncio.wait_for(wait_for_sent(server, 2), 5)
+        await server.inject("GENERAL", "4")
+        await asyncio.sleep(0.05)
+        await server.inject("GENERAL", "yes")
+        await asyncio.wait_for(wait_for_sent(server, 3), 5)
+        return [s["msg"] for s in server.sent], len(app.waiters)
+
+    sent, waiters = asyncio.run(run_with_server(app, scenario))
+    assert sent == ["2 + 2?", "no", "correct, yes"]
+    assert waiters == 0
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import time
+from scheduler import Scheduler
+
+
+def test_call_later_order():
+    fired = []
+
+    async def scenario():
+        scheduler = Scheduler()
+        await scheduler.start(None)
+        scheduler.call_later(0.03, lambda: fired.append("c"))
+        scheduler.call_later(0.01, lambda: fired.append("a"))
+        job_id = scheduler.call_later(0.02, lambda: fired.append("cancelled"))
+        scheduler.call_later(0.02, lambda: fired.append("b"))
+        assert await scheduler.cancel(job_id)
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert fired == ["a", "b", "c"]
+    assert len(scheduler) == 0
+
+
+def test_persisted_message(tmp_path):
+    path = os.path.join(tmp_path, "timers.sqlite3")
+    sent = []
+
+    async def send(room_id: str, message: str):
+        sent.append((room_id, message))
+
+    async def first_run():
+        scheduler = Scheduler(path)
+        await scheduler.start(send)
+        await scheduler.schedule_message("room", "later", delay=0.2)
+        await scheduler.schedule_message("room", "soon", at=time.time() - 1)
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+
+    async def second_run():
+        scheduler = Scheduler(path)
+        await scheduler.start(send)
+        assert len(scheduler) == 1
+        await asyncio.sleep(0.3)
+        await scheduler.stop()
+        return scheduler
+
+    asyncio.run(first_run())
+    assert sent == [("room", "soon")]
+    scheduler = asyncio.run(second_run())
+    assert sent == [("room", "soon"), ("room", "later")]
+    assert len(scheduler) == 0
+
+
+def test_stop_cancels_running_jobs(tmp_path):
+    path = os.path.join(tmp_path, "timers.sqlite3")
+    events = []
+
+    async def slow():
+        events.append("started")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+
+    async def send(room_id: str, message: str):
+        events.append(message)
+
+    async def scenario():
+        scheduler = Scheduler(path)
+        await scheduler.start(send)
+        scheduler.call_later(0, slow)
+        await asyncio.sleep(0.05)
+        assert len(scheduler._fired) == 1
+        await scheduler.stop()
+        assert not scheduler._fired
+        assert scheduler._executor is None
+
+        # restarting after a stop gets a fresh executor
+        await scheduler.start(send)
+        await scheduler.schedule_message("room", "again", delay=0)
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+    assert events == ["started", "cancelled", "again"]
@@ -0,0 +1,67 @@
+import asyncio
+import os
+from state import StateStore
+
+
+def test_write_behind_round_trip(tmp_path):
+    path = os.path.join(tmp_path, "state.sqlite3")
+
+    async def handler():
+        pass
+
+    async def first_run():
+        store = StateStore(path, flush_interval=60)
+        counters = store.namespace(handler)
+        assert counters.name == (
+            "test_state.test_write_behind_round_trip.<locals>.handler"
+        )
+        assert await counters.incr("calls") == 1
+        assert await counters.incr("calls", 2) == 3
+        await counters.set("setting", {"enabled": True})
+        await counters.set("gone", 1)
+        assert await counters.delete("gone")
+        assert not await counters.delete("gone")
+        await store.namespace("other").set("calls", "separate")
+        # nothing written before the flush
+        assert await StateStore(path)._read(counters.name) == {}
+        await store.close()
+
+    async def second_run():
+        store = StateStore(path)
+        counters = store.namespace(handler)
+        items = dict(await counters.items())
+        other = await store.namespace("other").get("calls")
+        missing = await counters.get("missing", "default")
+        await store.close()
+        return items, other, missing
+
+    asyncio.run(first_run())
+    items, other, missing = asyncio.run(second_run())
+    assert items == {"calls": 3, "setting": {"enabled": True}}
+    assert other == "separate"
+    assert missing == "default"
+
+
+def test_periodic_flush(tmp_path):
+    path = os.path.join(tmp_path, "state.sqlite3")
+
+    async def scenario():
+        store = StateStore(path, flush_interval=0.05)
+        await store.namespace("ns").set("key", "value")
+        await asyncio.sleep(0.15)
+        rows = await StateStore(path)._read("ns")
+        await store.close()
+        return rows
+
+    assert asyncio.run(scenario()) == {"key": "value"}
+
+
+def test_in_memory():
+    async def scenario():
+        store = StateStore()
+        await store.namespace("ns").incr("key")
+        value = await store.namespace("ns").get("key")
+        await store.close()
+        return value
+
+    assert asyncio.run(scenario()) == 1
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import time
+import pytest
+import tracing
+from tracing import JsonExporter, RingBufferExporter, Tracer
+
+
+def test_spans_follow_context():
+    tracer = Tracer()
+    ring = RingBufferExporter(size=2)
+    tracer.add_exporter(ring)
+
+    async def handle(trace_id: str):
+        trace = tracer.start(trace_id, 0.0, room_id="GENERAL")
+        with tracer.span("parse"):
+            pass
+        await asyncio.gather(child("a"), child("b"))
+        tracer.finish(trace)
+
+    async def child(name: str):
+        with tracer.span("handler", handler=name):
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        await asyncio.gather(*(handle(str(i)) for i in range(3)))
+
+    asyncio.run(scenario())
+    assert [trace.id for trace in ring.traces] == ["1", "2"]
+    for trace in ring.traces:
+        assert [span.name for span in trace.spans] == ["parse", "handler", "handler"]
+        assert trace.spans[1].duration >= 0.01
+        assert trace.attributes == {"room_id": "GENERAL"}
+
+
+def test_disabled_and_sampling():
+    tracer = Tracer()
+    assert tracer.start("id", 0.0) is None
+    # spans outside a trace are no-ops
+    with tracer.span("handler"):
+        pass
+
+    tracer.add_exporter(RingBufferExporter())
+    tracer.sample_rate = 0.0
+    assert tracer.start("id", 0.0) is None
+
+
+def test_min_duration_and_json():
+    lines = []
+
+    class Log:
+        def write(self, text):
+            lines.append(text)
+
+    tracer = Tracer(min_duration=1.0)
+    tracer.add_exporter(JsonExporter(Log()))
+
+    def run(start):
+        async def traced():
+            trace = tracer.start("id", start)
+            tracer.record("queue", start, start + 0.5)
+            tracer.finish(trace)
+
+        asyncio.run(traced())
+
+    run(time.perf_counter())
+    assert lines == []
+    run(time.perf_counter() - 2)
+    data = json.loads(lines[0])
+    assert data["id"] == "id"
+    assert data["duration_ms"] >= 2000
+    assert data["spans"][0]["name"] == "queue"
+    assert data["spans"][0]["duration_ms"] == pytest.approx(500)
+
+
+def test_finish_restores_context():
+    tracer = Tracer()
+    ring = RingBufferExporter()
+    tracer.add_exporter(ring)
+
+    async def scenario():
+        trace = tracer.start("first", 0.0)
+        late = asyncio.create_task(child(0.02))
+        await asyncio.sleep(0)
+        tracer.finish(trace)
+        # the context no longer refers to the finished trace
+        assert tracing._current.get() is None
+        tracer.record("queue", 0.0, 1.0)
+        with tracer.span("handler"):
+            pass
+        await late
+        return trace
+
+    async def child(delay):
+        with tracer.span("late"):
+            await asyncio.sleep(delay)
+        tracer.record("after", 0.0, 1.0)
+
+    trace = asyncio.run(scenario())
+    assert trace.finished
+    assert trace.spans == []
+    assert list(ring.traces) == [trace]
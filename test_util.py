@@ -1,3 +1,5 @@
+import sys
+import types
 import util
 import pytest
 from typing import Optional
@@ -22,3 +24,20 @@ def test_normalize_filename(filename: str, result: str):
 )
 def test_get_file_by_name(files: List[str], file: str, result: Optional[str]):
     assert util.get_file_by_name(files, file) == result
+
+
+def test_qualified_name(monkeypatch):
+    script = types.ModuleType("__main__")
+    script.__file__ = "/srv/bot.py"
+    monkeypatch.setitem(sys.modules, "__main__", script)
+
+    def handler():
+        pass
+
+    for module in ("__main__", "__mp_main__"):
+        handler.__module__ = module
+        assert util.qualified_name(handler) == (
+            "bot.test_qualified_name.<locals>.handler"
+        )
+        assert util.module_name(f"{module}.linux_gnu") == "bot.linux_gnu"
+    assert util.module_name("handlers.linux_gnu") == "handlers.linux_gnu"
@@ -0,0 +1,74 @@
+import asyncio
+import gc
+import pytest
+from rocketchat_data import Message
+from waiters import WaiterRegistry
+
+
+def message(room_id: str, username: str, text: str = "hi") -> Message:
+    return Message(
+        [
+            {"_id": text, "rid": room_id, "msg": text, "u": {"username": username}},
+            {"roomType": "c", "roomName": room_id},
+        ]
+    )
+
+
+def test_stream_filters_and_order():
+    async def scenario():
+        registry = WaiterRegistry()
+        stream = registry.stream(room_id="a", user="alice")
+        others = registry.stream(predicate=lambda msg: msg.text.startswith("x"))
+        registry.dispatch(message("a", "alice", "1"))
+        registry.dispatch(message("a", "bob", "2"))
+        registry.dispatch(message("b", "alice", "x3"))
+        registry.dispatch(message("a", "alice", "x4"))
+        stream.close()
+        registry.dispatch(message("a", "alice", "5"))
+        return [msg.text async for msg in stream], others.qsize()
+
+    texts, others = asyncio.run(scenario())
+    assert texts == ["1", "x4"]
+    assert others == 2
+
+
+def test_stream_bounded():
+    async def scenario():
+        registry = WaiterRegistry()
+        async with registry.stream(maxsize=3) as stream:
+            for i in range(10):
+                registry.dispatch(message("a", "alice", str(i)))
+            assert stream.dropped == 7
+            return [(await stream.__anext__()).text for _ in range(3)]
+
+    assert asyncio.run(scenario()) == ["7", "8", "9"]
+
+
+def test_stream_garbage_collected():
+    async def scenario():
+        registry = WaiterRegistry()
+        registry.stream(room_id="a")
+        gc.collect()
+        registry.dispatch(message("a", "alice"))
+        return len(registry), registry._index
+
+    assert asyncio.run(scenario()) == (0, {})
+
+
+def test_wait_for():
+    async def scenario():
+        registry = WaiterRegistry()
+        waiting = asyncio.ensure_future(
+            registry.wait_for(lambda msg: msg.text == "yes", 1, user="alice")
+        )
+        await asyncio.sleep(0)
+        for username, text in (("bob", "yes"), ("alice", "no"), ("alice", "yes")):
+            registry.dispatch(message("a", username, text))
+        msg = await waiting
+        with pytest.raises(asyncio.TimeoutError):
+            await registry.wait_for(timeout=0.01)
+        return msg, len(registry)
+
+    msg, waiters = asyncio.run(scenario())
+    assert (msg.username, msg.text) == ("alice", "yes")
+    assert waiters == 0
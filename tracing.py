@@ -0,0 +1,248 @@
+import collections
+import contextlib
+import contextvars
+import dataclasses
+import json
+import logging
+import random
+import time
+from typing import Any, Deque, Dict, List, Optional
+
+_current: "contextvars.ContextVar[Optional[Trace]]" = contextvars.ContextVar(
+    "trace", default=None
+)
+_NOT_TRACED = contextlib.nullcontext()
+
+
+@dataclasses.dataclass
+class Span:
+    """
+    Timed step of a trace.
+
+    Args:
+        name: Step name, e.g. ``"queue"`` or ``"handler"``.
+        start: :func:`time.perf_counter` time the step started.
+        end: :func:`time.perf_counter` time the step ended.
+        attributes: Details of the step.
+    """
+
+    name: str
+    start: float
+    end: float = 0.0
+    attributes: Dict[str, Any] = dataclasses.field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        """ Seconds the step took. """
+        return self.end - self.start
+
+
+@dataclasses.dataclass
+class Trace:
+    """
+    Spans recorded while handling one inbound message.
+
+    Args:
+        id: Trace identifier, the message id.
+        start: :func:`time.perf_counter` time the frame was received.
+        end: :func:`time.perf_counter` time handling finished.
+        attributes: Details of the message.
+        spans: Recorded steps, in the order they finished.
+        finished: Whether the trace ended, later spans are dropped.
+    """
+
+    id: str
+    start: float
+    end: float = 0.0
+    attributes: Dict[str, Any] = dataclasses.field(default_factory=dict)
+    spans: List[Span] = dataclasses.field(default_factory=list)
+    finished: bool = False
+    _token: Optional[contextvars.Token] = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+
+    @property
+    def duration(self) -> float:
+        """ Seconds from receiving the frame to finishing handling it. """
+        return self.end - self.start
+
+    def to_dict(self) -> dict:
+        """ Converts to a JSON serializable dict with times in milliseconds. """
+        return {
+            "id": self.id,
+            "duration_ms": self.duration * 1000,
+            **self.attributes,
+            "spans": [
+                {
+                    "name": span.name,
+                    "offset_ms": (span.start - self.start) * 1000,
+                    "duration_ms": span.duration * 1000,
+                    **span.attributes,
+                }
+                for span in self.spans
+            ],
+        }
+
+
+class LogExporter:
+    """
+    Logs a one line summary of every trace.
+
+    Args:
+        level: Logging level.
+    """
+
+    def __init__(self, level: int = logging.INFO):
+        self.logger = logging.getLogger(__name__)
+        self.level = level
+
+    def export(self, trace: Trace):
+        spans = " ".join(
+            f"{span.name}={span.duration * 1000:.2f}ms" for span in trace.spans
+        )
+        self.logger.log(
+            self.level, f"trace {trace.id} {trace.duration * 1000:.2f}ms {spans}"
+        )
+
+
+class JsonExporter:
+    """
+    Writes every trace as a line of JSON.
+
+    Args:
+        log: Writer to append lines to, e.g. from
+            :meth:`RocketChatBot.open_log`.
+    """
+
+    def __init__(self, log):
+        self.log = log
+
+    def export(self, trace: Trace):
+        self.log.write(json.dumps(trace.to_dict()) + "\n")
+
+
+class RingBufferExporter:
+    """
+    Keeps the most recent traces in memory.
+
+    Args:
+        size: Number of traces to keep.
+    """
+
+    def __init__(self, size: int = 1000):
+        self.traces: Deque[Trace] = collections.deque(maxlen=size)
+
+    def export(self, trace: Trace):
+        self.traces.append(trace)
+
+
+class Tracer:
+    """
+    Records per-message traces and hands finished ones to exporters.
+
+    Tracing is off until an exporter is added.  Spans recorded outside a
+    sampled trace cost a context variable lookup.
+
+    Args:
+        sample_rate: Fraction of messages to trace.
+        min_duration: Seconds a trace must take to be exported, to only
+            keep slow messages.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, min_duration: float = 0.0):
+        self.logger = logging.getLogger(__name__)
+        self.sample_rate = sample_rate
+        self.min_duration = min_duration
+        self.exporters: List[Any] = []
+
+    def add_exporter(self, exporter):
+        """
+        Adds an exporter.
+
+        Args:
+            exporter: Object with an ``export(trace)`` method.
+        """
+        self.exporters.append(exporter)
+
+    def start(self, trace_id: str, start: float, **attributes) -> Optional[Trace]:
+        """
+        Starts a trace in the current context, if sampled.
+
+        Args:
+            trace_id: Trace identifier.
+            start: :func:`time.perf_counter` time the frame was received.
+            **attributes: Details of the message.
+
+        Returns:
+            Trace, or ``None`` if not sampled.
+        """
+        if not self.exporters or (
+            self.sample_rate < 1.0 and random.random() >= self.sample_rate
+        ):
+            return None
+        trace = Trace(trace_id, start, attributes=attributes)
+        trace._token = _current.set(trace)
+        return trace
+
+    def finish(self, trace: Optional[Trace]):
+        """
+        Ends a trace, restores the context it was started in and exports it.
+
+        Spans ending after this are dropped.
+        """
+        if trace is None or trace.finished:
+            return
+        trace.end = time.perf_counter()
+        trace.finished = True
+        if trace._token is not None:
+            try:
+                _current.reset(trace._token)
+            except ValueError:
+                # finished from another context, which never saw the trace
+                pass
+            trace._token = None
+        if trace.duration < self.min_duration:
+            return
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace)
+            except Exception:
+                self.logger.exception(f"failed to export trace {trace.id}")
+
+    def record(self, name: str, start: float, end: float, **attributes):
+        """
+        Adds an already timed span to the current trace.
+
+        Args:
+            name: Step name.
+            start: :func:`time.perf_counter` time the step started.
+            end: :func:`time.perf_counter` time the step ended.
+            **attributes: Details of the step.
+        """
+        trace = _current.get()
+        if trace is not None and not trace.finished:
+            trace.spans.append(Span(name, start, end, attributes))
+
+    def span(self, name: str, **attributes):
+        """
+        Context manager timing a span of the current trace.
+
+        Args:
+            name: Step name.
+            **attributes: Details of the step.
+        """
+        trace = _current.get()
+        if trace is None or trace.finished:
+            return _NOT_TRACED
+        return self._span(trace, name, attributes)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _span(trace: Trace, name: str, attributes: Dict[str, Any]):
+        span = Span(name, time.perf_counter(), attributes=attributes)
+        try:
+            yield span
+        finally:
+            span.end = time.perf_counter()
+            if not trace.finished:
+                trace.spans.append(span)
@@ -1,5 +1,6 @@
 import os
-from typing import List
+import sys
+from typing import Callable, List
 
 
 def normalize_filename(file: str) -> str:
@@ -37,3 +38,38 @@ def get_file_by_name(files: List[str], filename: str):
         return None
     else:
         return files[index]
+
+
+def module_name(name: str) -> str:
+    """
+    Gets a name of a module that is stable across runs and reloads.
+
+    A script runs as ``__main__``, and as ``__mp_main__`` when reloaded or
+    imported by :mod:`multiprocessing`, so it is named after its file.
+
+    Args:
+        name: Module name, or a dotted name starting with one.
+
+    Returns:
+        Name with the script module replaced by its file name.
+    """
+    module, dot, rest = name.partition(".")
+    if module not in ("__main__", "__mp_main__"):
+        return name
+    path = getattr(sys.modules.get("__main__"), "__file__", None)
+    if path is None:
+        return name
+    return os.path.splitext(os.path.basename(path))[0] + dot + rest
+
+
+def qualified_name(func: Callable) -> str:
+    """
+    Gets the module and qualified name of a function, e.g. ``bot.ping``.
+
+    Args:
+        func: Function to name.
+
+    Returns:
+        Name, see :func:`module_name`.
+    """
+    return f"{module_name(func.__module__)}.{func.__qualname__}"
@@ -0,0 +1,219 @@
+import abc
+import asyncio
+import collections
+import logging
+import weakref
+from typing import Callable, Deque, Dict, Optional, Tuple
+from rocketchat_data import Message
+
+Predicate = Callable[[Message], bool]
+
+
+class _Waiter(abc.ABC):
+    """
+    Registered interest in incoming messages.
+
+    Args:
+        room_id: Room the messages are posted in, ``None`` for any room.
+        user: Username of the author, ``None`` for any user.
+        predicate: Further filter on the messages.
+    """
+
+    def __init__(
+        self,
+        room_id: Optional[str],
+        user: Optional[str],
+        predicate: Optional[Predicate],
+    ):
+        self.key = (room_id, user)
+        self.predicate = predicate
+
+    @abc.abstractmethod
+    def feed(self, msg: Message):
+        """ Delivers a matching message. """
+
+
+class _Future(_Waiter):
+    """ Waiter resolving a future with the first message. """
+
+    def __init__(
+        self,
+        room_id: Optional[str],
+        user: Optional[str],
+        predicate: Optional[Predicate],
+    ):
+        super().__init__(room_id, user, predicate)
+        self.future = asyncio.get_running_loop().create_future()
+
+    def feed(self, msg: Message):
+        if not self.future.done():
+            self.future.set_result(msg)
+
+
+class MessageStream(_Waiter):
+    """
+    Async iterator over incoming messages, see :meth:`WaiterRegistry.stream`.
+
+    Messages are buffered from the moment the stream is created.  Once
+    ``maxsize`` messages are buffered, the oldest is dropped for every new
+    one, so a slow consumer never holds up dispatch or grows memory.  The
+    stream stops receiving messages when closed or garbage collected.
+
+    Args:
+        registry: Registry feeding the stream.
+        maxsize: Number of buffered messages.
+    """
+
+    def __init__(
+        self,
+        registry: "WaiterRegistry",
+        room_id: Optional[str],
+        user: Optional[str],
+        predicate: Optional[Predicate],
+        maxsize: int,
+    ):
+        super().__init__(room_id, user, predicate)
+        self.registry = registry
+        self.dropped = 0
+        self.closed = False
+        self._buffer: Deque[Message] = collections.deque(maxlen=maxsize)
+        self._wakeup = asyncio.Event()
+
+    def __aiter__(self) -> "MessageStream":
+        return self
+
+    async def __anext__(self) -> Message:
+        while not self._buffer:
+            if self.closed:
+                raise StopAsyncIteration
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        return self._buffer.popleft()
+
+    async def __aenter__(self) -> "MessageStream":
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def qsize(self) -> int:
+        """ Gets the number of buffered messages. """
+        return len(self._buffer)
+
+    def feed(self, msg: Message):
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(msg)
+        self._wakeup.set()
+
+    def close(self):
+        """ Stops receiving messages, iteration ends once the buffer is empty. """
+        if not self.closed:
+            self.closed = True
+            self.registry.remove(self)
+            self._wakeup.set()
+
+
+class WaiterRegistry:
+    """
+    Waiters for incoming messages, indexed by room and user.
+
+    Dispatching a message only visits the waiters registered for its room
+    and author, for either of them, or for any message.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._index: Dict[Tuple[Optional[str], Optional[str]], weakref.WeakSet] = {}
+
+    def __len__(self) -> int:
+        return sum(len(waiters) for waiters in self._index.values())
+
+    def add(self, waiter: _Waiter):
+        """ Registers a waiter, only weakly referenced. """
+        waiters = self._index.get(waiter.key)
+        if waiters is None:
+            waiters = self._index[waiter.key] = weakref.WeakSet()
+        waiters.add(waiter)
+
+    def remove(self, waiter: _Waiter):
+        """ Unregisters a waiter. """
+        waiters = self._index.get(waiter.key)
+        if waiters is not None:
+            waiters.discard(waiter)
+            if not waiters:
+                del self._index[waiter.key]
+
+    def stream(
+        self,
+        room_id: Optional[str] = None,
+        user: Optional[str] = None,
+        predicate: Optional[Predicate] = None,
+        maxsize: int = 100,
+    ) -> MessageStream:
+        """
+        Creates a stream of incoming messages.
+
+        Args:
+            room_id: Room the messages are posted in, ``None`` for any room.
+            user: Username of the author, ``None`` for any user.
+            predicate: Further filter on the messages.
+            maxsize: Number of buffered messages.
+
+        Returns:
+            Registered stream.
+        """
+        stream = MessageStream(self, room_id, user, predicate, maxsize)
+        self.add(stream)
+        return stream
+
+    async def wait_for(
+        self,
+        predicate: Optional[Predicate] = None,
+        timeout: Optional[float] = None,
+        *,
+        room_id: Optional[str] = None,
+        user: Optional[str] = None,
+    ) -> Message:
+        """
+        Waits for the next incoming message.
+
+        Args:
+            predicate: Filter on the messages.
+            timeout: Seconds to wait, ``None`` to wait indefinitely.
+            room_id: Room the message is posted in, ``None`` for any room.
+            user: Username of the author, ``None`` for any user.
+
+        Returns:
+            First matching message.
+
+        Raises:
+            asyncio.TimeoutError: No message matched in time.
+        """
+        waiter = _Future(room_id, user, predicate)
+        self.add(waiter)
+        try:
+            return await asyncio.wait_for(waiter.future, timeout)
+        finally:
+            self.remove(waiter)
+
+    def dispatch(self, msg: Message):
+        """ Feeds a message to every waiter it matches. """
+        if not self._index:
+            return
+        room_id = msg.room_id
+        user = msg.username
+        for key in ((room_id, user), (room_id, None), (None, user), (None, None)):
+            waiters = self._index.get(key)
+            if waiters is None:
+                continue
+            if not waiters:
+                # every waiter was garbage collected
+                del self._index[key]
+                continue
+            for waiter in list(waiters):
+                try:
+                    if waiter.predicate is None or waiter.predicate(msg):
+                        waiter.feed(msg)
+                except Exception:
+                    self.logger.exception("message waiter predicate failed")